@@ -1,14 +1,108 @@
 #-*- coding:utf-8 -*-    --------------Ashare 股票行情数据双核心版( https://github.com/mpquant/Ashare ) 
-import json,requests,datetime;      import pandas as pd  #
+import json,requests,datetime,threading;      import pandas as pd  #
+import numpy as np;                           from operator import itemgetter
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter;    from urllib3.util.retry import Retry
+import bar_store                                                          #本地日线存储
+import quote_router                                                       #多数据源路由：健康统计、对冲请求、降级
+import minute_store                                                       #当天分钟线存储
+BAR_STORE=True                                                            #日线是否先读本地存储，只补缺失部分
+MINUTE_STORE=True                                                         #当天分钟线是否先读本地存储：只补新的1分钟线，5m~60m由1分钟线合成
+ROUTER=quote_router.QuoteRouter()                                         #设为None则按 新浪失败再腾讯 的顺序请求
+FAST_PARSE=True                                                           #K线解析直接转成NumPy数组后一次构建DataFrame，格式不符时自动退回原解析
+try:    import orjson;  _loads=orjson.loads                              #有orjson时用它解析K线JSON
+except ImportError:     _loads=json.loads
+
+#---接口主机---  基准测试时可以指向本地模拟服务器，如 HOSTS.update(sina='http://127.0.0.1:8000')
+HOSTS={'sina':'http://money.finance.sina.com.cn', 'tx_day':'http://web.ifzq.gtimg.cn', 'tx_min':'http://ifzq.gtimg.cn', 'tx_quote':'http://qt.gtimg.cn'}
+
+#---HTTP连接池---  所有接口共用一个Session，保持长连接，避免每次请求都重新建立TCP连接
+HTTP_CONFIG={'pool_size':20, 'timeout':(3,10), 'retries':2, 'backoff':0.3}   #连接池大小, (连接,读取)超时秒数, 重试次数, 重试退避系数
+_http_stats={'retries':0};    _http_lock=threading.Lock();    _session=None
+
+class _CountingRetry(Retry):                                              #统计重试次数的Retry
+    def increment(self, *args, **kwargs):
+        with _http_lock: _http_stats['retries']+=1
+        return super().increment(*args, **kwargs)
+
+def configure_http(**kwargs):                                             #修改连接池配置，如 configure_http(pool_size=50, timeout=5)
+    global _session
+    HTTP_CONFIG.update(kwargs)
+    with _http_lock:
+        old,_session=_session,None
+    if old is not None: old.close()
+
+def _get_session():
+    global _session
+    with _http_lock:
+        if _session is None:
+            retry=_CountingRetry(total=HTTP_CONFIG['retries'], backoff_factor=HTTP_CONFIG['backoff'], status_forcelist=[500,502,503,504])
+            adapter=HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_CONFIG['pool_size'], max_retries=retry, pool_block=False)
+            _session=requests.Session();    _session.mount('http://',adapter);    _session.mount('https://',adapter)
+        return _session
+
+def _http_get(URL):                                                       #带超时和重试的GET，返回响应内容
+    r=_get_session().get(URL, timeout=HTTP_CONFIG['timeout']);    r.raise_for_status()
+    return r.content
+
+def http_stats():                                                         #连接统计：新建连接数、复用次数、重试次数
+    opened=requests_sent=0
+    with _http_lock: session=_session;    stats=dict(_http_stats)
+    if session is not None:
+        for adapter in set(session.adapters.values()):
+            pools=adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool=pools.get(key)
+                if pool is None: continue
+                opened+=pool.num_connections;    requests_sent+=pool.num_requests
+    return {'connections_opened':opened, 'connections_reused':max(requests_sent-opened,0), 'retries':stats['retries']}
+
+#---K线快速解析---  解析结果直接放进float64/datetime64数组，不逐行构建字典、不逐列astype
+def _fast_frame(arrays, data, columns):                                   #arrays(data)->(时间, n×k数值矩阵)；格式不符或为空返回None，交给原解析
+    try:    times,values=arrays(data)
+    except (KeyError,IndexError,TypeError,ValueError,AttributeError): return None
+    if not len(values): return None
+    return pd.DataFrame(values, index=pd.DatetimeIndex(times.astype(_TIME_DTYPE),name=''), columns=columns, copy=False)
+
+TX_LOT=100                                                                #腾讯K线成交量单位为手，解析时换算成股，与新浪一致
+_TIME_DTYPE=pd.to_datetime(['2000-01-01']).dtype                          #与pd.to_datetime解析字符串的时间精度保持一致(pandas 2为ns, 3为us)
+
+def _sina_arrays(rows):                                                   #新浪: [{'day','open','high','low','close','volume',...}]
+    values=np.array(list(map(itemgetter('open','high','low','close','volume'),rows)),dtype='float64').reshape(-1,5)
+    return np.array(list(map(itemgetter('day'),rows)),dtype='datetime64[s]'), values
+
+def _tx_columns(buf, width):                                              #腾讯: 按列转置，只取前width列(日期+5个数值)，有行不足width列时抛ValueError
+    if not buf or min(map(len,buf))<width: raise ValueError('unexpected columns')
+    cols=list(zip(*buf))                                                 #zip按最短行截断，多出的分红、成交额等列自然丢掉
+    return cols[0], np.array(cols[1:width],dtype='float64').T
+
+def _day_tx_arrays(buf):                                                  #腾讯日线: [[日期,开,收,高,低,量(,分红)]]
+    times,values=_tx_columns(buf,6)
+    return np.array(times,dtype='datetime64[s]'), values
+
+def _min_tx_arrays(data):                                                 #腾讯分钟线: ([[yyyymmddHHMM,开,收,高,低,量,...]], 最新价)
+    buf,last=data;    times,values=_tx_columns(buf,6)
+    values[-1,1]=float(last)                                             #收盘价用实时价，最新基金数据是3位的
+    t=np.array(times,dtype='int64');    ymd,hm=t//10000,t%10000              #yyyymmddHHMM按整数拆成年月日时分
+    month=((ymd//10000-1970)*12+ymd//100%100-1).astype('datetime64[M]')
+    return month.astype('datetime64[D]')+(ymd%100-1)+(hm//100*60+hm%100).astype('timedelta64[m]'), values
 
 #---腾讯日线---  2025-12-21日正常使用
 def get_price_day_tx(code, end_date='', count=10, frequency='1d'):     #日线获取  
+    return _parse_day_tx(_http_get(_url_day_tx(code,end_date,count,frequency)), code, frequency)
+
+def _url_day_tx(code, end_date='', count=10, frequency='1d'):          #腾讯日线URL
     unit='week' if frequency in '1w' else 'month' if frequency in '1M' else 'day'     #判断日线，周线，月线
     if end_date:  end_date=end_date.strftime('%Y-%m-%d') if isinstance(end_date,datetime.date) else end_date.split(' ')[0]
     end_date='' if end_date==datetime.datetime.now().strftime('%Y-%m-%d') else end_date   #如果日期今天就变成空    
-    URL=f'http://web.ifzq.gtimg.cn/appstock/app/fqkline/get?param={code},{unit},,{end_date},{count},qfq'     
-    st= json.loads(requests.get(URL).content);    ms='qfq'+unit;      stk=st['data'][code]   
+    return f'{HOSTS["tx_day"]}/appstock/app/fqkline/get?param={code},{unit},,{end_date},{count},qfq'     
+
+def _parse_day_tx(content, code, frequency='1d'):                       #腾讯日线解析
+    unit='week' if frequency in '1w' else 'month' if frequency in '1M' else 'day'
+    st= _loads(content);        ms='qfq'+unit;      stk=st['data'][code]   
     buf=stk[ms] if ms in stk else stk[unit]       #指数返回不是qfqday,是day
+    df=_fast_frame(_day_tx_arrays, buf, ['open','close','high','low','volume']) if FAST_PARSE else None
+    if df is not None: df['volume']*=TX_LOT;  return df
     
     # 处理数据列数变化的情况
     if len(buf) > 0:
@@ -34,15 +128,23 @@ def get_price_day_tx(code, end_date='', count=10, frequency='1d'):     #日线
     df=pd.DataFrame(buf,columns=['time','open','close','high','low','volume'])
     # 只对数值列设置float类型
     df[['open','close','high','low','volume']] = df[['open','close','high','low','volume']].astype('float')
+    df['volume']*=TX_LOT                                                  #手->股
     df.time=pd.to_datetime(df.time);    df.set_index(['time'], inplace=True);   df.index.name=''          #处理索引 
     return df
 
 #腾讯分钟线
 def get_price_min_tx(code, end_date=None, count=10, frequency='1d'):    #分钟线获取 
+    return _parse_min_tx(_http_get(_url_min_tx(code,end_date,count,frequency)), code, frequency)
+
+def _url_min_tx(code, end_date=None, count=10, frequency='1d'):         #腾讯分钟线URL
     ts=int(frequency[:-1]) if frequency[:-1].isdigit() else 1           #解析K线周期数
-    if end_date: end_date=end_date.strftime('%Y-%m-%d') if isinstance(end_date,datetime.date) else end_date.split(' ')[0]        
-    URL=f'http://ifzq.gtimg.cn/appstock/app/kline/mkline?param={code},m{ts},,{count}' 
-    st= json.loads(requests.get(URL).content);       buf=st['data'][code]['m'+str(ts)] 
+    return f'{HOSTS["tx_min"]}/appstock/app/kline/mkline?param={code},m{ts},,{count}' 
+
+def _parse_min_tx(content, code, frequency='1d'):                       #腾讯分钟线解析
+    ts=int(frequency[:-1]) if frequency[:-1].isdigit() else 1
+    st= _loads(content);           buf=st['data'][code]['m'+str(ts)] 
+    df=_fast_frame(_min_tx_arrays, (buf, st['data'][code]['qt'][code][3]), ['open','close','high','low','volume']) if FAST_PARSE else None
+    if df is not None: df['volume']*=TX_LOT;  return df
     
     # 处理数据列数变化的情况
     if len(buf) > 0:
@@ -58,6 +160,7 @@ def get_price_min_tx(code, end_date=None, count=10, frequency='1d'):    #分钟
     df=pd.DataFrame(buf,columns=['time','open','close','high','low','volume','n1','n2'])   
     df=df[['time','open','close','high','low','volume']]    
     df[['open','close','high','low','volume']]=df[['open','close','high','low','volume']].astype('float')
+    df['volume']*=TX_LOT                                                  #手->股
     df.time=pd.to_datetime(df.time);   df.set_index(['time'], inplace=True);   df.index.name=''          #处理索引         
     df['close'][-1]=float(st['data'][code]['qt'][code][3])                #最新基金数据是3位的
     return df
@@ -65,15 +168,27 @@ def get_price_min_tx(code, end_date=None, count=10, frequency='1d'):    #分钟
 
 #sina新浪全周期获取函数，分钟线 5m,15m,30m,60m  日线1d=240m   周线1w=1200m  1月=7200m
 def get_price_sina(code, end_date='', count=10, frequency='60m'):    #新浪全周期获取函数    
-    frequency=frequency.replace('1d','240m').replace('1w','1200m').replace('1M','7200m');   mcount=count
+    return _parse_sina(_http_get(_url_sina(code,end_date,count,frequency)), end_date, count, frequency)
+
+def _url_sina(code, end_date='', count=10, frequency='60m'):          #新浪K线URL
+    frequency=frequency.replace('1d','240m').replace('1w','1200m').replace('1M','7200m')
     ts=int(frequency[:-1]) if frequency[:-1].isdigit() else 1       #解析K线周期数
     if (end_date!='') & (frequency in ['240m','1200m','7200m']): 
         end_date=pd.to_datetime(end_date) if not isinstance(end_date,datetime.date) else end_date    #转换成datetime
         unit=4 if frequency=='1200m' else 29 if frequency=='7200m' else 1    #4,29多几个数据不影响速度
         count=count+(datetime.datetime.now()-end_date).days//unit            #结束时间到今天有多少天自然日(肯定 >交易日)        
         #print(code,end_date,count)    
-    URL=f'http://money.finance.sina.com.cn/quotes_service/api/json_v2.php/CN_MarketData.getKLineData?symbol={code}&scale={ts}&ma=5&datalen={count}' 
-    dstr= json.loads(requests.get(URL).content);       
+    return f'{HOSTS["sina"]}/quotes_service/api/json_v2.php/CN_MarketData.getKLineData?symbol={code}&scale={ts}&ma=5&datalen={count}' 
+
+def _parse_sina(content, end_date='', count=10, frequency='60m'):     #新浪K线解析
+    frequency=frequency.replace('1d','240m').replace('1w','1200m').replace('1M','7200m');   mcount=count
+    if (end_date!='') & (frequency in ['240m','1200m','7200m']): 
+        end_date=pd.to_datetime(end_date) if not isinstance(end_date,datetime.date) else end_date    #转换成datetime
+    dstr= _loads(content);       
+    df=_fast_frame(_sina_arrays, dstr, ['open','high','low','close','volume']) if FAST_PARSE else None
+    if df is not None:
+        if (end_date!='') & (frequency in ['240m','1200m','7200m']): return df[df.index<=end_date][-mcount:]   #日线带结束时间先返回
+        return df
     
     # 处理数据格式变化的情况
     if isinstance(dstr, list) and len(dstr) > 0:
@@ -98,18 +213,76 @@ def get_price_sina(code, end_date='', count=10, frequency='60m'):    #新浪全
     if (end_date!='') & (frequency in ['240m','1200m','7200m']): return df[df.index<=end_date][-mcount:]   #日线带结束时间先返回              
     return df
 
+#---腾讯实时行情---  一次请求获取多只股票的最新快照，字段以~分隔，直接解析成dict，不经过pandas
+QUOTE_BATCH=100                                                               #每次请求的股票数，受URL长度限制
+_QUOTE_FIELDS={'price':3,'pre_close':4,'open':5,'volume':6,'change_pct':32,'high':33,'low':34,'amount':37}   #字段序号
+_QUOTE_UNITS={'volume':100,'amount':10000}                                   #成交量 手->股, 成交额 万元->元，与日线单位一致
+
+def _qcode(code):                                                             #实时行情代码 600519 / 600519.XSHG -> sh600519
+    xcode=_xcode(code)
+    if len(xcode)!=6 or not xcode.isdigit(): return xcode
+    return ('bj' if xcode.startswith(('4','8','92')) else 'sh' if xcode[0] in '569' else 'sz')+xcode   #北交所920号段与 limit_up.limit_ratio 一致
+
+def _url_quote_tx(qcodes):  return HOSTS['tx_quote']+'/q='+','.join(qcodes)   #腾讯实时行情URL
+
+def _parse_quote_tx(content):                                                 #腾讯实时行情解析 -> {sh600519: {...}}
+    quotes={}
+    for line in content.decode('gbk',errors='ignore').split(';'):
+        key,sep,body=line.strip().partition('="')
+        if not sep: continue
+        f=body.rstrip('"').split('~')
+        if len(f)<38: continue                                                #停牌或代码不存在时字段不全
+        q={'name':f[1], 'code':f[2], 'time':f[30]}
+        for name,i in _QUOTE_FIELDS.items():
+            try:    q[name]=float(f[i])*_QUOTE_UNITS.get(name,1)
+            except ValueError: q[name]=None
+        quotes[key[key.rfind('_')+1:]]=q                                      #v_sh600519 -> sh600519
+    return quotes
+
+def get_quotes(codes, batch=None):                                            #批量实时行情，返回 {传入代码: 快照dict}，获取失败的代码不在结果中
+    batch=batch or QUOTE_BATCH;   qcodes={code:_qcode(code) for code in codes};    uniq=list(dict.fromkeys(qcodes.values()))
+    chunks=[uniq[i:i+batch] for i in range(0,len(uniq),batch)];    merged={}
+    def fetch(chunk):
+        try:    return _parse_quote_tx(_http_get(_url_quote_tx(chunk)))
+        except Exception as e: print(f'实时行情获取失败({len(chunk)}只): {e}');  return {}
+    if len(chunks)<=1: results=map(fetch,chunks)
+    else:
+        with ThreadPoolExecutor(max_workers=min(len(chunks),HTTP_CONFIG['pool_size'])) as pool: results=list(pool.map(fetch,chunks))
+    for r in results: merged.update(r)
+    return {code:merged[q] for code,q in qcodes.items() if q in merged}
+
+def _route(primary, backup):                                                #主力失败换备用；有路由时按健康状况排序，主力超过p95耗时再并发请求备用
+    if ROUTER is not None: return ROUTER.call([primary, backup])
+    try:    return primary[1]()
+    except: return backup[1]()
+
+def router_stats():                                                          #各数据源的请求数、失败率、p50/p95耗时(毫秒)、对冲次数、是否降级
+    return ROUTER.stats() if ROUTER is not None else {}
+
+def get_price_day(code, end_date='', count=10, frequency='1d'):            #日线/周线/月线：新浪为主，腾讯备用
+    return _route(('sina', lambda: get_price_sina( code,end_date=end_date,count=count,frequency=frequency)),    #主力
+                  ('tx',   lambda: get_price_day_tx(code,end_date=end_date,count=count,frequency=frequency)))   #备用
+
+def _xcode(code):                                                            #证券代码编码兼容处理 000001.XSHG -> sh000001
+    xcode= code.replace('.XSHG','').replace('.XSHE','')
+    return 'sh'+xcode if ('XSHG' in code)  else  'sz'+xcode  if ('XSHE' in code)  else code     
+
 def get_price(code, end_date='',count=10, frequency='1d', fields=[]):        #对外暴露只有唯一函数，这样对用户才是最友好的  
-    xcode= code.replace('.XSHG','').replace('.XSHE','')                      #证券代码编码兼容处理 
-    xcode='sh'+xcode if ('XSHG' in code)  else  'sz'+xcode  if ('XSHE' in code)  else code     
+    xcode=_xcode(code)
 
     if  frequency in ['1d','1w','1M']:   #1d日线  1w周线  1M月线
-         try:    return get_price_sina( xcode, end_date=end_date,count=count,frequency=frequency)   #主力
-         except: return get_price_day_tx(xcode,end_date=end_date,count=count,frequency=frequency)   #备用                    
+         if frequency=='1d' and not end_date and BAR_STORE:                  #最新日线走本地存储，只下载缺失的K线
+              return bar_store.get_daily(xcode, count, lambda c,n: get_price_day(c,count=n,frequency='1d'))
+         return get_price_day(xcode,end_date=end_date,count=count,frequency=frequency)
     
     if  frequency in ['1m','5m','15m','30m','60m']:  #分钟线 ,1m只有腾讯接口  5分钟5m   60分钟60m
+         if not end_date and MINUTE_STORE:                                   #当天K线够count根时直接从分钟线存储返回
+              try:    df=minute_store.get_bars(xcode, frequency, count, lambda c,n: get_price_min_tx(c,count=n,frequency='1m'))
+              except Exception as e: df=None;  print(f'{xcode}分钟线存储补齐失败，改为直接请求: {e}')    #腾讯补齐失败时走下面的新浪/腾讯路由
+              if df is not None: return df
          if frequency in '1m': return get_price_min_tx(xcode,end_date=end_date,count=count,frequency=frequency)
-         try:    return get_price_sina(  xcode,end_date=end_date,count=count,frequency=frequency)   #主力   
-         except: return get_price_min_tx(xcode,end_date=end_date,count=count,frequency=frequency)   #备用
+         return _route(('sina',   lambda: get_price_sina(  xcode,end_date=end_date,count=count,frequency=frequency)),   #主力
+                       ('tx_min', lambda: get_price_min_tx(xcode,end_date=end_date,count=count,frequency=frequency)))   #备用
         
 if __name__ == '__main__':    
     df=get_price('sh600519',frequency='1d',count=10)      #支持'1d'日, '1w'周, '1M'月  
@@ -118,5 +291,7 @@ if __name__ == '__main__':
     df=get_price('000001.XSHG',frequency='15m',count=10)  #支持'1m','5m','15m','30m','60m'
     print('上证指数分钟线\n',df)
 
+    print('实时行情\n',get_quotes(['600519','000001','sh000001']))
+
 # Ashare 股票行情数据( https://github.com/mpquant/Ashare ) 
 
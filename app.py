@@ -1,12 +1,26 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response
 import json
 import os
 import pyautogui
 import pygetwindow as gw
 import time
+import threading
 from datetime import datetime
 import shutil
+import uuid
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, wait
+import industry_index
+import screener
+import limit_up
+import margin
+import bar_store
+from ranking import RankingIndex
+from signals import SignalDetector
+from note_store import NoteStore
+from quote_scheduler import QuoteScheduler, MARKET_OPEN
+from indicators import IndicatorEngine
+from sqlite_store import SQLiteStore, migrate_from_json
 
 # 尝试导入akshare
 akshare_available = False
@@ -17,6 +31,14 @@ try:
 except ImportError:
     print("akshare未安装，将使用手动输入的行业信息")
 
+# 尝试导入orjson，用于快速序列化K线数组
+orjson_available = False
+try:
+    import orjson
+    orjson_available = True
+except ImportError:
+    pass
+
 app = Flask(__name__)
 
 # 配置
@@ -30,7 +52,18 @@ CONFIG = {
     "folders_file": os.path.join(USER_FOLDER, "folders.json"),
     "expanded_folders_file": os.path.join(USER_FOLDER, "expanded_folders.json"),
     "calendar_file": os.path.join(USER_FOLDER, "calendar.json"),
-    "images_folder": os.path.join(USER_FOLDER, "stock_images")
+    "images_folder": os.path.join(USER_FOLDER, "stock_images"),
+    "storage_backend": "json",  # 存储方式: "json" 或 "sqlite"
+    "sqlite_file": os.path.join(USER_FOLDER, "notebook.db"),
+    "refresh_workers": 16,  # 批量刷新行情的线程数
+    "refresh_deadline": 8,  # 批量刷新的截止时间（秒），超时的股票本次不更新
+    "notes_flush_interval": 2,  # 笔记写盘的防抖间隔（秒）
+    "kline_stream_chunk": 500,  # K线流式输出时每块的K线数
+    "kline_etag_seconds": 15,  # 盘中K线的ETag有效时间（秒），在此期间重复请求直接返回304，不访问网络
+    "limit_up_file": os.path.join("data", "limit_up.json"),  # 涨停次数统计缓存（与用户无关）
+    "quote_refresh_interval": 30,  # 交易时段后台刷新行情的间隔（秒）
+    "quote_idle_interval": 600,  # 非交易时段检查是否需要刷新的间隔（秒）
+    "quote_stream_heartbeat": 15,  # 行情推送没有变化时发送心跳的间隔（秒）
 }
 
 # 确保目录存在
@@ -41,23 +74,36 @@ if not os.path.exists(USER_FOLDER):
 if not os.path.exists(CONFIG["images_folder"]):
     os.makedirs(CONFIG["images_folder"])
 
+# 存储后端
+# json: 笔记常驻内存，修改在防抖间隔后批量写盘；文件夹、日历整文件读写
+# sqlite: 所有数据按行存储在一个数据库中，首次启动时从JSON文件迁移
+sqlite_store = None
+if CONFIG["storage_backend"] == "sqlite":
+    sqlite_store = SQLiteStore(CONFIG["sqlite_file"])
+    if sqlite_store.is_empty():
+        migrate_from_json(sqlite_store, USER_FOLDER)
+    notes_store = sqlite_store
+else:
+    notes_store = NoteStore(CONFIG["data_file"], CONFIG["notes_flush_interval"])
+
+# 文件夹、日历的内容版本号，内容有变化的保存才加1，用于生成ETag
+data_versions = {"folders": 0, "calendar": 0}
+
+# 进程启动标识，重启后ETag全部失效
+BOOT_ID = uuid.uuid4().hex[:8]
+
 # 加载笔记数据
 def load_notes():
-    if os.path.exists(CONFIG["data_file"]):
-        try:
-            with open(CONFIG["data_file"], "r", encoding="utf-8") as f:
-                return json.load(f)
-        except:
-            return {}
-    return {}
+    return notes_store.all()
 
 # 保存笔记数据
 def save_notes(notes):
-    with open(CONFIG["data_file"], "w", encoding="utf-8") as f:
-        json.dump(notes, f, ensure_ascii=False, indent=2)
+    notes_store.replace_all(notes)
 
 # 加载文件夹结构
 def load_folders():
+    if sqlite_store is not None:
+        return sqlite_store.load_folders()
     if os.path.exists(CONFIG["folders_file"]):
         try:
             with open(CONFIG["folders_file"], "r", encoding="utf-8") as f:
@@ -68,6 +114,13 @@ def load_folders():
 
 # 保存文件夹结构
 def save_folders(folders):
+    # 页面定时自动保存，内容没有变化时不写盘、不改版本号，避免ETag失效
+    if folders == load_folders():
+        return
+    data_versions["folders"] += 1
+    if sqlite_store is not None:
+        sqlite_store.save_folders(folders)
+        return
     try:
         print(f'保存文件夹结构到: {CONFIG["folders_file"]}')
         print(f'文件夹结构内容: {folders}')
@@ -85,6 +138,8 @@ def save_folders(folders):
 
 # 加载展开的文件夹状态
 def load_expanded_folders():
+    if sqlite_store is not None:
+        return sqlite_store.load_expanded_folders()
     if os.path.exists(CONFIG["expanded_folders_file"]):
         try:
             with open(CONFIG["expanded_folders_file"], "r", encoding="utf-8") as f:
@@ -95,11 +150,19 @@ def load_expanded_folders():
 
 # 保存展开的文件夹状态
 def save_expanded_folders(expanded_folders):
+    if expanded_folders == load_expanded_folders():
+        return
+    data_versions["folders"] += 1
+    if sqlite_store is not None:
+        sqlite_store.save_expanded_folders(expanded_folders)
+        return
     with open(CONFIG["expanded_folders_file"], "w", encoding="utf-8") as f:
         json.dump(expanded_folders, f, ensure_ascii=False, indent=2)
 
 # 加载日历数据
 def load_calendar():
+    if sqlite_store is not None:
+        return sqlite_store.load_calendar()
     if os.path.exists(CONFIG["calendar_file"]):
         try:
             with open(CONFIG["calendar_file"], "r", encoding="utf-8") as f:
@@ -109,25 +172,20 @@ def load_calendar():
     return {}
 
 # 保存日历数据
+def _calendar_days(calendar_data):
+    """去掉没有股票的日期：SQLite存储不保存空日期，比较前两边都去掉才能判断内容是否变化"""
+    return {date: codes for date, codes in calendar_data.items() if codes}
+
 def save_calendar(calendar_data):
+    if _calendar_days(calendar_data) == _calendar_days(load_calendar()):
+        return
+    data_versions["calendar"] += 1
+    if sqlite_store is not None:
+        sqlite_store.save_calendar(calendar_data)
+        return
     with open(CONFIG["calendar_file"], "w", encoding="utf-8") as f:
         json.dump(calendar_data, f, ensure_ascii=False, indent=2)
 
-# 加载本地行业信息
-def load_industry_data():
-    """加载本地行业信息文件"""
-    industry_file = "sw_three_industries_2026.json"
-    if os.path.exists(industry_file):
-        try:
-            with open(industry_file, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception as e:
-            print(f"加载行业信息文件失败: {e}")
-            return {}
-    else:
-        print(f"行业信息文件 {industry_file} 不存在")
-        return {}
-
 # ==================== 核心计算函数 ====================
 
 def calculate_ma5_distance(current_price, ma5_price):
@@ -155,32 +213,6 @@ def calculate_ma5_distance(current_price, ma5_price):
         return None
 
 
-def calculate_ma5_from_history(df_history):
-    """
-    从历史数据计算5日均线值
-    
-    Args:
-        df_history: 包含'close'列的DataFrame（最近20天日线数据）
-    
-    Returns:
-        float: MA5值（保留2位小数），数据不足返回None
-    """
-    if df_history is None or df_history.empty:
-        return None
-    
-    # 确保收盘价是数值类型
-    df_history['close'] = pd.to_numeric(df_history['close'], errors='coerce')
-    df_history = df_history.dropna(subset=['close'])
-    
-    if len(df_history) >= 5:
-        # 计算最近5天的平均值
-        recent_5_days = df_history['close'].tail(5)
-        ma5_value = recent_5_days.mean()
-        return round(ma5_value, 2)
-    else:
-        return None
-
-
 def get_stock_history_data(stock_code, days=20):
     """
     获取股票历史日线数据（用于计算MA5）
@@ -212,29 +244,177 @@ def get_stock_history_data(stock_code, days=20):
         print(f"获取{stock_code}历史数据失败: {str(e)}")
         return None
 
+
+# 批量刷新用的线程池，常驻以免每次请求都创建线程
+refresh_pool = ThreadPoolExecutor(max_workers=CONFIG["refresh_workers"])
+
+# 最近一次批量刷新的统计信息
+last_refresh_stats = {}
+
+
+def _timed_history_fetch(code):
+    """获取历史数据并记录耗时，返回 (DataFrame或None, 耗时秒数)"""
+    start = time.perf_counter()
+    df = get_stock_history_data(code)
+    return df, time.perf_counter() - start
+
+
+def refresh_history_batch(codes, deadline=None):
+    """
+    并发获取多只股票的历史日线数据
+    
+    在线程池中并发请求，最多等待deadline秒，超时未返回的股票计入失败，
+    已完成的结果照常返回（部分结果）。
+    
+    Args:
+        codes: 股票代码列表
+        deadline: 截止时间（秒），默认使用CONFIG["refresh_deadline"]
+    
+    Returns:
+        tuple: (results, stats)
+            results: {code: DataFrame}，只包含成功的股票
+            stats: {"total", "succeeded", "failed", "timed_out", "latency", "elapsed"}
+                latency为 {code: 毫秒}，只统计已返回的股票
+    """
+    global last_refresh_stats
+    if deadline is None:
+        deadline = CONFIG["refresh_deadline"]
+    
+    start = time.perf_counter()
+    futures = {refresh_pool.submit(_timed_history_fetch, code): code for code in codes}
+    done, not_done = wait(futures, timeout=deadline)
+    
+    results = {}
+    latency = {}
+    failed = []
+    for future in done:
+        code = futures[future]
+        try:
+            df, cost = future.result()
+        except Exception as e:
+            print(f"获取{code}历史数据失败: {str(e)}")
+            failed.append(code)
+            continue
+        latency[code] = round(cost * 1000, 1)
+        if df is not None and not df.empty:
+            results[code] = df
+        else:
+            failed.append(code)
+    
+    # 超时的任务继续在后台跑完，但本次不再等待
+    timed_out = [futures[future] for future in not_done]
+    
+    stats = {
+        "total": len(codes),
+        "succeeded": len(results),
+        "failed": sorted(failed),
+        "timed_out": sorted(timed_out),
+        "latency": latency,
+        "elapsed": round((time.perf_counter() - start) * 1000, 1),
+    }
+    last_refresh_stats = stats
+    print(f"批量刷新完成: {stats['succeeded']}/{stats['total']} 成功, "
+          f"失败 {len(failed)}, 超时 {len(timed_out)}, 耗时 {stats['elapsed']}ms")
+    return results, stats
+
+
+def get_realtime_quotes(codes):
+    """
+    批量获取实时行情（每100只股票一次请求）
+
+    Returns:
+        dict: {code: 快照}，快照字段见Ashare.get_quotes，失败返回空字典
+    """
+    if not codes:
+        return {}
+    try:
+        import Ashare
+        return Ashare.get_quotes(codes)
+    except Exception as e:
+        print(f"获取实时行情失败: {str(e)}")
+        return {}
+
+
+def snapshot_day(snapshot):
+    """实时快照的行情日期，格式不对返回None"""
+    try:
+        return datetime.strptime(snapshot.get('time', '')[:8], '%Y%m%d').date()
+    except ValueError:
+        return None
+
+
+# 增量指标：每只股票每天用已完成的日线初始化一次，之后每次刷新只叠加实时价（O(1)）
+indicator_engine = IndicatorEngine()
+indicator_days = {}  # code -> 初始化的日期
+
+
+def seed_indicators(codes):
+    """用日线初始化当天还没有初始化过的股票，当天未完成的K线作为实时价叠加"""
+    today = datetime.now().date()
+    stale = [code for code in codes if indicator_days.get(code) != today]
+    if not stale:
+        return
+    histories, _ = refresh_history_batch(stale)
+    today_start = pd.Timestamp(today)
+    for code, df_history in histories.items():
+        indicator_engine.load(code, df_history[df_history.index < today_start])
+        current = df_history[df_history.index >= today_start]
+        if not current.empty:
+            bar = current.iloc[-1]
+            indicator_engine.set_live(code, bar['close'], bar['high'], bar['low'], bar['volume'], day=today)
+        indicator_days[code] = today
+
+
+def refresh_quotes(codes):
+    """
+    批量刷新行情，返回 {code: 收盘价、MA5、距五日线幅度、涨幅等字段}
+
+    日线每天只下载一次用于初始化指标，之后每次刷新只请求一次批量实时行情；
+    实时行情获取失败时沿用上一次的实时价
+    """
+    seed_indicators(codes)
+    snapshots = get_realtime_quotes(codes)
+    quotes = {}
+    for code in codes:
+        snapshot = snapshots.get(code)
+        if snapshot is not None and snapshot.get('price'):  # 停牌或未开盘时现价为0
+            indicator_engine.set_live(code, snapshot['price'], snapshot.get('high') or None,
+                                      snapshot.get('low') or None, snapshot.get('volume'),
+                                      day=snapshot_day(snapshot))
+        values = indicator_engine.values(code)
+        if values is None or values['close'] is None:
+            continue
+        quote = {'close': values['close']}
+        if values['ma5']:
+            quote['ma5'] = values['ma5']
+            quote['ma5_distance'] = calculate_ma5_distance(values['close'], values['ma5'])
+        if values['change_percent'] is not None:
+            quote['change_percent'] = values['change_percent']
+            quote['yesterdayPrice'] = values['prev_close']
+        quotes[code] = quote
+    return quotes
+
+
+# 后台行情刷新，GET /api/notes 只读取内存中的行情表
+quote_scheduler = QuoteScheduler(
+    lambda: list(notes_store.all().keys()),
+    refresh_quotes,
+    interval=CONFIG["quote_refresh_interval"],
+    idle_interval=CONFIG["quote_idle_interval"],
+)
+
 # 获取股票行业信息
 def get_stock_industry(code):
-    """从本地JSON文件获取股票的行业信息"""
+    """从本地行业索引获取股票的行业信息"""
     try:
         # 直接使用6位股票代码
         stock_code = code[-6:] if len(code) > 6 else code
         print(f"尝试获取股票 {stock_code} 的行业信息...")
         
-        # 加载行业数据
-        industry_data = load_industry_data()
-        
-        # 遍历所有行业
-        for industry_name, industry_info in industry_data.items():
-            stocks = industry_info.get('stocks', [])
-            for stock in stocks:
-                # 获取股票代码并提取6位数字部分
-                stock_code_full = stock.get('代码', '')
-                if stock_code_full:
-                    # 提取6位数字代码
-                    stock_code_in_file = stock_code_full.split('.')[0]
-                    if stock_code_in_file == stock_code:
-                        print(f"找到股票 {stock_code} 的行业: {industry_name}")
-                        return industry_name
+        industry_name = industry_index.get_industry(stock_code)
+        if industry_name:
+            print(f"找到股票 {stock_code} 的行业: {industry_name}")
+            return industry_name
         
         print(f"未在本地行业信息中找到股票 {stock_code}")
                 
@@ -360,50 +540,53 @@ def open_in_ths(code):
             print(f"全局输入也失败: {e2}")
             return False
 
+# ==================== HTTP缓存 ====================
+
+def not_modified(etag):
+    """请求头If-None-Match与etag一致时返回304响应，否则返回None"""
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    return None
+
+
+def conditional_response(response, etag, last_modified=None):
+    """设置ETag/Last-Modified，客户端缓存仍然有效时转换为304"""
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'no-cache'  # 允许缓存，但每次使用前都要向服务器确认
+    return response.make_conditional(request)
+
 @app.route('/')
 def index():
     from flask import send_file
     return send_file('股票笔记本.html')
 
-@app.route('/api/notes', methods=['GET'])
-def get_notes():
+def merged_notes():
+    """所有笔记合并后台刷新的行情字段，不访问网络也不写盘"""
     notes = load_notes()
-    
-    # 每次获取笔记时更新所有股票的涨幅和偏离五日线幅度
-    updated_notes = {}
+    quotes = quote_scheduler.get_quotes()
     for code, note in notes.items():
-        # 获取历史数据
-        df_history = get_stock_history_data(code)
-        if df_history is not None and not df_history.empty:
-            # 使用历史数据中的最新收盘价
-            current_price = df_history['close'].iloc[-1]
-            note['close'] = current_price
-            
-            # 计算MA5
-            ma5_price = calculate_ma5_from_history(df_history)
-            if ma5_price:
-                # 计算距五日线幅度
-                ma5_distance = calculate_ma5_distance(current_price, ma5_price)
-                note['ma5'] = ma5_price
-                note['ma5_distance'] = ma5_distance
-            
-            # 计算涨幅（如果有昨日收盘价）
-            if len(df_history) >= 2:
-                yesterday_close = df_history['close'].iloc[-2]
-                if yesterday_close > 0:
-                    change_percent = ((float(current_price) - yesterday_close) / yesterday_close) * 100
-                    note['change_percent'] = round(change_percent, 2)
-                    note['yesterdayPrice'] = yesterday_close
-        updated_notes[code] = note
+        quote = quotes.get(code)
+        if quote:
+            note.update(quote)
+    return notes
+
+@app.route('/api/notes', methods=['GET'])
+def get_notes():
+    quote_scheduler.ensure_started()
+    etag = f"notes-{BOOT_ID}-{notes_store.version}-{quote_scheduler.version}"
+    cached = not_modified(etag)
+    if cached:
+        return cached
     
-    # 保存更新后的笔记
-    save_notes(updated_notes)
-    return jsonify(updated_notes)
+    return conditional_response(jsonify(merged_notes()), etag)
 
 @app.route('/api/notes', methods=['POST'])
 def save_note():
     data = request.json
-    notes = load_notes()
     code = data.get('code')
     if code:
         # 检查是否需要自动获取行业信息
@@ -416,43 +599,29 @@ def save_note():
             else:
                 print("无法获取行业信息，使用空值")
         
-        # 获取历史数据计算收盘价、涨幅和距五日线幅度
-        df_history = get_stock_history_data(code)
-        if df_history is not None and not df_history.empty:
-            # 使用历史数据中的最新收盘价
-            current_price = df_history['close'].iloc[-1]
-            data['close'] = current_price
-            
-            # 计算MA5
-            ma5_price = calculate_ma5_from_history(df_history)
-            if ma5_price:
-                # 计算距五日线幅度
-                ma5_distance = calculate_ma5_distance(current_price, ma5_price)
-                data['ma5'] = ma5_price
-                data['ma5_distance'] = ma5_distance
-            
-            # 计算涨幅（如果有昨日收盘价）
-            if len(df_history) >= 2:
-                yesterday_close = df_history['close'].iloc[-2]
-                if yesterday_close > 0:
-                    change_percent = ((float(current_price) - yesterday_close) / yesterday_close) * 100
-                    data['change_percent'] = round(change_percent, 2)
-                    data['yesterdayPrice'] = yesterday_close
+        # 行情字段使用后台已刷新的数据，新股票交给后台立即刷新
+        quote = quote_scheduler.get_quote(code)
+        if quote:
+            data.update(quote)
+        else:
+            quote_scheduler.ensure_started()
+            quote_scheduler.request_refresh([code])
         
-        notes[code] = data
-        save_notes(notes)
+        notes_store.upsert(code, data)
         return jsonify({"status": "success"})
     return jsonify({"status": "error", "message": "股票代码不能为空"}), 400
 
 @app.route('/api/notes/<code>', methods=['DELETE'])
 def delete_note(code):
-    notes = load_notes()
-    if code in notes:
-        del notes[code]
-        save_notes(notes)
+    if notes_store.delete(code):
         return jsonify({"status": "success"})
     return jsonify({"status": "error", "message": "笔记不存在"}), 404
 
+@app.route('/api/notes/refresh_stats', methods=['GET'])
+def get_refresh_stats():
+    """返回最近一次批量刷新的耗时和失败股票"""
+    return jsonify(last_refresh_stats)
+
 @app.route('/api/open_ths', methods=['POST'])
 def open_ths():
     data = request.json
@@ -468,9 +637,13 @@ def open_ths():
 # 文件夹结构相关API
 @app.route('/api/folders', methods=['GET'])
 def get_folders():
+    etag = f"folders-{BOOT_ID}-{data_versions['folders']}"
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
     folders = load_folders()
     expanded_folders = load_expanded_folders()
-    return jsonify({"folders": folders, "expanded_folders": expanded_folders})
+    return conditional_response(jsonify({"folders": folders, "expanded_folders": expanded_folders}), etag)
 
 @app.route('/api/folders', methods=['POST'])
 def save_folders_api():
@@ -486,16 +659,8 @@ def save_folders_api():
         print('保存的文件夹结构:', folders)
         print('保存的展开状态:', expanded_folders)
         
-        # 强制创建用户目录
-        os.makedirs(os.path.dirname(CONFIG["folders_file"]), exist_ok=True)
-        os.makedirs(os.path.dirname(CONFIG["expanded_folders_file"]), exist_ok=True)
-        
-        # 直接保存文件，不使用封装函数以减少潜在问题
-        with open(CONFIG["folders_file"], "w", encoding="utf-8") as f:
-            json.dump(folders, f, ensure_ascii=False, indent=2)
-        
-        with open(CONFIG["expanded_folders_file"], "w", encoding="utf-8") as f:
-            json.dump(expanded_folders, f, ensure_ascii=False, indent=2)
+        save_folders(folders)
+        save_expanded_folders(expanded_folders)
         
         print('文件夹结构保存成功')
         return jsonify({"status": "success"})
@@ -506,8 +671,12 @@ def save_folders_api():
 # 日历数据相关API
 @app.route('/api/calendar', methods=['GET'])
 def get_calendar():
+    etag = f"calendar-{BOOT_ID}-{data_versions['calendar']}"
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
     calendar_data = load_calendar()
-    return jsonify(calendar_data)
+    return conditional_response(jsonify(calendar_data), etag)
 
 @app.route('/api/calendar', methods=['POST'])
 def save_calendar_api():
@@ -515,6 +684,380 @@ def save_calendar_api():
     save_calendar(calendar_data)
     return jsonify({"status": "success"})
 
+# ==================== 实时行情推送 ====================
+
+# 推送给页面的行情字段
+STREAM_FIELDS = ('close', 'change_percent', 'ma5_distance')
+
+# 文件夹中的股票代码，按文件夹版本号缓存，避免每次推送都读取文件夹
+_folder_codes_cache = {"version": None, "codes": frozenset()}
+
+
+def folder_stock_codes():
+    """所有文件夹中的股票代码（不含子文件夹）"""
+    version = data_versions["folders"]
+    if _folder_codes_cache["version"] != version:
+        codes = set()
+        for folder in load_folders().values():
+            codes.update(item for item in folder.get("items", []) if not item.startswith("folder_"))
+        _folder_codes_cache["codes"] = frozenset(codes)
+        _folder_codes_cache["version"] = version
+    return _folder_codes_cache["codes"]
+
+
+@app.route('/api/quotes/stream', methods=['GET'])
+def stream_quotes():
+    """
+    Server-Sent Events推送行情变化
+
+    每次后台刷新后推送一条消息，只包含文件夹中股票有变化的字段:
+    data: {"600519": {"close": 1500.0, "change_percent": 1.2}}
+    """
+    quote_scheduler.ensure_started()
+    heartbeat = CONFIG["quote_stream_heartbeat"]
+
+    def generate():
+        subscription = quote_scheduler.subscribe()
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                delta = subscription.get(timeout=heartbeat)
+                codes = folder_stock_codes()
+                payload = {}
+                for code, fields in delta.items():
+                    if code not in codes:
+                        continue
+                    changed = {k: fields[k] for k in STREAM_FIELDS if k in fields}
+                    if changed:
+                        payload[code] = changed
+                if payload:
+                    yield f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+                else:
+                    yield ": ping\n\n"  # 心跳，同时用于发现已断开的连接
+        finally:
+            quote_scheduler.unsubscribe(subscription)
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# ==================== 排序表 ====================
+
+# 自然年涨停次数，每个交易日只增量下载新增的K线
+limit_up_counter = limit_up.LimitUpCounter(
+    CONFIG["limit_up_file"],
+    lambda code, count: get_stock_history_data(code, days=count),
+    workers=CONFIG["refresh_workers"],
+)
+
+
+# 排序表的列：代码、名称、现价、涨幅、今年涨停次数、距五日线幅度、近20日涨幅
+RANK_COLUMNS = ("code", "name", "close", "change_percent", "limit_up_count", "ma5_distance", "return_20d")
+
+# 每列一个有序索引，随行情变化增量维护
+ranking_index = RankingIndex(RANK_COLUMNS)
+ranking_lock = threading.Lock()
+ranking_state = {"notes_version": None, "signature": None, "day": None}
+ranking_subscription = quote_scheduler.subscribe()
+
+
+def quote_row(code, quote, now):
+    """排序表中随行情变化的列"""
+    # 开盘后现价是当天的盘中价，近20日涨幅以它为最后一天计算
+    intraday = now.weekday() < 5 and now.time() >= MARKET_OPEN
+    price = quote.get('close')
+    return {
+        "close": price,
+        "change_percent": quote.get('change_percent'),
+        "ma5_distance": quote.get('ma5_distance'),
+        "return_20d": limit_up_counter.return_20d(code, price if intraday else None, now.date()),
+    }
+
+
+# 涨停次数在后台增量更新，同一时间只有一个更新任务
+limit_up_state = {"future": None, "pending": None}
+
+
+def _limit_up_row(code, now):
+    """排序表中来自涨停统计的列"""
+    entry = limit_up_counter.get(code)
+    row = {"limit_up_count": entry["count"] if entry else None}
+    quote = quote_scheduler.get_quote(code)
+    if quote is not None:
+        row.update(quote_row(code, quote, now))
+    return row
+
+
+def _update_limit_up(codes, names):
+    """更新涨停次数和近20日涨幅的K线，完成后刷新排序表中对应的列"""
+    try:
+        limit_up_counter.update(codes, names)
+        now = datetime.now()
+        with ranking_lock:
+            for code in codes:
+                if code in ranking_index:
+                    ranking_index.update(code, _limit_up_row(code, now))
+    except Exception as e:
+        print(f"后台更新涨停次数失败: {str(e)}")
+    finally:
+        with ranking_lock:
+            limit_up_state["future"] = None
+            pending, limit_up_state["pending"] = limit_up_state["pending"], None
+            if pending is not None:
+                limit_up_state["future"] = refresh_pool.submit(_update_limit_up, *pending)
+
+
+def schedule_limit_up(codes, names):
+    """交给刷新线程池更新涨停次数，已有任务在运行时排在它之后（只保留最新的一次）；调用方持有ranking_lock"""
+    if limit_up_state["future"] is None:
+        limit_up_state["future"] = refresh_pool.submit(_update_limit_up, codes, names)
+    else:
+        limit_up_state["pending"] = (codes, names)
+
+
+def sync_ranking():
+    """
+    把排序索引更新到最新
+
+    笔记增删、股票名称变化或跨天时逐行比对（涨停次数交给后台增量更新，完成后再填入），
+    其余时候（包括只改了笔记内容）只应用后台刷新推送过来的行情变化
+    """
+    quote_scheduler.ensure_started()
+    now = datetime.now()
+    with ranking_lock:
+        delta = ranking_subscription.get(timeout=0)
+        if ranking_state["notes_version"] != notes_store.version or ranking_state["day"] != now.date():
+            notes_version = notes_store.version
+            # 排序表只用到笔记里的代码和名称，其余列来自行情
+            signature = frozenset((code, note.get('name')) for code, note in load_notes().items())
+            ranking_state["notes_version"] = notes_version
+            if signature != ranking_state["signature"] or ranking_state["day"] != now.date():
+                notes = merged_notes()
+                names = {code: note.get('name') or industry_index.get_stock_name(code) or ''
+                         for code, note in notes.items()}
+                schedule_limit_up(list(notes.keys()), names)
+                for code in ranking_index.codes():
+                    if code not in notes:
+                        ranking_index.remove(code)
+                for code, note in notes.items():
+                    entry = limit_up_counter.get(code)
+                    row = quote_row(code, note, now)
+                    row["name"] = names[code]
+                    row["limit_up_count"] = entry["count"] if entry else None
+                    ranking_index.update(code, row)
+                ranking_state.update(signature=signature, day=now.date())
+                return
+        for code in delta:
+            quote = quote_scheduler.get_quote(code)
+            if quote is not None and code in ranking_index:
+                ranking_index.update(code, quote_row(code, quote, now))
+
+
+@app.route('/api/sort_table', methods=['GET'])
+def get_sort_table():
+    """排序页面的完整表格，默认按涨幅从高到低排列"""
+    sync_ranking()
+    rows, _ = ranking_index.page("change_percent", descending=True)
+    return jsonify({"status": "success", "year": datetime.now().year, "data": rows})
+
+
+@app.route('/api/ranking', methods=['GET'])
+def get_ranking():
+    """
+    按任意列排序后分页返回
+
+    参数: column 排序列（默认change_percent），order desc/asc，offset 起始行，limit 行数（默认全部）
+    """
+    column = request.args.get('column', 'change_percent')
+    if column not in RANK_COLUMNS:
+        return jsonify({"status": "error", "message": f"不支持的排序列: {column}"}), 400
+    order = request.args.get('order', 'desc')
+    if order not in ('desc', 'asc'):
+        return jsonify({"status": "error", "message": f"不支持的排序方向: {order}"}), 400
+    offset = request.args.get('offset', 0, type=int)
+    limit = request.args.get('limit', type=int)
+
+    sync_ranking()
+    etag = f"ranking-{BOOT_ID}-{ranking_index.version}-{column}-{order}-{offset}-{limit}"
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    rows, total = ranking_index.page(column, descending=(order == 'desc'), offset=offset, limit=limit)
+    response = jsonify({"status": "success", "column": column, "order": order,
+                        "offset": offset, "total": total, "data": rows})
+    return conditional_response(response, etag)
+
+
+# ==================== 形态信号 ====================
+
+# 箱体突破/上升趋势/箱体震荡，按交易日缓存
+signal_detector = SignalDetector(fetch=lambda code, count: get_stock_history_data(code, days=count))
+
+
+@app.route('/api/signals', methods=['GET'])
+def get_signals():
+    """
+    形态信号，默认返回笔记本中所有股票
+
+    参数: industry 某个行业的所有股票，或 codes 逗号分隔的股票代码
+    返回: {code: {"signal", "box_high", "box_low", "last_day"}}，signal为空字符串表示无信号
+    """
+    industry = request.args.get('industry')
+    if industry:
+        codes = industry_index.get_industry_codes(industry)
+    elif request.args.get('codes'):
+        codes = [code.strip() for code in request.args['codes'].split(',') if code.strip()]
+    else:
+        codes = list(load_notes().keys())
+    return jsonify({"status": "success", "data": signal_detector.detect(codes)})
+
+# ==================== 融资数据 ====================
+
+# 融资数据和近一年日线在后台单线程下载，同一只股票每天只排队一次
+margin_pool = ThreadPoolExecutor(max_workers=1)
+margin_state = {"day": None, "done": set(), "queued": set()}
+margin_lock = threading.Lock()
+
+
+def _refresh_margin(codes):
+    """下载股价分位需要的近一年日线（本地日线存储只补缺少的部分）和缺少的融资数据"""
+    days = margin.MARGIN_CONFIG["history_days"]
+    failed = codes
+    try:
+        list(refresh_pool.map(lambda code: get_stock_history_data(code, days=days), codes))
+        updated = margin.update_many(codes)
+        failed = [code for code in codes if code not in updated]
+    except Exception as e:
+        print(f"后台更新融资数据失败: {str(e)}")
+    finally:
+        with margin_lock:
+            margin_state["done"].difference_update(failed)  # 获取失败的股票下次请求重新排队
+            margin_state["queued"].difference_update(codes)
+
+
+def schedule_margin_refresh(codes):
+    """把今天还没排队过的股票交给后台更新，返回仍在更新中的股票数"""
+    today = datetime.now().date()
+    with margin_lock:
+        if margin_state["day"] != today:
+            margin_state.update(day=today, done=set())
+        fresh = [code for code in codes
+                 if code not in margin_state["done"] and code not in margin_state["queued"]]
+        margin_state["done"].update(fresh)
+        margin_state["queued"].update(fresh)
+        pending = sum(1 for code in codes if code in margin_state["queued"])
+    if fresh:
+        margin_pool.submit(_refresh_margin, fresh)
+    return pending
+
+
+@app.route('/api/margin', methods=['GET'])
+def get_margin():
+    """
+    近N日融资净买入与股价分位，用于找低位融资大额净买入的股票（如长江电力）
+
+    参数: industry 某个行业，或 codes 逗号分隔的股票代码，默认笔记本中的所有股票；low=1 只返回低位股票
+    返回的pending为仍在后台下载数据的股票数，大于0时稍后再请求可以拿到更完整的结果
+    """
+    industry = request.args.get('industry')
+    if industry:
+        codes = industry_index.get_industry_codes(industry)
+    elif request.args.get('codes'):
+        codes = [code.strip() for code in request.args['codes'].split(',') if code.strip()]
+    else:
+        codes = list(load_notes().keys())
+
+    # 直接用本地存储计算，今天还没更新过的股票交给后台下载，下一次请求生效
+    pending = schedule_margin_refresh(codes)
+    rows = margin.low_position_buying(codes)
+    for row in rows:
+        row["name"] = industry_index.get_stock_name(row["code"]) or ''
+    if request.args.get('low') == '1':
+        rows = [row for row in rows if row["low_position"]]
+    return jsonify({"status": "success", "pending": pending, "data": rows})
+
+# ==================== 全市场选股 ====================
+
+def _parse_range(value):
+    """把 "最小值,最大值" 解析为元组，某一端为空表示不限"""
+    low, _, high = value.partition(',')
+    return (float(low) if low.strip() else None, float(high) if high.strip() else None)
+
+
+@app.route('/api/screener', methods=['GET'])
+def get_screener():
+    """
+    全市场选股，结果按行业分组
+
+    参数: 指标名=最小值,最大值（如 ma5_distance=-3,3&return_20d=10,），
+         sort 排序指标，asc=1 升序，top 每个行业最多返回的股票数，industry 只看某个行业（可多个）
+    """
+    try:
+        filters = {name: _parse_range(request.args[name]) for name in screener.METRICS if name in request.args}
+        sort_by = request.args.get('sort', 'return_20d')
+        if sort_by not in screener.METRICS:
+            return jsonify({"status": "error", "message": f"不支持的排序指标: {sort_by}"}), 400
+        top = request.args.get('top', type=int)
+        result = screener.screen(filters, sort_by=sort_by, ascending=request.args.get('asc') == '1',
+                                 top=top, industries=request.args.getlist('industry'))
+        return jsonify({"status": "success", "data": result})
+    except ValueError as e:
+        return jsonify({"status": "error", "message": f"参数格式错误: {str(e)}"}), 400
+
+KLINE_COLUMNS = ['open', 'close', 'high', 'low', 'volume']
+
+
+def _dumps(obj):
+    """序列化为JSON字节串，有orjson时直接读取NumPy数组"""
+    if orjson_available:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, ensure_ascii=False, default=lambda x: x.tolist()).encode('utf-8')
+
+
+def kline_columns(df, frequency='1d'):
+    """
+    K线DataFrame转换为按列的数组，整列转换，不逐行处理
+    
+    Returns:
+        dict: {'date': [...], 'open': ndarray, 'close': ndarray, ...}
+    """
+    date_format = '%Y-%m-%d' if frequency in ['1d', '1w', '1M'] else '%Y-%m-%d %H:%M'
+    columns = {'date': df.index.strftime(date_format).tolist()}
+    for col in KLINE_COLUMNS:
+        columns[col] = df[col].to_numpy(dtype='float64')
+    return columns
+
+
+def _kline_rows(columns):
+    """按列数组转换为逐条K线的字典列表（原有的返回格式）"""
+    values = [columns[col].tolist() for col in KLINE_COLUMNS]
+    return [dict(zip(['date'] + KLINE_COLUMNS, row)) for row in zip(columns['date'], *values)]
+
+
+def _kline_stream(columns, chunk_size):
+    """
+    分块输出K线（NDJSON）：第一行是汇总信息，之后每行是一块按列的数组
+    """
+    total = len(columns['date'])
+    yield _dumps({"status": "success", "format": "columnar", "count": total}) + b'\n'
+    for start in range(0, total, chunk_size):
+        chunk = {col: values[start:start + chunk_size] for col, values in columns.items()}
+        yield _dumps(chunk) + b'\n'
+
+
+def kline_version(stock_code, frequency, count):
+    """
+    K线内容的版本号，不访问网络，用于在取数据之前判断客户端缓存是否有效
+
+    本地日线存储已经是最新（不需要请求网络）时用最后一根K线的日期，
+    否则（盘中、分钟线）每kline_etag_seconds秒变化一次
+    """
+    import Ashare
+    if frequency == '1d' and Ashare.BAR_STORE:
+        stored, fetch_count, _ = bar_store.plan(Ashare._xcode(stock_code), count)
+        if stored is not None and fetch_count == 0:
+            return f"bars{stored['time'][-1]}"
+    return f"t{int(time.time() // CONFIG['kline_etag_seconds'])}"
+
 # 获取K线数据
 @app.route('/api/kline', methods=['GET'])
 def get_kline():
@@ -536,25 +1079,37 @@ def get_kline():
         elif code.startswith(('00', '30')):
             stock_code = f"{code}.XSHE"
         
+        # ETag由请求参数和K线版本决定，在获取K线之前判断，客户端缓存有效时不访问网络
+        etag = "kline-" + "-".join(str(x) for x in [
+            BOOT_ID, code, frequency, count, request.args.get('format', 'rows'), request.args.get('stream', '0'),
+            kline_version(stock_code, frequency, count),
+        ])
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
+
         # 获取K线数据
         df = Ashare.get_price(stock_code, frequency=frequency, count=count)
         
-        # 转换为JSON格式
-        if not df.empty:
-            # 处理数据格式
-            kline_data = []
-            for idx, row in df.iterrows():
-                kline_data.append({
-                    'date': idx.strftime('%Y-%m-%d'),
-                    'open': float(row['open']),
-                    'close': float(row['close']),
-                    'high': float(row['high']),
-                    'low': float(row['low']),
-                    'volume': float(row['volume'])
-                })
-            return jsonify({"status": "success", "data": kline_data})
-        else:
+        if df.empty:
             return jsonify({"status": "error", "message": "获取K线数据失败"}), 400
+        # 已收盘的日线不会再变化，可以用最后一根K线的日期作为Last-Modified
+        last_modified = None
+        if frequency == '1d' and df.index[-1].date() < datetime.now().date():
+            last_modified = df.index[-1].to_pydatetime()
+        
+        # format=columnar 返回按列的数组（date/open/close/high/low/volume各一个数组），
+        # 再加 stream=1 分块流式输出；默认保持逐条K线的格式
+        columns = kline_columns(df, frequency)
+        if request.args.get('format') == 'columnar':
+            if request.args.get('stream') == '1':
+                response = Response(_kline_stream(columns, CONFIG["kline_stream_chunk"]),
+                                    mimetype='application/x-ndjson')
+                return conditional_response(response, etag, last_modified)
+            payload = {"status": "success", "format": "columnar", "data": columns}
+        else:
+            payload = {"status": "success", "data": _kline_rows(columns)}
+        return conditional_response(Response(_dumps(payload), mimetype='application/json'), etag, last_modified)
             
     except Exception as e:
         print(f"获取K线数据失败: {e}")
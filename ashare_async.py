@@ -0,0 +1,259 @@
+#-*- coding:utf-8 -*-
+# Ashare 异步版：用 asyncio 并发获取成千上万只股票的行情，输出与 Ashare.get_price 相同的DataFrame
+# 安装了 aiohttp 时使用异步HTTP客户端；没有安装则在线程中调用 Ashare 的连接池（并发受默认线程池大小限制）
+# 数据源的健康统计与 Ashare.ROUTER 共用（降级、p95对冲）；日线走本地日线存储，当天分钟线走分钟线存储
+# 按域名限速（host_rate）：每秒100个请求时，本地日线为空的全市场首次下载（约5000只）至少需要50秒，
+# 之后每天只有增量请求；数据源允许时可以调高 ASYNC_CONFIG["host_rate"]
+#
+#   df  = asyncio.run(get_price_async('sh600519', count=20))
+#   dfs = get_prices(['sh600519', 'sz000001'], count=20)       # 同步代码中直接调用
+import asyncio, time, datetime
+from urllib.parse import urlsplit
+import Ashare, bar_store, minute_store
+
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+    print("未安装aiohttp（pip install aiohttp），ashare_async 改为在线程中请求，并发受默认线程池大小限制")
+
+ASYNC_CONFIG = {
+    "concurrency": 200,                     # 同时进行中的请求数上限
+    "host_rate": {                          # 每个域名每秒最多请求数
+        "money.finance.sina.com.cn": 100,
+        "web.ifzq.gtimg.cn": 100,
+        "ifzq.gtimg.cn": 100,
+    },
+    "default_rate": 50,                     # 未配置域名的每秒请求数
+    "timeout": 10,                          # 单个请求总超时（秒）
+}
+
+
+class _RateLimiter:
+    """令牌桶限速，每秒最多rate个请求"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class AsyncClient:
+    """
+    异步行情客户端，需要在 async with 中使用：
+
+        async with AsyncClient() as client:
+            df = await client.get_price('sh600519', count=20)
+
+    新浪为主、腾讯备用的规则与 Ashare.get_price 相同，日线、当天分钟线同样先读本地存储。
+    """
+
+    def __init__(self, concurrency=None):
+        self.concurrency = concurrency or ASYNC_CONFIG["concurrency"]
+        self._session = None
+        self._sem = None
+        self._limiters = {}
+
+    async def __aenter__(self):
+        self._sem = asyncio.Semaphore(self.concurrency)
+        if AIOHTTP_AVAILABLE:
+            timeout = aiohttp.ClientTimeout(total=ASYNC_CONFIG["timeout"])
+            connector = aiohttp.TCPConnector(limit=self.concurrency)
+            self._session = aiohttp.ClientSession(timeout=timeout, connector=connector)
+        return self
+
+    async def __aexit__(self, *exc):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _limiter(self, host):
+        if host not in self._limiters:
+            rate = ASYNC_CONFIG["host_rate"].get(host, ASYNC_CONFIG["default_rate"])
+            self._limiters[host] = _RateLimiter(rate)
+        return self._limiters[host]
+
+    async def _get(self, URL):
+        """限流后发出GET请求，返回响应内容"""
+        async with self._sem:
+            await self._limiter(urlsplit(URL).hostname).acquire()
+            if self._session is None:
+                return await asyncio.to_thread(Ashare._http_get, URL)
+            async with self._session.get(URL) as r:
+                r.raise_for_status()
+                return await r.read()
+
+    async def _sina(self, code, end_date='', count=10, frequency='60m'):
+        content = await self._get(Ashare._url_sina(code, end_date, count, frequency))
+        return Ashare._parse_sina(content, end_date, count, frequency)
+
+    async def _day_tx(self, code, end_date='', count=10, frequency='1d'):
+        content = await self._get(Ashare._url_day_tx(code, end_date, count, frequency))
+        return Ashare._parse_day_tx(content, code, frequency)
+
+    async def _min_tx(self, code, end_date=None, count=10, frequency='1m'):
+        content = await self._get(Ashare._url_min_tx(code, end_date, count, frequency))
+        return Ashare._parse_min_tx(content, code, frequency)
+
+    async def _timed(self, name, make):
+        """发出请求并把耗时、成败记入 Ashare.ROUTER 中该数据源的统计"""
+        health = Ashare.ROUTER.health(name)
+        start = time.perf_counter()
+        try:
+            result = await make()
+        except Exception:
+            health.record(False, time.perf_counter() - start)
+            raise
+        health.record(True, time.perf_counter() - start)
+        return result
+
+    async def _route(self, *attempts):
+        """
+        Ashare._route 的异步版：attempts 为 (数据源名, 返回协程的函数)，列表顺序为优先顺序
+
+        降级中的数据源排到最后；当前请求超过该数据源的p95耗时仍未返回时向下一个数据源发出对冲请求，
+        谁先成功用谁，其余请求取消
+        """
+        router = Ashare.ROUTER
+        if router is None:
+            try:
+                return await attempts[0][1]()
+            except Exception:
+                return await attempts[1][1]()
+        ordered = [a for a in attempts if not router.health(a[0]).demoted()]
+        ordered += [a for a in attempts if router.health(a[0]).demoted()]
+        loop = asyncio.get_running_loop()
+        pending = {}  # task -> 数据源名
+        last_error = None
+        try:
+            for index, (name, make) in enumerate(ordered):
+                if pending:
+                    router.health(name).count_hedge()
+                pending[asyncio.ensure_future(self._timed(name, make))] = name
+                hedge = index + 1 < len(ordered)
+                deadline = loop.time() + router.health(name).budget()
+                while pending:
+                    timeout = max(0.0, deadline - loop.time()) if hedge else None
+                    done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                    if not done:
+                        break  # 超过p95仍未返回，发出对冲请求
+                    for task in done:
+                        source = pending.pop(task)
+                        if task.exception() is None:
+                            router.health(source).count_win()
+                            return task.result()
+                        last_error = task.exception()
+                    if hedge and not pending:
+                        break  # 都失败了，立即换下一个数据源
+        finally:
+            for task in pending:
+                task.cancel()
+        raise last_error if last_error is not None else RuntimeError("没有可用的数据源")
+
+    async def _day(self, code, end_date='', count=10, frequency='1d'):
+        return await self._route(('sina', lambda: self._sina(code, end_date, count, frequency)),     # 主力
+                                 ('tx', lambda: self._day_tx(code, end_date, count, frequency)))     # 备用
+
+    async def _daily_from_store(self, code, count):
+        """
+        同 bar_store.get_daily：持有同一把每只股票的锁，和同步的 get_price 不会同时读写一个日线文件；
+        读写npz放到线程中，不阻塞事件循环
+        """
+        lock = bar_store._lock_for(code)
+        while not lock.acquire(blocking=False):   # 不在线程里阻塞等锁，避免占满默认线程池
+            await asyncio.sleep(0.01)
+        try:
+            now = datetime.datetime.now()
+            stored, n, full = await asyncio.to_thread(bar_store.plan, code, count, now)
+            df = await self._day(code, count=n) if n else None
+            df = await asyncio.to_thread(bar_store.merge, code, count, stored, df, full, now)
+            if df is None:
+                n = bar_store.refetch_count(count, stored)
+                df = await asyncio.to_thread(bar_store.merge, code, n, stored, await self._day(code, count=n), True, now)
+                if df is not None:
+                    df = df.tail(count)
+            return df
+        finally:
+            lock.release()
+
+    async def get_price(self, code, end_date='', count=10, frequency='1d'):
+        """参数和返回值与 Ashare.get_price 相同"""
+        xcode = Ashare._xcode(code)
+
+        if frequency in ['1d', '1w', '1M']:
+            if frequency == '1d' and not end_date and Ashare.BAR_STORE:
+                return await self._daily_from_store(xcode, count)
+            return await self._day(xcode, end_date, count, frequency)
+
+        if frequency in ['1m', '5m', '15m', '30m', '60m']:
+            if not end_date and Ashare.MINUTE_STORE:
+                # 分钟线存储的补齐是同步请求，放到线程中；当天K线不足count根或补齐失败时再走网络
+                try:
+                    df = await asyncio.to_thread(minute_store.get_bars, xcode, frequency, count,
+                                                 lambda c, n: Ashare.get_price_min_tx(c, count=n, frequency='1m'))
+                except Exception as e:
+                    print(f"{xcode}分钟线存储补齐失败，改为直接请求: {str(e)}")
+                    df = None
+                if df is not None:
+                    return df
+            if frequency == '1m':
+                return await self._min_tx(xcode, end_date, count, frequency)
+            return await self._route(('sina', lambda: self._sina(xcode, end_date, count, frequency)),        # 主力
+                                     ('tx_min', lambda: self._min_tx(xcode, end_date, count, frequency)))    # 备用
+
+    async def get_prices(self, codes, end_date='', count=10, frequency='1d'):
+        """
+        并发获取多只股票的行情
+
+        Returns:
+            dict: {code: DataFrame}，失败的股票不在结果中
+        """
+        async def one(code):
+            try:
+                return code, await self.get_price(code, end_date, count, frequency)
+            except Exception as e:
+                print(f"获取{code}行情失败: {str(e)}")
+                return code, None
+
+        results = await asyncio.gather(*(one(code) for code in codes))
+        return {code: df for code, df in results if df is not None and not df.empty}
+
+
+async def get_price_async(code, end_date='', count=10, frequency='1d'):
+    """单只股票的异步版 Ashare.get_price"""
+    async with AsyncClient() as client:
+        return await client.get_price(code, end_date, count, frequency)
+
+
+async def get_prices_async(codes, end_date='', count=10, frequency='1d', concurrency=None):
+    """多只股票的异步版 Ashare.get_price，返回 {code: DataFrame}"""
+    async with AsyncClient(concurrency) as client:
+        return await client.get_prices(codes, end_date, count, frequency)
+
+
+def get_prices(codes, end_date='', count=10, frequency='1d', concurrency=None):
+    """同步代码中调用 get_prices_async"""
+    return asyncio.run(get_prices_async(codes, end_date, count, frequency, concurrency))
+
+
+if __name__ == '__main__':
+    import json
+    with open('sw_three_industries_2026.json', 'r', encoding='utf-8') as f:
+        industries = json.load(f)
+    codes = [s['代码'] for info in industries.values() for s in info.get('stocks', [])]
+    start = time.time()
+    dfs = get_prices(codes, count=20)
+    print(f'获取{len(dfs)}/{len(codes)}只股票日线，耗时{time.time() - start:.1f}秒')
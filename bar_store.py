@@ -0,0 +1,210 @@
+#-*- coding:utf-8 -*-
+# 本地日线存储：每只股票一个 .npz 文件，按列保存 time/open/high/low/close/volume
+# Ashare.get_price 的日线请求先读这里，只从网络补齐上次存储之后缺少的K线
+import os, threading, datetime
+import numpy as np
+import pandas as pd
+
+STORE_DIR = os.path.join('data', 'bars')     # 存储目录
+COLUMNS = ['open', 'high', 'low', 'close', 'volume']   # 与新浪接口的列顺序一致
+MARKET_OPEN = datetime.time(9, 30)           # 开盘前当天还没有K线，不用请求
+NO_BARS_AFTER = datetime.time(9, 45)         # 晚于该时间仍取不到当天的K线，视为当天不交易
+MARKET_CLOSE = datetime.time(15, 5)          # 收盘后留几分钟，之后当天的K线视为已完成
+ADJUST_TOLERANCE = 1e-4                      # 重叠K线收盘价相对误差超过该值视为发生了除权
+VOLUME_TOLERANCE = 0.01                      # 重叠K线成交量相对误差超过该值视为单位或数据不一致（腾讯按手取整）
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _lock_for(symbol):
+    """每只股票一把锁，避免线程池里并发读写同一个文件"""
+    with _locks_guard:
+        if symbol not in _locks:
+            _locks[symbol] = threading.Lock()
+        return _locks[symbol]
+
+
+def to_symbol(code):
+    """6位股票代码转换为存储使用的带市场前缀的代码，已带前缀的原样返回"""
+    if len(code) != 6:
+        return code
+    return ('sh' if code[0] in '569' else 'sz') + code
+
+
+def _path(symbol):
+    return os.path.join(STORE_DIR, f'{symbol}_1d.npz')
+
+
+def load(symbol):
+    """
+    读取本地存储的日线
+
+    Returns:
+        dict: {'time': datetime64[D]数组, 各价格列: float64数组, 'complete': bool,
+            'checked': 开盘后请求过但没有新K线的日期（节假日、停牌，datetime64[D]，没有时不含该项）}，没有存储返回None
+    """
+    path = _path(symbol)
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as z:
+            bars = {k: z[k] for k in ['time'] + COLUMNS}
+            bars['complete'] = bool(z['complete'])
+            if 'checked' in z:
+                bars['checked'] = z['checked'][()]
+        return bars
+    except Exception as e:
+        print(f"读取{symbol}本地日线失败: {e}")
+        return None
+
+
+def save(symbol, bars):
+    """原子写入：先写临时文件再重命名，读者不会看到写了一半的文件"""
+    os.makedirs(STORE_DIR, exist_ok=True)
+    path = _path(symbol)
+    tmp = path + '.tmp.npz'
+    extra = {'checked': bars['checked']} if 'checked' in bars else {}
+    np.savez(tmp, complete=np.bool_(bars['complete']), **extra, **{k: bars[k] for k in ['time'] + COLUMNS})
+    os.replace(tmp, path)
+
+
+def _bars_from_frame(df, complete=False):
+    """Ashare返回的DataFrame转换为列数组"""
+    bars = {'time': df.index.values.astype('datetime64[D]')}
+    for col in COLUMNS:
+        bars[col] = df[col].to_numpy(dtype='float64')
+    bars['complete'] = complete
+    return bars
+
+
+def _frame_from_bars(bars):
+    """列数组转换为与Ashare输出相同格式的DataFrame"""
+    df = pd.DataFrame({col: bars[col] for col in COLUMNS},
+                      index=pd.DatetimeIndex(bars['time'].astype('datetime64[ns]')))
+    df.index.name = ''
+    return df
+
+
+def _completed(df, now):
+    """只保留已经收盘的K线，盘中当天的K线不写入存储"""
+    today = np.datetime64(now.date(), 'D')
+    days = df.index.values.astype('datetime64[D]')
+    if now.time() >= MARKET_CLOSE:
+        return df[days <= today]
+    return df[days < today]
+
+
+def _append(stored, bars):
+    merged = {k: np.concatenate([stored[k], bars[k]]) for k in ['time'] + COLUMNS}
+    merged['complete'] = stored['complete']
+    return merged
+
+
+def _consistent(row, stored):
+    """网络取回的重叠K线与本地最后一根是否一致：收盘价不同说明除权，成交量不同说明单位或数据源不一致"""
+    close, volume = stored['close'][-1], stored['volume'][-1]
+    if abs(row['close'] - close) > ADJUST_TOLERANCE * close:
+        return False
+    return abs(row['volume'] - volume) <= VOLUME_TOLERANCE * max(volume, 1.0)
+
+
+def plan(symbol, count, now=None):
+    """
+    根据本地存储决定需要从网络取多少根K线
+
+    Returns:
+        tuple: (stored, fetch_count, full)
+            stored: load()的结果或None
+            fetch_count: 需要请求的K线数量，0表示本地数据已经足够
+            full: True表示整体下载，False表示增量补齐
+    """
+    now = now or datetime.datetime.now()
+    stored = load(symbol)
+    if stored is None or (len(stored['time']) < count and not stored['complete']):
+        return stored, count, True
+    last = stored['time'][-1]
+    today = np.datetime64(now.date(), 'D')
+    if stored.get('checked') == today:                 # 今天开盘后已经确认没有新K线（节假日、停牌）
+        return stored, 0, False
+    target = today if now.time() >= MARKET_OPEN else today - 1
+    gap = int(np.busday_count(last + 1, target + 1))   # 上次存储之后到今天（开盘前到昨天）的工作日数
+    if gap <= 0:
+        return stored, 0, False
+    return stored, gap + 1, False                      # +1 取回一根已存储的K线做除权校验
+
+
+def merge(symbol, count, stored, df, full, now=None):
+    """
+    把网络取回的K线合并进本地存储，返回最近count根
+
+    Returns:
+        DataFrame: 合并后的K线；返回None表示检测到除权，需要按refetch_count()整体重新下载
+        plan()返回fetch_count为0时传入df=None，直接返回本地存储的K线
+    """
+    now = now or datetime.datetime.now()
+    if full:
+        if df is None or df.empty:
+            return df
+        done = _completed(df, now)
+        if not done.empty:
+            # 返回的K线比请求的少，说明已经取到上市以来的全部数据
+            save(symbol, _bars_from_frame(done, complete=len(df) < count))
+        return df.tail(count)
+
+    if df is None or df.empty:
+        return _frame_from_bars(stored).tail(count)
+    last = stored['time'][-1]
+    new_days = df.index.values.astype('datetime64[D]')
+    overlap = df[new_days == last]
+    if overlap.empty or not _consistent(overlap.iloc[-1], stored):
+        print(f"{symbol}本地日线与网络数据不一致（可能除权），重新下载")
+        return None
+
+    fresh = df[new_days > last]
+    if fresh.empty and now.time() >= NO_BARS_AFTER:
+        # 开盘一段时间后仍然没有比本地更新的K线：今天不交易，记下日期，当天不再请求
+        stored = dict(stored, checked=np.datetime64(now.date(), 'D'))
+        save(symbol, stored)
+    done = _completed(fresh, now)
+    if not done.empty:
+        stored = _append(stored, _bars_from_frame(done))
+        save(symbol, stored)
+    result = _frame_from_bars(stored)
+    live = fresh.iloc[len(done):]                      # 盘中当天的K线只返回不存储
+    if not live.empty:
+        result = pd.concat([result, live[COLUMNS]])
+    return result.tail(count)
+
+
+def refetch_count(count, stored):
+    """除权后整体重新下载的数量，至少覆盖原来已存储的K线"""
+    return max(count, len(stored['time']))
+
+
+def get_daily(symbol, count, fetch):
+    """
+    读取最近count根日线，本地缺失的部分调用fetch从网络补齐
+
+    已收盘的交易日只下载一次并追加到本地存储；增量请求会多取一根已存储的K线，
+    用它的收盘价、成交量检查是否发生了除权或混入了不同单位的数据，有不一致就整体重新下载。
+    开盘前不请求当天的K线；开盘后确认当天没有K线（节假日、停牌）时记下日期，当天不再请求。
+
+    Args:
+        symbol: 带市场前缀的代码，如 'sh600519'
+        count: 需要的K线数量
+        fetch: fetch(symbol, count) -> DataFrame，返回最近count根日线
+
+    Returns:
+        DataFrame: 与Ashare.get_price相同格式
+    """
+    now = datetime.datetime.now()
+    with _lock_for(symbol):
+        stored, n, full = plan(symbol, count, now)
+        df = merge(symbol, count, stored, fetch(symbol, n) if n else None, full, now)
+        if df is None:
+            n = refetch_count(count, stored)
+            df = merge(symbol, n, stored, fetch(symbol, n), True, now)
+            if df is not None:
+                df = df.tail(count)
+        return df
@@ -0,0 +1,305 @@
+# -*- coding:utf-8 -*-
+# 行情链路基准测试：启动本地行情服务器（bench_server）回放新浪/腾讯响应，可注入延迟和错误，
+# 在 10/100/1000/5000 只股票规模下测量
+#   get_price        Ashare.get_price 日线（本地日线存储为空，含请求+解析+写存储）
+#   get_price_cached 同一批股票再取一次（读本地存储，只补缺失部分）
+#   notes_refresh    后台行情刷新一轮（首轮含日线初始化，之后只取实时行情）
+#   get_notes        GET /api/notes
+#   kline            GET /api/kline
+#   block_analyze    BlockAnalyzer.analyze（首轮含日线、分钟线补齐）
+# 每项记录吞吐量和 p50/p95/p99，结果写入 data/bench/ 下的JSON报告，可与之前的报告对比：
+#   python bench_ashare.py
+#   python bench_ashare.py --sizes 10 100 --latency 50 --error-rate 0.02
+#   python bench_ashare.py --compare data/bench/bench_20261018_204500.json
+# 所有存储都放在临时目录中，不读写用户的笔记和本地日线
+import os
+import json
+import time
+import argparse
+import datetime
+import platform
+import tempfile
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import Ashare
+import bar_store
+import bench_server
+
+BENCH_CONFIG = {
+    "sizes": (10, 100, 1000, 5000),
+    "workers": 16,          # 并发请求的线程数
+    "count": 120,           # 每次请求的K线数
+    "repeat": 20,           # get_notes / notes_refresh / block_analyze 每个规模重复的次数
+    "report_dir": os.path.join("data", "bench"),
+    "benchmarks": ("get_price", "get_price_cached", "notes_refresh", "get_notes", "kline", "block_analyze"),
+}
+
+MONITOR_FILE = "选股功能_量比计算_3200x2000.py"
+
+
+def universe(n):
+    """n只模拟股票代码，沪深交替：600000, 000001, 600001, 000002, ..."""
+    half = (n + 1) // 2
+    sh = [f"{600000 + i:06d}" for i in range(half)]
+    sz = [f"{1 + i:06d}" for i in range(n - half)]
+    return [code for pair in zip(sh, sz + [None]) for code in pair if code is not None][:n]
+
+
+def summarize(latencies, errors, wall):
+    """
+    汇总一组耗时（秒）
+
+    Returns:
+        dict: 次数、失败数、总耗时、吞吐量（成功次数/秒）、p50/p95/p99（毫秒）
+    """
+    ms = np.asarray(latencies, dtype="float64") * 1000
+    result = {
+        "count": len(latencies) + errors,
+        "errors": errors,
+        "wall_s": round(wall, 3),
+        "throughput": round(len(latencies) / wall, 2) if wall > 0 else None,
+    }
+    for p in (50, 95, 99):
+        result[f"p{p}_ms"] = round(float(np.percentile(ms, p)), 2) if len(ms) else None
+    return result
+
+
+def measure(fn, items, workers=1):
+    """对每个item调用fn并计时，workers>1时并发执行；fn抛出异常或返回False记为失败"""
+    def timed(item):
+        start = time.perf_counter()
+        try:
+            ok = fn(item) is not False
+        except Exception:
+            ok = False
+        return ok, time.perf_counter() - start
+
+    start = time.perf_counter()
+    if workers > 1 and len(items) > 1:
+        with ThreadPoolExecutor(max_workers=min(workers, len(items))) as pool:
+            results = list(pool.map(timed, items))
+    else:
+        results = [timed(item) for item in items]
+    wall = time.perf_counter() - start
+    latencies = [t for ok, t in results if ok]
+    return summarize(latencies, len(results) - len(latencies), wall)
+
+
+def bench_get_price(codes, workers):
+    count = BENCH_CONFIG["count"]
+
+    def fetch(code):
+        df = Ashare.get_price(Ashare._qcode(code), frequency="1d", count=count)
+        return df is not None and not df.empty
+
+    return {"get_price": measure(fetch, codes, workers), "get_price_cached": measure(fetch, codes, workers)}
+
+
+def _load_app(workdir):
+    """导入app并把笔记存储换成临时目录中的空存储"""
+    import app as app_module
+    from note_store import NoteStore
+    app_module.notes_store = NoteStore(os.path.join(workdir, "stock_notes.json"))
+    return app_module
+
+
+def bench_notes(app_module, codes):
+    """笔记中放入codes，测量后台行情刷新和GET /api/notes"""
+    repeat = BENCH_CONFIG["repeat"]
+    notes = {code: {"code": code, "name": f"模拟{code}", "notes": ""} for code in codes}
+    app_module.notes_store.replace_all(notes)
+    app_module.indicator_engine = app_module.IndicatorEngine()
+    app_module.indicator_days.clear()
+    scheduler = app_module.quote_scheduler
+
+    cold = measure(lambda _: scheduler.refresh_now(), [None])
+    warm = measure(lambda _: scheduler.refresh_now(), [None] * repeat)
+    warm["cold_ms"] = cold["p50_ms"]
+
+    client = app_module.app.test_client()
+
+    def get(_):
+        response = client.get("/api/notes")
+        return response.status_code == 200 and len(response.get_json()) == len(codes)
+
+    result = {"notes_refresh": warm, "get_notes": measure(get, [None] * repeat)}
+    scheduler.stop()
+    app_module.notes_store.flush()
+    return result
+
+
+def bench_kline(app_module, codes, workers):
+    count = BENCH_CONFIG["count"]
+
+    def get(code):
+        response = app_module.app.test_client().get(f"/api/kline?code={code}&frequency=1d&count={count}")
+        return response.status_code == 200
+
+    return {"kline": measure(get, codes, workers)}
+
+
+def _load_monitor():
+    """导入选股监控模块（依赖 tkinter、adata、pyautogui 等，缺少时抛出ImportError）"""
+    spec = importlib.util.spec_from_file_location("block_monitor", MONITOR_FILE)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def bench_block_analyzer(monitor, codes, workdir):
+    """用包含codes的板块文件构造BlockAnalyzer，测量analyze"""
+    repeat = BENCH_CONFIG["repeat"]
+    xml_path = os.path.join(workdir, f"block_{len(codes)}.xml")
+    securities = "".join(
+        f'<security market="{"USHA" if code.startswith("6") else "USZA"}" code="{code}"/>' for code in codes)
+    with open(xml_path, "w", encoding="utf-8") as f:
+        f.write(f'<Root><Block name="bench">{securities}</Block></Root>')
+    analyzer = monitor.BlockAnalyzer(xml_path, "bench")
+    cold = measure(lambda _: len(analyzer.analyze()) > 0, [None])
+    warm = measure(lambda _: len(analyzer.analyze()) > 0, [None] * repeat)
+    warm["cold_ms"] = cold["p50_ms"]
+    return {"block_analyze": warm}
+
+
+def run(sizes=None, workers=None, benchmarks=None, latency_ms=None, jitter=None, error_rate=None,
+        fixture_dir=None):
+    """
+    启动本地行情服务器并运行基准测试
+
+    Returns:
+        dict: 报告（环境、服务器设置、各项结果 results[项目][规模]）
+    """
+    sizes = sizes or BENCH_CONFIG["sizes"]
+    workers = workers or BENCH_CONFIG["workers"]
+    benchmarks = benchmarks or BENCH_CONFIG["benchmarks"]
+    server = bench_server.StandInServer(bench_server.Fixtures(fixture_dir), latency_ms=latency_ms,
+                                        jitter=jitter, error_rate=error_rate).start()
+    previous_hosts = server.point_ashare()
+    previous_store = bar_store.STORE_DIR
+    Ashare.configure_http(pool_size=max(Ashare.HTTP_CONFIG["pool_size"], workers))
+    report = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "env": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "pandas": Ashare.pd.__version__,
+            "json": Ashare._loads.__module__,
+            "cpus": os.cpu_count(),
+        },
+        "config": {"sizes": list(sizes), "workers": workers, "count": BENCH_CONFIG["count"],
+                   "repeat": BENCH_CONFIG["repeat"]},
+        "server": dict(server.settings),
+        "results": {},
+        "skipped": {},
+    }
+    results = report["results"]
+
+    app_module = monitor = None
+    with tempfile.TemporaryDirectory(prefix="bench_") as workdir:
+        try:
+            if {"notes_refresh", "get_notes", "kline"} & set(benchmarks):
+                try:
+                    app_module = _load_app(workdir)
+                except ImportError as e:
+                    for name in ("notes_refresh", "get_notes", "kline"):
+                        report["skipped"][name] = f"无法导入app: {e}"
+            if "block_analyze" in benchmarks:
+                try:
+                    monitor = _load_monitor()
+                except Exception as e:  # 缺少依赖或没有图形界面
+                    report["skipped"]["block_analyze"] = f"无法导入选股监控: {e!r}"
+
+            for size in sizes:
+                codes = universe(size)
+                # 每个规模使用新的空日线存储，第一轮都是冷启动
+                bar_store.STORE_DIR = os.path.join(workdir, f"bars_{size}")
+                measured = {}
+                if "get_price" in benchmarks:
+                    measured.update(bench_get_price(codes, workers))
+                    bar_store.STORE_DIR = os.path.join(workdir, f"bars_{size}_app")
+                if app_module is not None:
+                    if {"notes_refresh", "get_notes"} & set(benchmarks):
+                        measured.update(bench_notes(app_module, codes))
+                    if "kline" in benchmarks:
+                        measured.update(bench_kline(app_module, codes, workers))
+                if monitor is not None:
+                    bar_store.STORE_DIR = os.path.join(workdir, f"bars_{size}_monitor")
+                    measured.update(bench_block_analyzer(monitor, codes, workdir))
+                for name, summary in measured.items():
+                    if name in benchmarks:
+                        results.setdefault(name, {})[str(size)] = summary
+                        _print_row(name, size, summary)
+        finally:
+            Ashare.HOSTS.update(previous_hosts)
+            bar_store.STORE_DIR = previous_store
+            server.stop()
+
+    report["server"]["requests"] = server.stats["requests"]
+    report["server"]["injected_errors"] = server.stats["errors"]
+    report["router"] = Ashare.router_stats()
+    report["http"] = Ashare.http_stats()
+    for name, reason in report["skipped"].items():
+        print(f"跳过 {name}: {reason}")
+    return report
+
+
+def _print_row(name, size, s):
+    extra = f"  首轮{s['cold_ms']}ms" if "cold_ms" in s else ""
+    print(f"{name:<17}{size:>6}只  p50 {s['p50_ms']}ms  p95 {s['p95_ms']}ms  p99 {s['p99_ms']}ms  "
+          f"吞吐 {s['throughput']}/秒  失败 {s['errors']}/{s['count']}{extra}")
+
+
+def save_report(report, path=None):
+    if path is None:
+        os.makedirs(BENCH_CONFIG["report_dir"], exist_ok=True)
+        stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        path = os.path.join(BENCH_CONFIG["report_dir"], f"bench_{stamp}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def compare(report, baseline):
+    """
+    与之前的报告对比，返回 [(项目, 规模, 指标, 之前, 现在, 现在/之前)]，只比较两边都有的项目
+    """
+    rows = []
+    for name, by_size in report["results"].items():
+        for size, now in by_size.items():
+            before = baseline.get("results", {}).get(name, {}).get(size)
+            if before is None:
+                continue
+            for metric in ("p50_ms", "p95_ms", "p99_ms", "throughput"):
+                a, b = before.get(metric), now.get(metric)
+                if a and b:
+                    rows.append((name, size, metric, a, b, round(b / a, 2)))
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ashare行情链路基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(BENCH_CONFIG["sizes"]))
+    parser.add_argument("--only", nargs="+", choices=BENCH_CONFIG["benchmarks"], help="只运行这些项目")
+    parser.add_argument("--workers", type=int, default=BENCH_CONFIG["workers"])
+    parser.add_argument("--repeat", type=int, default=BENCH_CONFIG["repeat"])
+    parser.add_argument("--latency", type=float, default=None, help="模拟接口延迟中位数（毫秒）")
+    parser.add_argument("--jitter", type=float, default=None, help="延迟的对数正态sigma")
+    parser.add_argument("--error-rate", type=float, default=None, help="模拟接口返回503的概率")
+    parser.add_argument("--fixtures", default=None, help="录制文件目录（bench_server.py record 生成）")
+    parser.add_argument("--out", default=None, help="报告路径，默认 data/bench/bench_时间.json")
+    parser.add_argument("--compare", default=None, help="与之前的报告对比")
+    args = parser.parse_args()
+
+    BENCH_CONFIG["repeat"] = args.repeat
+    report = run(args.sizes, args.workers, args.only, args.latency, args.jitter, args.error_rate, args.fixtures)
+    print(f"报告已保存: {save_report(report, args.out)}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"与 {args.compare} 对比（现在/之前，耗时>1变慢，吞吐<1变慢）:")
+        for name, size, metric, before, now, ratio in compare(report, baseline):
+            print(f"  {name:<17}{size:>6}只  {metric:<11}{before:>10} -> {now:<10} x{ratio}")
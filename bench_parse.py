@@ -0,0 +1,114 @@
+# -*- coding:utf-8 -*-
+# K线解析微基准：用本地生成的1000根K线报文，比较 Ashare 快速解析(FAST_PARSE)与原解析的耗时，
+# 同时核对两条路径解析出的DataFrame完全一致
+#   python bench_parse.py            # 默认1000根，每种报文重复200次
+#   python bench_parse.py 5000 50
+import sys
+import json
+import time
+import random
+import datetime
+
+import pandas as pd
+
+import Ashare
+
+
+def sina_payload(bars, minute=False):
+    """新浪 getKLineData 格式：字典列表，数值为字符串，带ma_price5等额外字段"""
+    start = datetime.datetime(2020, 1, 2, 9, 35)
+    rows = []
+    price = 10.0
+    for i in range(bars):
+        t = start + (datetime.timedelta(minutes=5 * i) if minute else datetime.timedelta(days=i))
+        price *= 1 + random.uniform(-0.03, 0.03)
+        rows.append({
+            "day": t.strftime("%Y-%m-%d %H:%M:%S" if minute else "%Y-%m-%d"),
+            "open": f"{price * 0.99:.3f}", "high": f"{price * 1.02:.3f}",
+            "low": f"{price * 0.98:.3f}", "close": f"{price:.3f}",
+            "volume": str(random.randint(10 ** 5, 10 ** 8)),
+            "ma_price5": round(price, 3), "ma_volume5": random.randint(10 ** 5, 10 ** 8),
+        })
+    return json.dumps(rows, separators=(",", ":")).encode()
+
+
+def tx_day_payload(bars, code="sh600519"):
+    """腾讯 fqkline 格式：[日期,开,收,高,低,量]，除权日多一列分红信息"""
+    start = datetime.date(2020, 1, 2)
+    rows = []
+    price = 10.0
+    for i in range(bars):
+        price *= 1 + random.uniform(-0.03, 0.03)
+        row = [str(start + datetime.timedelta(days=i)), f"{price * 0.99:.3f}", f"{price:.3f}",
+               f"{price * 1.02:.3f}", f"{price * 0.98:.3f}", f"{random.randint(10 ** 3, 10 ** 6)}.000"]
+        if i % 97 == 0:
+            row.append({"nd": "2020", "fh_sh": "10"})
+        rows.append(row)
+    return json.dumps({"code": 0, "data": {code: {"qfqday": rows}}}, separators=(",", ":")).encode()
+
+
+def tx_min_payload(bars, code="sh600519"):
+    """腾讯 mkline 格式：[yyyymmddHHMM,开,收,高,低,量,{},成交额]，qt里是实时行情"""
+    start = datetime.datetime(2020, 1, 2, 9, 35)
+    rows = []
+    price = 10.0
+    for i in range(bars):
+        price *= 1 + random.uniform(-0.01, 0.01)
+        rows.append([(start + datetime.timedelta(minutes=5 * i)).strftime("%Y%m%d%H%M"),
+                     f"{price * 0.99:.3f}", f"{price:.3f}", f"{price * 1.02:.3f}", f"{price * 0.98:.3f}",
+                     f"{random.randint(10 ** 3, 10 ** 6)}.00", {}, ""])
+    qt = [""] * 4
+    qt[3] = f"{price:.3f}"
+    return json.dumps({"code": 0, "data": {code: {"m5": rows, "qt": {code: qt}}}},
+                      separators=(",", ":")).encode()
+
+
+def timeit(fn, repeat):
+    fn()  # 预热
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def run(bars=1000, repeat=200):
+    random.seed(0)
+    cases = [
+        ("新浪日线", sina_payload(bars), lambda c: Ashare._parse_sina(c, "", bars, "1d")),
+        ("新浪5分钟", sina_payload(bars, minute=True), lambda c: Ashare._parse_sina(c, "", bars, "5m")),
+        ("腾讯日线", tx_day_payload(bars), lambda c: Ashare._parse_day_tx(c, "sh600519", "1d")),
+        ("腾讯5分钟", tx_min_payload(bars), lambda c: Ashare._parse_min_tx(c, "sh600519", "5m")),
+    ]
+    print(f"{bars}根K线，每种重复{repeat}次，JSON解析: {Ashare._loads.__module__}")
+    print(f"{'报文':<8}{'原解析(ms)':>12}{'快速解析(ms)':>14}{'加速':>8}  结果一致")
+    results = {}
+    for name, content, parse in cases:
+        Ashare.FAST_PARSE = True
+        fast_df = parse(content)
+        fast = timeit(lambda: parse(content), repeat)
+        Ashare.FAST_PARSE = False
+        try:
+            legacy_df = parse(content)
+            legacy = timeit(lambda: parse(content), repeat)
+        except Exception as e:  # 原腾讯分钟线解析在列数变化后无法使用
+            legacy_df, legacy = None, None
+            print(f"{name:<8}{'失败':>12}{fast:>14.3f}{'':>8}  原解析报错: {e}")
+        finally:
+            Ashare.FAST_PARSE = True
+        if legacy is None:
+            results[name] = {"legacy_ms": None, "fast_ms": round(fast, 3)}
+            continue
+        try:
+            pd.testing.assert_frame_equal(fast_df, legacy_df)
+            same = "是"
+        except AssertionError as e:
+            same = f"否 ({str(e).splitlines()[0]})"
+        print(f"{name:<8}{legacy:>12.3f}{fast:>14.3f}{legacy / fast:>7.1f}x  {same}")
+        results[name] = {"legacy_ms": round(legacy, 3), "fast_ms": round(fast, 3)}
+    return results
+
+
+if __name__ == "__main__":
+    bars = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    run(bars, repeat)
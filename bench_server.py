@@ -0,0 +1,346 @@
+# -*- coding:utf-8 -*-
+# 基准测试用的本地行情服务器：按新浪/腾讯接口的路径回放录制的响应，可以注入延迟和错误，
+# 不访问真实服务就能测量 Ashare 的请求+解析耗时
+#
+# 录制真实响应（需要联网，保存到 bench_fixtures/）：
+#   python bench_server.py record 600519 000001
+# 单独启动（Ashare.HOSTS 指向它即可）：
+#   python bench_server.py serve --port 8000 --latency 30 --error-rate 0.01
+#
+# 某只股票没有录制文件时，用同类型的任意一个录制文件作为模板；一个都没有时用 bench_parse 生成的模拟数据
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import datetime
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+import numpy as np
+
+import Ashare
+import bench_parse
+import minute_store
+
+SERVER_CONFIG = {
+    "fixture_dir": "bench_fixtures",
+    "bars": 1000,          # 模拟数据的K线数，也是录制时请求的K线数
+    "latency_ms": 20,      # 每个请求的延迟中位数（毫秒）
+    "jitter": 0.3,         # 延迟的对数正态分布sigma，0为固定延迟
+    "error_rate": 0.0,     # 返回503的概率
+}
+
+# 录制文件名：{类型}_{代码}.json，类型与接口的对应关系
+KINDS = ("sina240", "sina5", "tx_day", "tx_min", "tx_quote")
+
+
+def _dumps(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class Fixtures:
+    """
+    按类型保存K线行（每行预先序列化为字节串），响应时只拼接最后count行
+
+    Args:
+        fixture_dir: 录制文件目录，不存在时全部使用模拟数据
+        bars: 模拟数据的K线数
+    """
+
+    def __init__(self, fixture_dir=None, bars=None):
+        self.fixture_dir = fixture_dir or SERVER_CONFIG["fixture_dir"]
+        self.bars = bars or SERVER_CONFIG["bars"]
+        self._rows = {}       # (类型, 代码或None) -> [行字节串]
+        self._last = {}       # (类型, 代码或None) -> 最新价（腾讯分钟线qt、实时行情用）
+        self._quotes = {}     # 代码或None -> 实时行情字段列表
+        self._lock = threading.Lock()
+        self._templates = {kind: self._first_recorded(kind) for kind in KINDS}
+
+    def _path(self, kind, symbol):
+        return os.path.join(self.fixture_dir, f"{kind}_{symbol}.json")
+
+    def _first_recorded(self, kind):
+        if not os.path.isdir(self.fixture_dir):
+            return None
+        names = sorted(n for n in os.listdir(self.fixture_dir) if n.startswith(kind + "_"))
+        return names[0][len(kind) + 1:-len(".json")] if names else None
+
+    def _source(self, kind, symbol):
+        """symbol有录制文件用它自己的，否则用模板，都没有返回None（模拟数据）"""
+        if os.path.exists(self._path(kind, symbol)):
+            return symbol
+        return self._templates[kind]
+
+    def _load(self, kind, source):
+        """读取一种类型的K线行，结果缓存"""
+        key = (kind, source)
+        with self._lock:
+            if key in self._rows:
+                return self._rows[key], self._last[key]
+        if source is not None:
+            with open(self._path(kind, source), "rb") as f:
+                payload = json.loads(f.read())
+        else:
+            state = random.getstate()  # 模拟数据固定种子，不影响延迟和错误注入的随机序列
+            random.seed(kind)
+            try:
+                payload = self._synthetic(kind)
+            finally:
+                random.setstate(state)
+        if kind.startswith("sina"):
+            rows = payload
+            last = rows[-1]["close"] if rows else "0"
+        elif kind == "tx_day":
+            data = next(iter(payload["data"].values()))
+            rows = data.get("qfqday") or data.get("day") or []
+            last = rows[-1][2] if rows else "0"
+        else:
+            data = next(iter(payload["data"].values()))
+            rows = next(v for k, v in data.items() if k.startswith("m"))
+            last = next(iter(data["qt"].values()))[3]
+        encoded = [_dumps(row) for row in rows]
+        with self._lock:
+            self._rows[key], self._last[key] = encoded, last
+        return encoded, last
+
+    def _synthetic(self, kind):
+        """模拟数据：日线截止到上一个交易日，1分钟线为今天完整的交易时段"""
+        if kind == "sina240":
+            rows = json.loads(bench_parse.sina_payload(self.bars))
+            days = _business_days(len(rows))
+            for row, day in zip(rows, days):
+                row["day"] = day
+            return rows
+        if kind == "sina5":
+            return json.loads(bench_parse.sina_payload(self.bars, minute=True))
+        if kind == "tx_day":
+            # 与新浪日线是同一组K线，对冲请求或切换数据源时本地日线存储的除权校验能通过；
+            # 成交量和真实接口一样以手为单位，单位换算出错时校验会失败
+            rows = [[r["day"], r["open"], r["close"], r["high"], r["low"], f"{int(r['volume']) / 100:.2f}"]
+                    for r in json.loads(b"[" + b",".join(self._load("sina240", None)[0]) + b"]")]
+            return {"code": 0, "data": {"sh600519": {"qfqday": rows}}}
+        payload = json.loads(bench_parse.tx_min_payload(minute_store.SLOTS))
+        data = payload["data"]["sh600519"]
+        today = datetime.date.today().strftime("%Y%m%d")
+        for row, minute in zip(data["m5"], minute_store.SLOT_MINUTES):
+            row[0] = f"{today}{minute // 60:02d}{minute % 60:02d}"
+        return {"code": 0, "data": {"sh600519": {"m1": data["m5"], "qt": data["qt"]}}}
+
+    def sina(self, symbol, scale, count):
+        kind = "sina240" if scale >= 240 else "sina5"
+        rows, _ = self._load(kind, self._source(kind, symbol))
+        return b"[" + b",".join(rows[-count:]) + b"]"
+
+    def tx_day(self, symbol, unit, count):
+        rows, _ = self._load("tx_day", self._source("tx_day", symbol))
+        body = b"[" + b",".join(rows[-count:]) + b"]"
+        return b'{"code":0,"msg":"","data":{"' + symbol.encode() + b'":{"qfq' + unit.encode() + b'":' + body + b"}}}"
+
+    def tx_min(self, symbol, period, count):
+        rows, last = self._load("tx_min", self._source("tx_min", symbol))
+        body = b"[" + b",".join(rows[-count:]) + b"]"
+        qt = _dumps({symbol: ["1", symbol, symbol[2:], last]})
+        return (b'{"code":0,"msg":"","data":{"' + symbol.encode() + b'":{"' + period.encode() + b'":' + body
+                + b',"qt":' + qt + b"}}}")
+
+    def tx_quote(self, symbols):
+        lines = [self._quote_line(symbol) for symbol in symbols if symbol]
+        return "".join(lines).encode("gbk")
+
+    def _quote_line(self, symbol):
+        source = self._source("tx_quote", symbol)
+        with self._lock:
+            fields = self._quotes.get(source)
+        if fields is None:
+            if source is not None:
+                with open(self._path("tx_quote", source), "rb") as f:
+                    line = f.read().decode("gbk", errors="ignore")
+                fields = line.partition('="')[2].strip().rstrip(';').rstrip('"').split("~")
+            else:
+                rows, last = self._load("tx_day", self._source("tx_day", symbol))
+                prev = float(json.loads(rows[-2])[2]) if len(rows) > 1 else float(last)
+                price = float(last)
+                fields = [""] * 50
+                fields[1], fields[3], fields[4], fields[5] = "模拟股票", f"{price:.2f}", f"{prev:.2f}", f"{prev:.2f}"
+                fields[6], fields[30] = "123456", datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+                fields[32] = f"{(price / prev - 1) * 100:.2f}" if prev else "0.00"
+                fields[33], fields[34], fields[37] = f"{price * 1.01:.2f}", f"{price * 0.99:.2f}", "12345"
+            with self._lock:
+                self._quotes[source] = fields
+        fields = list(fields)
+        fields[2] = symbol[2:]
+        return f'v_{symbol}="{"~".join(fields)}";\n'
+
+
+def _business_days(n):
+    """截止到上一个交易日（不含今天）的n个工作日"""
+    end = np.busday_offset(np.datetime64(datetime.date.today(), "D"), -1, roll="forward")
+    return [str(d) for d in np.busday_offset(end, np.arange(-n + 1, 1), roll="backward")]
+
+
+class StandInServer:
+    """
+    本地行情服务器
+
+    Args:
+        fixtures: Fixtures实例
+        latency_ms, jitter, error_rate: 见 SERVER_CONFIG
+        overrides: 按接口覆盖上面三项，如 {"sina": {"latency_ms": 80}}，接口为 sina/tx_day/tx_min/tx_quote
+    """
+
+    def __init__(self, fixtures=None, latency_ms=None, jitter=None, error_rate=None, overrides=None,
+                 host="127.0.0.1", port=0):
+        self.fixtures = fixtures or Fixtures()
+        self.settings = {
+            "latency_ms": SERVER_CONFIG["latency_ms"] if latency_ms is None else latency_ms,
+            "jitter": SERVER_CONFIG["jitter"] if jitter is None else jitter,
+            "error_rate": SERVER_CONFIG["error_rate"] if error_rate is None else error_rate,
+        }
+        self.overrides = overrides or {}
+        self.stats = {"requests": {}, "errors": {}}
+        self._stats_lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="StandInServer", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def point_ashare(self):
+        """把 Ashare 的所有接口主机指向本服务器，返回原来的设置"""
+        previous = dict(Ashare.HOSTS)
+        Ashare.HOSTS.update({name: self.url for name in Ashare.HOSTS})
+        return previous
+
+    def _setting(self, source, name):
+        return self.overrides.get(source, {}).get(name, self.settings[name])
+
+    def _count(self, source, error):
+        with self._stats_lock:
+            self.stats["requests"][source] = self.stats["requests"].get(source, 0) + 1
+            if error:
+                self.stats["errors"][source] = self.stats["errors"].get(source, 0) + 1
+
+    def respond(self, path):
+        """
+        按请求路径返回 (状态码, 响应体)，先按配置等待并决定是否返回错误
+        """
+        parts = urlsplit(path)
+        query = parse_qs(parts.query)
+        if "getKLineData" in parts.path:
+            source = "sina"
+        elif parts.path.endswith("/fqkline/get"):
+            source = "tx_day"
+        elif parts.path.endswith("/kline/mkline"):
+            source = "tx_min"
+        elif parts.path.startswith("/q="):
+            source = "tx_quote"
+        else:
+            return 404, b"not found"
+
+        latency = self._setting(source, "latency_ms") / 1000
+        jitter = self._setting(source, "jitter")
+        if latency > 0:
+            time.sleep(latency * (random.lognormvariate(0, jitter) if jitter else 1))
+        error = random.random() < self._setting(source, "error_rate")
+        self._count(source, error)
+        if error:
+            return 503, b"injected error"
+
+        if source == "sina":
+            body = self.fixtures.sina(query["symbol"][0], int(query["scale"][0]), int(query["datalen"][0]))
+        elif source == "tx_day":
+            symbol, unit, _, _, count = query["param"][0].split(",")[:5]
+            body = self.fixtures.tx_day(symbol, unit, int(count))
+        elif source == "tx_min":
+            symbol, period, _, count = query["param"][0].split(",")[:4]
+            body = self.fixtures.tx_min(symbol, period, int(count))
+        else:
+            body = self.fixtures.tx_quote(parts.path[3:].split(","))
+        return 200, body
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # 保持长连接，与真实接口一样复用连接池
+
+            def do_GET(self):
+                try:
+                    status, body = server.respond(self.path)
+                except Exception as e:
+                    status, body = 500, str(e).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def record(codes, fixture_dir=None, bars=None):
+    """从真实接口录制响应，保存为回放用的录制文件"""
+    fixture_dir = fixture_dir or SERVER_CONFIG["fixture_dir"]
+    bars = bars or SERVER_CONFIG["bars"]
+    os.makedirs(fixture_dir, exist_ok=True)
+    for code in codes:
+        symbol = Ashare._qcode(code)
+        urls = {
+            "sina240": Ashare._url_sina(symbol, "", bars, "1d"),
+            "sina5": Ashare._url_sina(symbol, "", bars, "5m"),
+            "tx_day": Ashare._url_day_tx(symbol, "", bars, "1d"),
+            "tx_min": Ashare._url_min_tx(symbol, None, minute_store.SLOTS, "1m"),
+            "tx_quote": Ashare._url_quote_tx([symbol]),
+        }
+        for kind, url in urls.items():
+            try:
+                content = Ashare._http_get(url)
+            except Exception as e:
+                print(f"录制{symbol} {kind}失败: {e}")
+                continue
+            with open(os.path.join(fixture_dir, f"{kind}_{symbol}.json"), "wb") as f:
+                f.write(content)
+            print(f"已录制 {kind}_{symbol} ({len(content)}字节)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="基准测试用的本地行情服务器")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rec = sub.add_parser("record", help="从真实接口录制响应")
+    rec.add_argument("codes", nargs="+")
+    serve = sub.add_parser("serve", help="启动服务器")
+    serve.add_argument("--port", type=int, default=8000)
+    serve.add_argument("--latency", type=float, default=SERVER_CONFIG["latency_ms"], help="延迟中位数（毫秒）")
+    serve.add_argument("--jitter", type=float, default=SERVER_CONFIG["jitter"])
+    serve.add_argument("--error-rate", type=float, default=SERVER_CONFIG["error_rate"])
+    args = parser.parse_args()
+
+    if args.command == "record":
+        record(args.codes)
+        sys.exit(0)
+    server = StandInServer(latency_ms=args.latency, jitter=args.jitter, error_rate=args.error_rate, port=args.port)
+    server.start()
+    print(f"模拟行情服务器: {server.url}  (Ashare.HOSTS.update(sina=..., tx_day=..., tx_min=..., tx_quote=...))")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
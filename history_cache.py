@@ -0,0 +1,130 @@
+# -*- coding:utf-8 -*-
+# 按天缓存的日线指标层：每只股票每天只下载一次日线，一次计算出MA5、近N日最大量比、近10日最高/最低价
+# 并发请求同一只股票时只有一个线程真正下载，其余线程等待同一结果（single-flight）
+import time
+import datetime
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+
+class DailyIndicators(NamedTuple):
+    """由最近20个交易日日线计算出的指标，数据不足的项为None"""
+    ma5: Optional[float]
+    max_volume_ratio: Optional[float]
+    high_10d: Optional[float]
+    low_10d: Optional[float]
+    last_close: Optional[float]
+
+
+def _numeric(df, col):
+    return pd.to_numeric(df[col], errors="coerce").to_numpy(dtype="float64")
+
+
+def compute_indicators(df, volume_ratio_days=10):
+    """
+    从日线DataFrame一次计算所有指标，不修改传入的DataFrame
+
+    Returns:
+        DailyIndicators，df为空返回None
+    """
+    if df is None or df.empty:
+        return None
+
+    # MA5：最近5个有效收盘价的平均值
+    close = _numeric(df, "close")
+    close = close[~np.isnan(close)]
+    ma5 = round(float(close[-5:].mean()), 2) if len(close) >= 5 else None
+    last_close = float(close[-1]) if len(close) else None
+
+    # 量比：当日成交量/前一日成交量，取最近volume_ratio_days天的最大值
+    max_volume_ratio = None
+    volume_col = "volume" if "volume" in df.columns else "amount" if "amount" in df.columns else None
+    if volume_col is not None:
+        volume = _numeric(df, volume_col)
+        volume = volume[~np.isnan(volume)]
+        if len(volume) >= 2:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                ratio = volume[1:] / volume[:-1]
+            ratio = ratio[~np.isnan(ratio)][-volume_ratio_days:]
+            if len(ratio):
+                max_volume_ratio = round(float(ratio.max()), 2)
+
+    # 近10日最高价、最低价
+    high_10d = low_10d = None
+    high = _numeric(df, "high")
+    low = _numeric(df, "low")
+    valid = ~np.isnan(high) & ~np.isnan(low)
+    if valid.sum() >= 10:
+        high_10d = float(high[valid][-10:].max())
+        low_10d = float(low[valid][-10:].min())
+
+    return DailyIndicators(ma5, max_volume_ratio, high_10d, low_10d, last_close)
+
+
+class DailyHistoryCache:
+    """
+    日线指标缓存，按天失效，超过maxsize时淘汰最久未使用的股票
+
+    Args:
+        fetch: fetch(stock_code) -> DataFrame或None，负责下载日线（含备用数据源）
+        maxsize: 最多缓存的股票数
+        volume_ratio_days: 量比统计天数
+        retry_interval: 下载失败后多少秒内不重试（避免网络故障时每次刷新都重复请求）
+    """
+
+    def __init__(self, fetch, maxsize=6000, volume_ratio_days=10, retry_interval=60):
+        self.fetch = fetch
+        self.maxsize = maxsize
+        self.volume_ratio_days = volume_ratio_days
+        self.retry_interval = retry_interval
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0  # 等待其他线程正在进行的下载的次数
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()  # code -> (日期, DailyIndicators或None, 失败后可以重试的时间)
+        self._inflight = {}  # code -> Future
+
+    def get(self, stock_code):
+        """获取股票当天的指标，下载或计算失败返回None（retry_interval秒后重试）"""
+        today = datetime.date.today()
+        owner = False
+        with self._lock:
+            entry = self._cache.get(stock_code)
+            if entry is not None and entry[0] == today and time.monotonic() < entry[2]:
+                self._cache.move_to_end(stock_code)
+                self.hits += 1
+                return entry[1]
+            future = self._inflight.get(stock_code)
+            if future is None:
+                self.misses += 1
+                future = self._inflight[stock_code] = Future()
+                owner = True
+            else:
+                self.shared += 1
+        if not owner:
+            return future.result()
+
+        indicators = None
+        try:
+            indicators = compute_indicators(self.fetch(stock_code), self.volume_ratio_days)
+        except Exception as e:
+            print(f"获取{stock_code}日线指标失败: {str(e)}")
+        finally:
+            with self._lock:
+                retry_at = float("inf") if indicators is not None else time.monotonic() + self.retry_interval
+                self._cache[stock_code] = (today, indicators, retry_at)
+                self._cache.move_to_end(stock_code)
+                while len(self._cache) > self.maxsize:
+                    self._cache.popitem(last=False)
+                del self._inflight[stock_code]
+            future.set_result(indicators)
+        return indicators
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "shared": self.shared, "size": len(self._cache)}
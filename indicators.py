@@ -0,0 +1,256 @@
+# -*- coding:utf-8 -*-
+# 增量指标引擎：每只股票保存最近若干根已完成K线的滑动窗口状态（累计和、单调队列），
+# 追加一根K线或更新盘中实时价时，MA-N、区间最高/最低、量比、振幅都是O(1)更新，不再从整段历史重新计算
+import math
+import threading
+from collections import deque
+
+import numpy as np
+
+
+class RollingWindow:
+    """
+    最近n个值的和、最大值、最小值
+
+    内部只保存最近n-1个值的累计和与单调队列，查询时再叠加第n个值：
+    不传live时第n个值是更早的一根已完成K线，传live时是盘中未完成的K线，两种情况都是O(1)。
+    """
+
+    RESYNC_EVERY = 1024  # 每追加这么多次重新求一次和，消除浮点累计误差
+
+    def __init__(self, n):
+        self.n = n
+        self.count = 0                      # 已追加的值的个数
+        self._buf = np.full(n, np.nan)      # 最近n个值（环形）
+        self._tail_sum = 0.0                # 最近n-1个值的和
+        self._max = deque()                 # (序号, 值)，值单调递减
+        self._min = deque()                 # (序号, 值)，值单调递增
+
+    def append(self, x):
+        i = self.count
+        n = self.n
+        x = float(x)
+        if n > 1:
+            self._tail_sum += x
+            drop = i - n + 1                # 离开n-1窗口的值的序号
+            if drop >= 0:
+                self._tail_sum -= self._buf[drop % n]
+            while self._max and self._max[-1][1] <= x:
+                self._max.pop()
+            self._max.append((i, x))
+            while self._min and self._min[-1][1] >= x:
+                self._min.pop()
+            self._min.append((i, x))
+            while self._max[0][0] <= drop:
+                self._max.popleft()
+            while self._min[0][0] <= drop:
+                self._min.popleft()
+        self._buf[i % n] = x
+        self.count = i + 1
+        if n > 1 and self.count % self.RESYNC_EVERY == 0:
+            self._tail_sum = math.fsum(self._buf[(self.count - k) % n] for k in range(1, min(n - 1, self.count) + 1))
+
+    def _nth(self, live):
+        """窗口中最早的那个值：有live时窗口为最近n-1个值+live"""
+        if live is not None:
+            return live if self.count >= self.n - 1 else None
+        if self.count < self.n:
+            return None
+        return self._buf[(self.count - self.n) % self.n]
+
+    def sum(self, live=None):
+        extra = self._nth(live)
+        if extra is None:
+            return None
+        if live is not None:
+            return self._tail_sum + live
+        return self._tail_sum + extra
+
+    def mean(self, live=None):
+        total = self.sum(live)
+        return None if total is None else total / self.n
+
+    def max(self, live=None):
+        extra = self._nth(live)
+        if extra is None:
+            return None
+        if live is not None:
+            extra = live
+        return max(self._max[0][1], extra) if self._max else extra
+
+    def min(self, live=None):
+        extra = self._nth(live)
+        if extra is None:
+            return None
+        if live is not None:
+            extra = live
+        return min(self._min[0][1], extra) if self._min else extra
+
+
+class SymbolIndicators:
+    """
+    单只股票的指标状态
+
+    Args:
+        ma_windows: 需要计算的均线周期
+        range_days: 区间最高/最低价、振幅的天数
+        volume_ratio_days: 量比（当日成交量/前一日成交量）取最大值的天数
+    """
+
+    def __init__(self, ma_windows=(5, 10, 20), range_days=10, volume_ratio_days=10):
+        self.ma = {n: RollingWindow(n) for n in ma_windows}
+        self.high = RollingWindow(range_days)
+        self.low = RollingWindow(range_days)
+        self.volume_ratio = RollingWindow(volume_ratio_days)
+        self.last_day = None        # 最后一根已完成K线的日期（datetime64[D]）
+        self.last_close = None
+        self.prev_close = None
+        self.last_volume = None
+        self.live = None            # 盘中未完成的K线 (close, high, low, volume)
+
+    def append(self, day, high, low, close, volume):
+        """追加一根已完成的K线，清除盘中实时价"""
+        high, low, close, volume = float(high), float(low), float(close), float(volume)
+        for window in self.ma.values():
+            window.append(close)
+        self.high.append(high)
+        self.low.append(low)
+        if self.last_volume and volume == volume:  # 跳过前一日成交量为0或当日为NaN
+            self.volume_ratio.append(volume / self.last_volume)
+        self.prev_close, self.last_close = self.last_close, close
+        self.last_volume = volume
+        self.last_day = day
+        self.live = None
+
+    def set_live(self, close, high=None, low=None, volume=None, day=None):
+        """
+        设置（或替换）盘中实时价
+
+        day不晚于最后一根已完成K线时忽略，避免同一天被计算两次
+        """
+        if day is not None and self.last_day is not None and day <= self.last_day:
+            self.live = None
+            return
+        close = float(close)
+        high = close if high is None else max(float(high), close)
+        low = close if low is None else min(float(low), close)
+        self.live = (close, high, low, volume)
+
+    def values(self):
+        """当前的全部指标，数据不足的项为None"""
+        live = self.live
+        if live is not None:
+            close, high, low, volume = live
+            volume_ratio = volume / self.last_volume if volume and self.last_volume else None
+            prev_close = self.last_close
+        else:
+            close, high, low, volume_ratio = self.last_close, None, None, None
+            prev_close = self.prev_close
+
+        result = {"close": close}
+        for n, window in self.ma.items():
+            value = window.mean(close if live is not None else None)
+            result[f"ma{n}"] = None if value is None else round(value, 2)
+        high_n = self.high.max(high)
+        low_n = self.low.min(low)
+        result["high_n"] = high_n
+        result["low_n"] = low_n
+        result["amplitude"] = (
+            round((high_n - low_n) / close * 100, 2) if high_n is not None and low_n is not None and close else None
+        )
+        if volume_ratio is not None:
+            max_ratio = self.volume_ratio.max(volume_ratio)
+        else:
+            max_ratio = self.volume_ratio.max() if self.volume_ratio.count >= self.volume_ratio.n else None
+        result["max_volume_ratio"] = None if max_ratio is None else round(max_ratio, 2)
+        result["prev_close"] = prev_close
+        result["change_percent"] = (
+            round((close - prev_close) / prev_close * 100, 2) if close is not None and prev_close else None
+        )
+        return result
+
+
+class IndicatorEngine:
+    """
+    多只股票的增量指标，线程安全
+
+    用法：
+        engine.load(code, df)             # 用已完成的日线初始化（每天一次）
+        engine.set_live(code, price, ...)  # 每次刷新实时行情时更新，O(1)
+        engine.values(code)                # 读取指标
+    """
+
+    def __init__(self, ma_windows=(5, 10, 20), range_days=10, volume_ratio_days=10):
+        self.ma_windows = tuple(ma_windows)
+        self.range_days = range_days
+        self.volume_ratio_days = volume_ratio_days
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def _new_state(self):
+        return SymbolIndicators(self.ma_windows, self.range_days, self.volume_ratio_days)
+
+    def load(self, symbol, df):
+        """
+        用已完成的日线重建状态（只需要最近 max(均线周期, 天数)+1 根）
+
+        Args:
+            df: 含 high/low/close/volume 列、以日期为索引的DataFrame，不应包含盘中未完成的K线
+        """
+        keep = max(self.ma_windows + (self.range_days, self.volume_ratio_days)) + 1
+        df = df.tail(keep)
+        state = self._new_state()
+        days = df.index.values.astype("datetime64[D]")
+        columns = [df[col].to_numpy(dtype="float64") for col in ("high", "low", "close", "volume")]
+        for day, high, low, close, volume in zip(days, *columns):
+            if close == close:  # 跳过NaN
+                state.append(day, high, low, close, volume)
+        with self._lock:
+            self._states[symbol] = state
+
+    def append(self, symbol, day, high, low, close, volume):
+        """追加一根已完成的K线"""
+        with self._lock:
+            state = self._states.get(symbol)
+            if state is None:
+                state = self._states[symbol] = self._new_state()
+            state.append(np.datetime64(day, "D"), high, low, close, volume)
+
+    def set_live(self, symbol, close, high=None, low=None, volume=None, day=None):
+        """更新盘中实时价，没有初始化过的股票忽略"""
+        with self._lock:
+            state = self._states.get(symbol)
+            if state is not None:
+                state.set_live(close, high, low, volume, None if day is None else np.datetime64(day, "D"))
+
+    def values(self, symbol):
+        """返回指标字典，没有初始化过的股票返回None"""
+        with self._lock:
+            state = self._states.get(symbol)
+            return state.values() if state is not None else None
+
+    def last_day(self, symbol):
+        with self._lock:
+            state = self._states.get(symbol)
+            return state.last_day if state is not None else None
+
+    def discard(self, symbol):
+        with self._lock:
+            self._states.pop(symbol, None)
+
+
+def ma_series(close, n):
+    """
+    用累计和计算整段收盘价的N日均线，前n-1个为NaN（画图用）
+
+    缺失的收盘价（NaN）只让包含它的n个窗口为NaN，不会影响之后的均线
+    """
+    close = np.asarray(close, dtype="float64")
+    result = np.full(len(close), np.nan)
+    if len(close) >= n:
+        missing = np.isnan(close)
+        csum = np.cumsum(np.insert(np.where(missing, 0.0, close), 0, 0.0))
+        gaps = np.cumsum(np.insert(missing, 0, False))
+        window = (csum[n:] - csum[:-n]) / n
+        result[n - 1:] = np.where(gaps[n:] - gaps[:-n] > 0, np.nan, window)
+    return result
@@ -0,0 +1,113 @@
+# -*- coding:utf-8 -*-
+# 申万三级行业索引：代码→行业、行业→代码的哈希表
+# 首次解析JSON后把索引写成二进制旁路文件，按源文件修改时间判断是否需要重建，
+# 进程内只在JSON变化时重新加载
+import os
+import json
+import pickle
+import threading
+
+INDUSTRY_FILE = "sw_three_industries_2026.json"
+
+_lock = threading.Lock()
+_cache = {}  # {源文件路径: 索引字典}
+
+
+def _sidecar_path(path):
+    return os.path.splitext(path)[0] + ".idx.pkl"
+
+
+def _build_index(path):
+    """解析行业JSON，构建索引"""
+    with open(path, "r", encoding="utf-8") as f:
+        industry_data = json.load(f)
+
+    code_to_industry = {}
+    code_to_name = {}
+    industry_to_codes = {}
+    for industry_name, industry_info in industry_data.items():
+        codes = []
+        for stock in industry_info.get("stocks", []):
+            # 代码格式为 000429.XSHE，索引只用6位数字部分
+            stock_code = stock.get("代码", "").split(".")[0]
+            if not stock_code:
+                continue
+            codes.append(stock_code)
+            code_to_industry[stock_code] = industry_name
+            code_to_name[stock_code] = stock.get("名称", "")
+        industry_to_codes[industry_name] = codes
+
+    return {
+        "code_to_industry": code_to_industry,
+        "code_to_name": code_to_name,
+        "industry_to_codes": industry_to_codes,
+    }
+
+
+def _load_sidecar(sidecar, mtime):
+    """读取旁路文件，源文件修改时间不一致时返回None"""
+    if not os.path.exists(sidecar):
+        return None
+    try:
+        with open(sidecar, "rb") as f:
+            cached = pickle.load(f)
+        if cached.get("mtime") == mtime:
+            return cached["index"]
+    except Exception as e:
+        print(f"读取行业索引缓存失败: {e}")
+    return None
+
+
+def _save_sidecar(sidecar, mtime, index):
+    tmp = sidecar + ".tmp"
+    try:
+        with open(tmp, "wb") as f:
+            pickle.dump({"mtime": mtime, "index": index}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, sidecar)
+    except Exception as e:
+        print(f"保存行业索引缓存失败: {e}")
+
+
+def get_index(path=INDUSTRY_FILE):
+    """
+    获取行业索引，JSON文件修改后自动重新加载
+
+    Returns:
+        dict: {"code_to_industry", "code_to_name", "industry_to_codes"}，文件不存在时各项为空
+    """
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        print(f"行业信息文件 {path} 不存在")
+        return {"code_to_industry": {}, "code_to_name": {}, "industry_to_codes": {}}
+
+    with _lock:
+        entry = _cache.get(path)
+        if entry is not None and entry[0] == mtime:
+            return entry[1]
+
+        sidecar = _sidecar_path(path)
+        index = _load_sidecar(sidecar, mtime)
+        if index is None:
+            print(f"重建行业索引: {path}")
+            index = _build_index(path)
+            _save_sidecar(sidecar, mtime, index)
+        _cache[path] = (mtime, index)
+        return index
+
+
+def get_industry(code, path=INDUSTRY_FILE):
+    """根据股票代码（6位，或带市场前缀/后缀）查询行业，找不到返回None"""
+    stock_code = code.split(".")[0][-6:]
+    return get_index(path)["code_to_industry"].get(stock_code)
+
+
+def get_stock_name(code, path=INDUSTRY_FILE):
+    """根据股票代码查询股票名称，找不到返回None"""
+    stock_code = code.split(".")[0][-6:]
+    return get_index(path)["code_to_name"].get(stock_code)
+
+
+def get_industry_codes(industry_name, path=INDUSTRY_FILE):
+    """返回行业内所有股票的6位代码列表"""
+    return list(get_index(path)["industry_to_codes"].get(industry_name, []))
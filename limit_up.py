@@ -0,0 +1,199 @@
+# -*- coding:utf-8 -*-
+# 涨停次数统计：按自然年累计每只股票的涨停次数，结果保存在JSON缓存中，
+# 每个交易日只用新增的K线增量更新，不再每次加载一整年日线重新统计
+import os
+import json
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+MARKET_CLOSE = datetime.time(15, 5)  # 收盘后当天的K线视为已完成
+RETURN_DAYS = 20                     # 区间涨幅天数
+
+
+def limit_ratio(code, name=""):
+    """
+    涨跌停幅度
+
+    科创板(688)、创业板(300/301) 20%，北交所 30%（这些板块ST股幅度不变），主板ST股 5%，其余主板 10%
+    """
+    code = code[-6:]
+    if code.startswith(("688", "300", "301")):
+        return 0.20
+    if code.startswith(("8", "4", "92")):
+        return 0.30
+    if "ST" in (name or "").upper():
+        return 0.05
+    return 0.10
+
+
+def limit_up_price(prev_close, ratio):
+    """涨停价：前收盘价×(1+幅度)，四舍五入到分（向量化）"""
+    return np.floor(np.asarray(prev_close, dtype="float64") * (1 + ratio) * 100 + 0.5) / 100
+
+
+def count_limit_up(close, prev_close, ratio):
+    """收盘价达到涨停价的K线数量，close与prev_close逐根对齐"""
+    close = np.asarray(close, dtype="float64")
+    return int(np.count_nonzero(close >= limit_up_price(prev_close, ratio) - 0.001))
+
+
+def _completed_until(now):
+    """最后一根已完成K线的日期上限"""
+    return now.date() if now.time() >= MARKET_CLOSE else now.date() - datetime.timedelta(days=1)
+
+
+class LimitUpCounter:
+    """
+    自然年涨停次数
+
+    Args:
+        path: 缓存文件路径
+        fetch: fetch(code, count) -> 日线DataFrame（最近count根，含close列，以日期为索引）
+        workers: 并发更新的线程数
+
+    每只股票缓存 {"year", "count", "last_day", "closes"}，closes为最近RETURN_DAYS+1根收盘价，
+    同时用于增量统计（前收盘价）和计算近20日涨幅
+    """
+
+    def __init__(self, path, fetch, workers=8):
+        self.path = path
+        self.fetch = fetch
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._data = self._load()
+
+    def _load(self):
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except Exception as e:
+                print(f"读取涨停统计缓存失败: {e}")
+        return {}
+
+    def _save(self):
+        with self._lock:
+            data = json.dumps(self._data, ensure_ascii=False)
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp, self.path)
+        except Exception as e:
+            print(f"保存涨停统计缓存失败: {e}")
+
+    def get(self, code):
+        with self._lock:
+            entry = self._data.get(code)
+            return dict(entry) if entry is not None else None
+
+    def _is_current(self, entry, year, until):
+        return (entry is not None and entry["year"] == year
+                and entry.get("checked") == until.isoformat())
+
+    def _update_one(self, code, name, year, until):
+        """增量更新一只股票，返回新的缓存项，获取失败返回None"""
+        entry = self.get(code)
+        if entry is not None and entry["year"] != year:
+            entry = None  # 跨年重新统计
+        year_start = np.datetime64(f"{year}-01-01", "D")
+        end = np.datetime64(until, "D")
+        if entry is None:
+            # 从年初开始统计，多取一根作为第一天的前收盘价，同时保证有RETURN_DAYS+1根收盘价
+            count = int(np.busday_count(year_start, end + 1)) + 1
+            count = max(count, RETURN_DAYS + 1)
+        else:
+            last = np.datetime64(entry["last_day"], "D")
+            count = int(np.busday_count(last + 1, end + 1)) + 1  # 多取一根已统计的K线作为前收盘价
+            if count <= 1:
+                entry["checked"] = until.isoformat()
+                return entry
+
+        df = self.fetch(code, count)
+        if df is None or df.empty:
+            return None
+        days = df.index.values.astype("datetime64[D]")
+        close = df["close"].to_numpy(dtype="float64")
+        done = days <= end  # 盘中当天的K线不计入
+        days, close = days[done], close[done]
+        if not len(close):
+            return None
+
+        ratio = limit_ratio(code, name)
+        if entry is None:
+            in_year = np.flatnonzero(days >= year_start)
+            in_year = in_year[in_year > 0]  # 需要前收盘价
+            total = count_limit_up(close[in_year], close[in_year - 1], ratio)
+            closes = close[-(RETURN_DAYS + 1):].tolist()
+        else:
+            new = np.flatnonzero(days > np.datetime64(entry["last_day"], "D"))
+            if not len(new):
+                entry["checked"] = until.isoformat()
+                return entry
+            prev = np.concatenate([[entry["closes"][-1]], close[new[:-1]]])
+            total = entry["count"] + count_limit_up(close[new], prev, ratio)
+            closes = (entry["closes"] + close[new].tolist())[-(RETURN_DAYS + 1):]
+
+        return {
+            "year": year,
+            "count": total,
+            "last_day": str(days[-1]),
+            "closes": closes,
+            "checked": until.isoformat(),
+        }
+
+    def update(self, codes, names=None, now=None):
+        """
+        把codes更新到最近一个已完成的交易日，已是最新的股票不发起请求
+
+        Args:
+            names: {code: 名称}，用于判断ST股
+        """
+        now = now or datetime.datetime.now()
+        until = _completed_until(now)
+        year = until.year
+        names = names or {}
+        with self._lock:
+            stale = [code for code in codes if not self._is_current(self._data.get(code), year, until)]
+        if not stale:
+            return
+
+        def work(code):
+            try:
+                return code, self._update_one(code, names.get(code, ""), year, until)
+            except Exception as e:
+                print(f"更新{code}涨停次数失败: {str(e)}")
+                return code, None
+
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(stale))) as pool:
+            results = list(pool.map(work, stale))
+        with self._lock:
+            for code, entry in results:
+                if entry is not None:
+                    self._data[code] = entry
+        self._save()
+
+    def return_20d(self, code, price=None, day=None):
+        """
+        近20日涨幅（%）
+
+        Args:
+            price: 盘中现价，day晚于最后一根已完成K线时把它作为第20天计算，否则只用已完成的K线
+            day: 现价对应的日期
+        """
+        entry = self.get(code)
+        if entry is None:
+            return None
+        closes = entry["closes"]
+        live = price is not None and (day is None or str(day) > entry["last_day"])
+        if live and len(closes) >= RETURN_DAYS:
+            base = closes[-RETURN_DAYS]
+        elif len(closes) >= RETURN_DAYS + 1:
+            base, price = closes[-RETURN_DAYS - 1], closes[-1]
+        else:
+            return None
+        return round((price / base - 1) * 100, 2) if base else None
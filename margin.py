@@ -0,0 +1,234 @@
+# -*- coding:utf-8 -*-
+# 融资数据：每只股票的每日融资余额、融资买入额、融资偿还额保存在本地 .npz 文件中，
+# 每次只下载上次存储之后的新数据；与日线合并后一次性计算
+# “近N日融资净买入”和“股价在近一年中的分位”，用于筛选低位且融资大额净买入的股票
+#
+# 数据源可配置：默认东方财富融资融券明细接口，也可以换成本地JSON文件或模拟服务器（测试用）：
+#   MARGIN_CONFIG["source"] = "data/margin_fixture/{code}.json"
+#   MARGIN_CONFIG["source"] = "http://127.0.0.1:8000/margin?code={code}&count={count}"
+#
+# 更新笔记本外的股票：
+#   python margin.py 600900 000001
+import os
+import sys
+import json
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import Ashare
+import bar_store
+
+MARGIN_CONFIG = {
+    "source": ("https://datacenter-web.eastmoney.com/api/data/v1/get?reportName=RPTA_WEB_RZRQ_GGMX"
+               "&columns=DATE,SCODE,RZYE,RZMRE,RZCHE&filter=(SCODE=%22{code}%22)"
+               "&pageNumber=1&pageSize={count}&sortColumns=DATE&sortTypes=-1"),
+    "store_dir": os.path.join("data", "margin"),
+    "history_days": 250,        # 首次下载的天数，也是股价分位的统计区间
+    "net_buy_days": 20,         # 融资净买入的统计天数
+    "low_percentile": 30,       # 股价分位不高于该值视为低位
+    "workers": 8,
+}
+
+COLUMNS = ["balance", "buy", "repay"]  # 融资余额、融资买入额、融资偿还额（元）
+_SOURCE_FIELDS = {"balance": "RZYE", "buy": "RZMRE", "repay": "RZCHE"}
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _lock_for(code):
+    with _locks_guard:
+        if code not in _locks:
+            _locks[code] = threading.Lock()
+        return _locks[code]
+
+
+def _path(code):
+    return os.path.join(MARGIN_CONFIG["store_dir"], f"{code}.npz")
+
+
+def load(code):
+    """
+    读取本地融资数据
+
+    Returns:
+        dict: {'time': datetime64[D]数组, 'balance'/'buy'/'repay': float64数组,
+            'fetched': 最近一次从数据源下载的日期（datetime64[D]，旧文件没有该项）}，没有存储返回None
+    """
+    path = _path(code)
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as z:
+            series = {k: z[k] for k in ["time"] + COLUMNS}
+            if "fetched" in z:
+                series["fetched"] = z["fetched"][()]
+            return series
+    except Exception as e:
+        print(f"读取{code}融资数据失败: {e}")
+        return None
+
+
+def save(code, series, fetched=None):
+    """保存融资数据，fetched为本次下载的日期"""
+    os.makedirs(MARGIN_CONFIG["store_dir"], exist_ok=True)
+    path = _path(code)
+    tmp = path + ".tmp.npz"
+    arrays = {k: series[k] for k in ["time"] + COLUMNS}
+    if fetched is not None:
+        arrays["fetched"] = np.datetime64(fetched, "D")
+    np.savez(tmp, **arrays)
+    os.replace(tmp, path)
+
+
+def fetch_raw(code, count):
+    """从数据源读取原始内容：http(s)开头按URL请求，否则按本地文件读取"""
+    source = MARGIN_CONFIG["source"].format(code=code, count=count)
+    if source.startswith(("http://", "https://")):
+        return Ashare._http_get(source)
+    with open(source, "rb") as f:
+        return f.read()
+
+
+def parse(content):
+    """
+    解析东方财富格式的融资数据（result.data为记录列表），按日期升序返回列数组
+    """
+    payload = json.loads(content)
+    records = (payload.get("result") or {}).get("data") or []
+    records = [r for r in records if r.get("DATE")]
+    days = np.array([r["DATE"][:10] for r in records], dtype="datetime64[D]")
+    order = np.argsort(days, kind="stable")
+    series = {"time": days[order]}
+    for col, field in _SOURCE_FIELDS.items():
+        values = np.array([r.get(field) for r in records], dtype="float64")  # None -> NaN
+        series[col] = values[order]
+    return series
+
+
+def update(code, now=None):
+    """
+    把一只股票的融资数据更新到最新，只下载上次存储之后的部分
+
+    融资数据在下一个交易日才公布，本地最新日期总是落后于今天，所以按下载日期判断：
+    今天已经下载过的股票不再请求
+
+    Returns:
+        dict: 更新后的数据（同load）
+
+    Raises:
+        获取或解析失败时抛出异常，本地数据不变，也不记录下载日期（调用方可以重试）
+    """
+    now = now or datetime.datetime.now()
+    today = np.datetime64(now.date(), "D")
+    with _lock_for(code):
+        stored = load(code)
+        if stored is None or not len(stored["time"]):
+            count = MARGIN_CONFIG["history_days"]
+        else:
+            if stored.get("fetched") == today:
+                return stored
+            # 多取几天覆盖节假日
+            count = int(np.busday_count(stored["time"][-1] + 1, today + 1)) + 3
+        fresh = parse(fetch_raw(code, count))
+        if stored is not None and len(stored["time"]):
+            new = fresh["time"] > stored["time"][-1]
+            fresh = {k: np.concatenate([stored[k], fresh[k][new]]) for k in ["time"] + COLUMNS}
+        if len(fresh["time"]):
+            save(code, fresh, fetched=today)
+            fresh["fetched"] = today
+        return fresh
+
+
+def update_many(codes, workers=None):
+    """并发更新多只股票，返回 {code: 数据}，获取失败的股票不在结果中"""
+    workers = workers or MARGIN_CONFIG["workers"]
+    if not codes:
+        return {}
+
+    def work(code):
+        try:
+            return update(code)
+        except Exception as e:
+            print(f"获取{code}融资数据失败: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(codes))) as pool:
+        results = dict(zip(codes, pool.map(work, codes)))
+    return {code: series for code, series in results.items() if series is not None}
+
+
+def _tail_matrix(series_list, column, width):
+    """把每只股票最近width个值右对齐叠成矩阵，不足的部分为NaN"""
+    matrix = np.full((len(series_list), width), np.nan)
+    for row, series in enumerate(series_list):
+        if series is None:
+            continue
+        values = series[column][-width:]
+        if len(values):
+            matrix[row, width - len(values):] = values
+    return matrix
+
+
+def low_position_buying(codes, margin=None, bars=None):
+    """
+    计算每只股票的近N日融资净买入与股价分位
+
+    Args:
+        codes: 6位股票代码列表
+        margin: {code: 融资数据}，默认读取本地存储
+        bars: {code: 日线列数组（含close）}，默认读取本地日线存储
+
+    Returns:
+        list: [{"code", "net_buy", "net_buy_ratio", "balance", "price_percentile", "low_position"}, ...]，
+            按净买入占融资余额的比例从高到低排列；net_buy为元，price_percentile为0~100
+    """
+    cfg = MARGIN_CONFIG
+    margin = margin if margin is not None else {code: load(code) for code in codes}
+    bars = bars if bars is not None else {code: bar_store.load(bar_store.to_symbol(code)) for code in codes}
+    if not codes:
+        return []
+
+    # 融资净买入 = 融资买入额 - 融资偿还额
+    series = [margin.get(code) for code in codes]
+    n = cfg["net_buy_days"]
+    net = _tail_matrix(series, "buy", n) - _tail_matrix(series, "repay", n)
+    net_buy = np.where(np.isnan(net).all(axis=1), np.nan, np.nansum(net, axis=1))
+    balance = _tail_matrix(series, "balance", 1)[:, 0]
+
+    # 股价分位：最新收盘价在近history_days天收盘价中的百分位
+    close = _tail_matrix([bars.get(code) for code in codes], "close", cfg["history_days"])
+    last = close[:, -1]
+    valid = ~np.isnan(close)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        percentile = ((close <= last[:, None]) & valid).sum(axis=1) / valid.sum(axis=1) * 100
+        ratio = net_buy / balance * 100
+    percentile[np.isnan(last)] = np.nan
+
+    low = (percentile <= cfg["low_percentile"]) & (net_buy > 0)
+    order = np.argsort(np.where(np.isnan(ratio), np.inf, -ratio), kind="stable")
+    return [
+        {
+            "code": codes[i],
+            "net_buy": _value(net_buy[i], 0),
+            "net_buy_ratio": _value(ratio[i], 2),
+            "balance": _value(balance[i], 0),
+            "price_percentile": _value(percentile[i], 1),
+            "low_position": bool(low[i]),
+        }
+        for i in order
+    ]
+
+
+def _value(x, digits):
+    return None if np.isnan(x) else round(float(x), digits)
+
+
+if __name__ == "__main__":
+    targets = sys.argv[1:] or ["600900"]  # 默认长江电力
+    update_many(targets)
+    for row in low_position_buying(targets):
+        print(row)
@@ -0,0 +1,245 @@
+# -*- coding:utf-8 -*-
+# 当天分钟线存储：每只股票一行、每个交易分钟一列（9:30集合竞价 + 上午120分钟 + 下午120分钟 = 241列），
+# 按字段保存在 股票×分钟 的NumPy矩阵中，只保存当前交易日，换日自动清空
+#   - 从网络补齐1分钟线时只请求上次补齐之后的分钟（fill），非交易日不请求
+#   - 5m/15m/30m/60m 由1分钟线按时间段向量化合成（resample），不再单独请求
+# Ashare.get_price 的当天分钟线请求先读这里
+import datetime
+import threading
+
+import numpy as np
+import pandas as pd
+
+MINUTE_CONFIG = {
+    "min_interval": 10,   # 同一只股票两次网络补齐的最小间隔（秒），盘中当前分钟还在变化
+}
+
+SLOTS = 241                                   # 9:30 + 9:31~11:30 + 13:01~15:00
+COLUMNS = ["open", "high", "low", "close", "volume"]   # 与新浪接口的列顺序一致
+FREQUENCIES = {"1m": 1, "5m": 5, "15m": 15, "30m": 30, "60m": 60}
+SESSION_START = datetime.time(9, 15)          # 早于该时间当天还没有分钟线
+NO_BARS_AFTER = datetime.time(9, 40)          # 晚于该时间仍取不到当天的分钟线，视为当天没有交易
+
+_MORNING_OPEN, _MORNING_CLOSE = 9 * 60 + 30, 11 * 60 + 30
+_AFTERNOON_OPEN, _AFTERNOON_CLOSE = 13 * 60, 15 * 60
+
+# 每一列对应的K线结束时间（当天的第几分钟）
+SLOT_MINUTES = np.concatenate([
+    np.arange(_MORNING_OPEN, _MORNING_CLOSE + 1),
+    np.arange(_AFTERNOON_OPEN + 1, _AFTERNOON_CLOSE + 1),
+])
+
+
+def slot_of_minute(minute):
+    """
+    当天第minute分钟结束的K线所在列（可以是数组）
+
+    集合竞价及更早归入第0列，午休归入11:30，收盘后归入15:00
+    """
+    minute = np.asarray(minute)
+    morning = np.clip(minute - _MORNING_OPEN, 0, _MORNING_CLOSE - _MORNING_OPEN)
+    afternoon = np.clip(minute - _AFTERNOON_OPEN, 0, _AFTERNOON_CLOSE - _AFTERNOON_OPEN) + 120
+    return np.where(minute <= _AFTERNOON_OPEN, morning, afternoon)
+
+
+def current_slot(now):
+    """now这一刻正在形成的K线所在列：9:31:20属于9:32结束的K线"""
+    minute = now.hour * 60 + now.minute + (1 if (now.second or now.microsecond) else 0)
+    return int(slot_of_minute(minute))
+
+
+def _buckets(k):
+    """k分钟K线的分组：每列属于第几根K线；9:30集合竞价并入第一根，上午、下午分别从开盘起每k分钟一根"""
+    slots = np.arange(SLOTS)
+    morning = np.maximum(slots - 1, 0) // k
+    afternoon = -(-120 // k) + (slots - 121) // k
+    return np.where(slots <= 120, morning, afternoon)
+
+
+def resample(fields, k, upto=SLOTS):
+    """
+    把1分钟线矩阵合成为k分钟线（向量化，多只股票一起算）
+
+    Args:
+        fields: {列名: 形状为 (股票数, SLOTS) 的矩阵}，缺失的分钟为NaN
+        k: 分钟数
+        upto: 只使用前upto列（当前正在形成的分钟之后的列不参与）
+
+    Returns:
+        tuple: ({列名: (股票数, K线数) 矩阵}, 每根K线结束时间所在列的数组)；
+            没有任何数据的K线各字段为NaN（成交量为0）；还没走完的K线也以完整时间段的结束时间标记
+    """
+    if k == 1:
+        return {col: m[:, :upto] for col, m in fields.items()}, np.arange(upto)
+    full = _buckets(k)
+    bucket = full[:upto]
+    starts = np.flatnonzero(np.diff(bucket, prepend=-1))
+    ends = np.flatnonzero(np.diff(full, append=full[-1] + 1))[:len(starts)]
+    close = fields["close"][:, :upto]
+    valid = ~np.isnan(close)
+    pos = np.arange(upto)
+    first = np.minimum.reduceat(np.where(valid, pos, upto), starts, axis=1)
+    last = np.maximum.reduceat(np.where(valid, pos, -1), starts, axis=1)
+    empty = last < 0
+    out = {
+        "open": np.take_along_axis(fields["open"][:, :upto], np.minimum(first, upto - 1), axis=1),
+        "high": np.fmax.reduceat(fields["high"][:, :upto], starts, axis=1),
+        "low": np.fmin.reduceat(fields["low"][:, :upto], starts, axis=1),
+        "close": np.take_along_axis(close, np.maximum(last, 0), axis=1),
+        "volume": np.add.reduceat(np.nan_to_num(fields["volume"][:, :upto]), starts, axis=1),
+    }
+    for col in ("open", "close"):
+        out[col][empty] = np.nan
+    return out, ends
+
+
+def capacity(frequency, now):
+    """当天到now为止（含正在形成的K线）最多有几根frequency的K线"""
+    cur = current_slot(now)
+    k = FREQUENCIES[frequency]
+    return cur + 1 if k == 1 else int(_buckets(k)[cur]) + 1
+
+
+class MinuteStore:
+    """
+    当天所有股票的1分钟线
+
+    股票代码为带市场前缀的代码（如 sh600519）；fetch(symbol, count) 返回最近count根1分钟线的DataFrame
+    （如 Ashare.get_price_min_tx），成交量以股为单位，与新浪分钟线一致，合成的K线才能和网络K线混用
+    """
+
+    def __init__(self, fetch=None):
+        self.fetch = fetch
+        self.day = None
+        self._lock = threading.Lock()
+        self._reset(datetime.date.today())
+
+    def _reset(self, day):
+        self.day = day
+        self._index = {}                                                # symbol -> 行号
+        self._data = {col: np.full((0, SLOTS), np.nan) for col in COLUMNS}
+        self._filled = np.zeros(0, dtype=np.intp) - 1                   # 网络补齐到的列，-1为没有补齐过
+        self._filled_at = np.zeros(0)                                   # 上次补齐的时间戳
+        self._closed = not np.is_busday(np.datetime64(day, "D"))        # 周末
+
+    def _roll(self, now):
+        if now.date() != self.day:
+            self._reset(now.date())
+
+    def _rows(self, symbols):
+        """股票代码转换为行号，新出现的股票分配新行（按倍数扩容）"""
+        for symbol in symbols:
+            if symbol not in self._index:
+                self._index[symbol] = len(self._index)
+        height = len(self._index)
+        current = len(self._filled)
+        if height > current:
+            new_height = max(height, current * 2)
+            for col in COLUMNS:
+                grown = np.full((new_height, SLOTS), np.nan)
+                grown[:current] = self._data[col]
+                self._data[col] = grown
+            self._filled = np.concatenate([self._filled, np.full(new_height - current, -1, dtype=np.intp)])
+            self._filled_at = np.concatenate([self._filled_at, np.zeros(new_height - current)])
+        return np.fromiter((self._index[s] for s in symbols), dtype=np.intp, count=len(symbols))
+
+    def fill(self, symbol, fetch=None, now=None):
+        """
+        从网络补齐一只股票的1分钟线，只请求上次补齐的那一分钟（可能还没走完）到当前分钟
+
+        周末不请求；开盘一段时间后取回的K线仍然没有当天的（节假日、停牌），这只股票当天不再请求
+
+        Returns:
+            bool: 是否发起了请求
+        """
+        fetch = fetch or self.fetch
+        now = now or datetime.datetime.now()
+        if now.time() < SESSION_START:
+            return False
+        cur = current_slot(now)
+        ts = now.timestamp()
+        with self._lock:
+            self._roll(now)
+            if self._closed:
+                return False
+            row = self._rows([symbol])[0]
+            last = self._filled[row]
+            if ts - self._filled_at[row] < MINUTE_CONFIG["min_interval"] or (last >= cur == SLOTS - 1):
+                return False
+            self._filled_at[row] = ts
+        count = int(cur - last + 1 if last >= 0 else cur + 1)
+
+        df = fetch(symbol, count)
+        if df is None or df.empty:
+            return True
+        times = df.index
+        today = times.normalize() == pd.Timestamp(self.day)
+        if not today.any():
+            if now.time() >= NO_BARS_AFTER:
+                with self._lock:
+                    if now.date() == self.day:
+                        self._filled_at[self._index[symbol]] = np.inf   # 节假日或停牌，当天不再请求
+            return True
+        slots = slot_of_minute(times.hour[today] * 60 + times.minute[today])
+        with self._lock:
+            if now.date() != self.day:
+                return True
+            row = self._index[symbol]
+            for col in COLUMNS:
+                self._data[col][row, slots] = df[col].to_numpy(dtype="float64")[today]
+            self._filled[row] = max(self._filled[row], int(slots.max()))
+        return True
+
+    def bars(self, symbol, frequency="1m", now=None):
+        """
+        当天到当前分钟为止的K线DataFrame（列同 COLUMNS，以K线结束时间为索引），没有数据返回None
+        """
+        now = now or datetime.datetime.now()
+        k = FREQUENCIES[frequency]
+        with self._lock:
+            self._roll(now)
+            row = self._index.get(symbol)
+            if row is None:
+                return None
+            fields = {col: self._data[col][row:row + 1].copy() for col in COLUMNS}
+        upto = current_slot(now) + 1 if self.day == now.date() else SLOTS
+        out, ends = resample(fields, k, upto)
+        keep = ~np.isnan(out["close"][0])
+        if not keep.any():
+            return None
+        day = np.datetime64(self.day, "m")
+        index = pd.DatetimeIndex(day + SLOT_MINUTES[ends[keep]].astype("timedelta64[m]"), name="")
+        return pd.DataFrame({col: out[col][0, keep] for col in COLUMNS}, index=index)
+
+    def get_price(self, symbol, frequency, count, fetch=None, now=None):
+        """
+        最近count根分钟K线；先补齐当天的1分钟线，当天K线不足count根时返回None（由调用方请求网络）
+
+        当天到现在最多只有 capacity 根K线，不够count根时不补齐，直接返回None
+        """
+        now = now or datetime.datetime.now()
+        if now.time() < SESSION_START or capacity(frequency, now) < count:
+            return None
+        self.fill(symbol, fetch, now)
+        df = self.bars(symbol, frequency, now)
+        if df is None or len(df) < count:
+            return None
+        return df.iloc[-count:]
+
+
+_store = None
+_store_guard = threading.Lock()
+
+
+def get_store():
+    """进程内共享的分钟线存储"""
+    global _store
+    with _store_guard:
+        if _store is None:
+            _store = MinuteStore()
+        return _store
+
+
+def get_bars(symbol, frequency, count, fetch):
+    """Ashare.get_price 的分钟线入口：当天K线足够时直接从存储返回，否则返回None"""
+    return get_store().get_price(symbol, frequency, count, fetch)
@@ -0,0 +1,115 @@
+# -*- coding:utf-8 -*-
+# 常驻内存的笔记存储：启动时加载一次，读请求直接走内存，
+# 写入先改内存，再在防抖间隔后批量写盘（临时文件+重命名，保证文件完整）
+import os
+import json
+import atexit
+import threading
+
+
+class NoteStore:
+    """
+    股票笔记存储，以股票代码为键
+
+    Args:
+        path: JSON文件路径
+        flush_interval: 写盘防抖间隔（秒），间隔内的多次修改合并为一次写盘
+    """
+
+    def __init__(self, path, flush_interval=2.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.version = 0  # 内容每次变化加1，可用于判断内容是否变化
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()  # 保证同一时间只有一个线程写文件
+        self._timer = None
+        self._dirty = False
+        self._notes = self._load()
+        atexit.register(self.flush)
+
+    def _load(self):
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except Exception as e:
+                print(f"加载笔记文件失败: {e}")
+        return {}
+
+    def all(self):
+        """返回所有笔记的副本，调用方修改不会影响存储"""
+        with self._lock:
+            return {code: dict(note) for code, note in self._notes.items()}
+
+    def get(self, code):
+        with self._lock:
+            note = self._notes.get(code)
+            return dict(note) if note is not None else None
+
+    def upsert(self, code, note):
+        """新增或覆盖一条笔记，内容没有变化时不计为修改"""
+        with self._lock:
+            if self._notes.get(code) == note:
+                return
+            self._notes[code] = dict(note)
+            self._changed()
+
+    def update_many(self, notes):
+        """批量覆盖多条笔记，内容没有变化时不计为修改"""
+        with self._lock:
+            changed = False
+            for code, note in notes.items():
+                if self._notes.get(code) != note:
+                    self._notes[code] = dict(note)
+                    changed = True
+            if changed:
+                self._changed()
+
+    def delete(self, code):
+        """删除笔记，不存在返回False"""
+        with self._lock:
+            if code not in self._notes:
+                return False
+            del self._notes[code]
+            self._changed()
+            return True
+
+    def replace_all(self, notes):
+        with self._lock:
+            self._notes = {code: dict(note) for code, note in notes.items()}
+            self._changed()
+
+    def _changed(self):
+        self.version += 1
+        self._dirty = True
+        self._schedule()
+
+    def _schedule(self):
+        if self._timer is None:
+            self._timer = threading.Timer(self.flush_interval, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        """立即把未写盘的修改写入文件"""
+        with self._write_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                if not self._dirty:
+                    return
+                data = json.dumps(self._notes, ensure_ascii=False, indent=2)
+                self._dirty = False
+
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                tmp = self.path + ".tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    f.write(data)
+                os.replace(tmp, self.path)
+            except Exception as e:
+                print(f"保存笔记文件失败: {e}")
+                with self._lock:
+                    self._dirty = True
+                    self._schedule()
@@ -0,0 +1,167 @@
+# -*- coding:utf-8 -*-
+# 多数据源路由：记录每个数据源最近的耗时和失败率
+# 主数据源超过自己的p95耗时还没返回时，同时向备用数据源发出请求（对冲请求），谁先成功用谁；
+# 失败率过高的数据源降级一段时间，期间排到最后，冷却结束后重新参与
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+ROUTER_CONFIG = {
+    "window": 200,          # 每个数据源保留最近多少次请求的统计
+    "min_samples": 20,      # 样本少于该值时使用默认对冲等待时间
+    "default_budget": 1.0,  # 默认对冲等待时间（秒）
+    "min_budget": 0.1,      # 对冲等待时间下限（秒），避免p95很小时频繁对冲
+    "error_rate": 0.5,      # 失败率超过该值时降级
+    "min_errors": 5,        # 至少失败这么多次才会降级
+    "cooldown": 60,         # 降级时长（秒）
+    "workers": 64,          # 执行请求的线程数
+}
+
+
+class SourceHealth:
+    """单个数据源的健康统计"""
+
+    def __init__(self, name):
+        self.name = name
+        self.latencies = deque(maxlen=ROUTER_CONFIG["window"])  # 成功请求的耗时
+        self.outcomes = deque(maxlen=ROUTER_CONFIG["window"])   # True成功 / False失败
+        self.requests = 0
+        self.hedged = 0          # 作为对冲请求被发出的次数
+        self.wins = 0            # 被采用的次数
+        self.demoted_until = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, ok, latency):
+        with self._lock:
+            self.requests += 1
+            self.outcomes.append(ok)
+            if ok:
+                self.latencies.append(latency)
+                return
+            errors = self.outcomes.count(False)
+            if errors >= ROUTER_CONFIG["min_errors"] and errors / len(self.outcomes) >= ROUTER_CONFIG["error_rate"]:
+                self.demoted_until = time.monotonic() + ROUTER_CONFIG["cooldown"]
+                self.outcomes.clear()  # 冷却结束后重新统计
+                print(f"数据源{self.name}失败率过高，降级{ROUTER_CONFIG['cooldown']}秒")
+
+    def count_hedge(self):
+        with self._lock:
+            self.hedged += 1
+
+    def count_win(self):
+        with self._lock:
+            self.wins += 1
+
+    def demoted(self):
+        return time.monotonic() < self.demoted_until
+
+    def p95(self):
+        with self._lock:
+            if len(self.latencies) < ROUTER_CONFIG["min_samples"]:
+                return None
+            ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def budget(self):
+        """对冲等待时间：超过这个时间还没返回就向下一个数据源发请求"""
+        p95 = self.p95()
+        if p95 is None:
+            return ROUTER_CONFIG["default_budget"]
+        return max(p95, ROUTER_CONFIG["min_budget"])
+
+    def stats(self):
+        with self._lock:
+            errors = self.outcomes.count(False)
+            total = len(self.outcomes)
+            latencies = sorted(self.latencies)
+            hedged, wins = self.hedged, self.wins
+        return {
+            "requests": self.requests,
+            "error_rate": round(errors / total, 3) if total else 0.0,
+            "p50": round(latencies[len(latencies) // 2] * 1000, 1) if latencies else None,
+            "p95": round(self.p95() * 1000, 1) if self.p95() is not None else None,
+            "hedged": hedged,
+            "wins": wins,
+            "demoted": self.demoted(),
+        }
+
+
+class QuoteRouter:
+    """
+    按健康状况在多个数据源之间路由请求
+
+    用法：
+        router.call([("sina", lambda: get_price_sina(...)), ("tx", lambda: get_price_day_tx(...))])
+    列表顺序为优先顺序，降级中的数据源排到最后
+    """
+
+    def __init__(self, workers=None):
+        self._sources = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers or ROUTER_CONFIG["workers"],
+                                        thread_name_prefix="QuoteRouter")
+
+    def health(self, name):
+        with self._lock:
+            if name not in self._sources:
+                self._sources[name] = SourceHealth(name)
+            return self._sources[name]
+
+    def _submit(self, name, fn):
+        health = self.health(name)
+
+        def run():
+            start = time.perf_counter()  # 从开始执行算起，排队等待线程的时间不计入数据源的耗时
+            try:
+                result = fn()
+            except Exception:
+                health.record(False, time.perf_counter() - start)
+                raise
+            health.record(True, time.perf_counter() - start)
+            return result
+
+        return self._pool.submit(run)
+
+    def call(self, attempts):
+        """
+        依次尝试各数据源，返回第一个成功的结果；全部失败时抛出最后一个异常
+
+        主数据源失败时立即换下一个；超过它的p95耗时仍未返回时，再向下一个数据源发出对冲请求，
+        两个请求谁先成功用谁
+        """
+        ordered = [a for a in attempts if not self.health(a[0]).demoted()]
+        ordered += [a for a in attempts if self.health(a[0]).demoted()]
+        pending = {}  # future -> (数据源名, 发出时间)
+        last_error = None
+        index = 0
+        while index < len(ordered) or pending:
+            # 没有在途请求（刚开始或都失败了）或最近一个请求超过p95时，发出下一个
+            if index < len(ordered) and (not pending or self._wait_time(pending) <= 0):
+                name, fn = ordered[index]
+                if pending:
+                    self.health(name).count_hedge()
+                pending[self._submit(name, fn)] = (name, time.perf_counter())
+                index += 1
+            timeout = self._wait_time(pending) if index < len(ordered) else None
+            done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, _ = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    last_error = e
+                    continue
+                self.health(name).count_win()
+                return result
+        raise last_error if last_error is not None else RuntimeError("没有可用的数据源")
+
+    def _wait_time(self, pending):
+        """距离最近发出的请求到达对冲时间还有多久"""
+        name, started = max(pending.values(), key=lambda v: v[1])
+        return max(0.0, self.health(name).budget() - (time.perf_counter() - started))
+
+    def stats(self):
+        with self._lock:
+            sources = dict(self._sources)
+        return {name: health.stats() for name, health in sources.items()}
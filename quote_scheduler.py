@@ -0,0 +1,176 @@
+# -*- coding:utf-8 -*-
+# 后台行情刷新：在独立线程中按固定间隔刷新行情表，交易时段内高频刷新，
+# 收盘后补刷一次再进入低频检查，接口读取时只合并内存中的行情，不再访问网络
+# 每次刷新后把有变化的字段推送给订阅者（用于SSE实时推送）
+import datetime
+import threading
+import time
+
+# A股交易时段（含集合竞价）
+MARKET_OPEN = datetime.time(9, 15)
+TRADING_SESSIONS = [
+    (MARKET_OPEN, datetime.time(11, 30)),
+    (datetime.time(13, 0), datetime.time(15, 0)),
+]
+MARKET_CLOSE = datetime.time(15, 0)
+
+
+def is_trading_time(now=None):
+    """是否处于交易时段（只判断工作日，不含节假日）"""
+    now = now or datetime.datetime.now()
+    if now.weekday() >= 5:
+        return False
+    t = now.time()
+    return any(start <= t <= end for start, end in TRADING_SESSIONS)
+
+
+def last_market_close(now=None):
+    """最近一次收盘的时间"""
+    now = now or datetime.datetime.now()
+    day = now.date()
+    if now.time() < MARKET_CLOSE:
+        day -= datetime.timedelta(days=1)
+    while day.weekday() >= 5:
+        day -= datetime.timedelta(days=1)
+    return datetime.datetime.combine(day, MARKET_CLOSE)
+
+
+class QuoteSubscription:
+    """
+    行情变化的订阅，消费者来不及读取时，多次刷新的变化合并为一次（同一字段保留最新值）
+    """
+
+    def __init__(self):
+        self._pending = {}  # code -> {字段: 新值}
+        self._cond = threading.Condition()
+
+    def publish(self, delta):
+        with self._cond:
+            for code, fields in delta.items():
+                self._pending.setdefault(code, {}).update(fields)
+            self._cond.notify_all()
+
+    def get(self, timeout=None):
+        """等待下一批变化，返回 {code: {字段: 新值}}，超时返回空字典"""
+        with self._cond:
+            if not self._pending:
+                self._cond.wait(timeout)
+            delta, self._pending = self._pending, {}
+            return delta
+
+
+class QuoteScheduler:
+    """
+    后台行情刷新器
+
+    Args:
+        get_codes: get_codes() -> 需要刷新的股票代码列表
+        refresh: refresh(codes) -> {code: 行情字段dict}，只返回刷新成功的股票
+        interval: 交易时段内的刷新间隔（秒）
+        idle_interval: 非交易时段的检查间隔（秒）
+    """
+
+    def __init__(self, get_codes, refresh, interval=30, idle_interval=600):
+        self.get_codes = get_codes
+        self.refresh = refresh
+        self.interval = interval
+        self.idle_interval = idle_interval
+        self.version = 0            # 行情表每次变化加1
+        self.last_refresh = None    # 最近一次完整刷新的时间
+        self._quotes = {}
+        self._pending = set()       # 等待立即刷新的股票（如新添加的笔记）
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._subscribers = set()
+
+    def ensure_started(self):
+        """启动后台线程（重复调用无影响）"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="QuoteScheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+    def request_refresh(self, codes):
+        """尽快刷新指定股票，不等待下一个周期"""
+        with self._lock:
+            self._pending.update(codes)
+        self._wakeup.set()
+
+    def subscribe(self):
+        """订阅行情变化，用完后需调用unsubscribe"""
+        subscription = QuoteSubscription()
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def get_quotes(self):
+        """返回行情表的副本 {code: 行情字段}"""
+        with self._lock:
+            return {code: dict(quote) for code, quote in self._quotes.items()}
+
+    def get_quote(self, code):
+        with self._lock:
+            quote = self._quotes.get(code)
+            return dict(quote) if quote is not None else None
+
+    def _due(self, now):
+        """是否需要做一次完整刷新"""
+        if self.last_refresh is None:
+            return True
+        if is_trading_time(now):
+            return (now - self.last_refresh).total_seconds() >= self.interval
+        # 非交易时段：收盘后还没刷新过就补刷一次
+        return self.last_refresh < last_market_close(now)
+
+    def refresh_now(self, codes=None):
+        """立即刷新，codes为空时刷新全部股票"""
+        full = codes is None
+        if full:
+            codes = self.get_codes()
+        start = time.time()
+        try:
+            quotes = self.refresh(list(codes)) if codes else {}
+        except Exception as e:
+            print(f"后台刷新行情失败: {e}")
+            return
+        with self._lock:
+            delta = {}
+            for code, quote in quotes.items():
+                old = self._quotes.get(code) or {}
+                fields = {k: v for k, v in quote.items() if old.get(k) != v}
+                if fields:
+                    delta[code] = fields
+                    self._quotes[code] = dict(quote)
+            if delta:
+                self.version += 1
+            subscribers = list(self._subscribers)
+        if delta:
+            for subscription in subscribers:
+                subscription.publish(delta)
+        if full:
+            self.last_refresh = datetime.datetime.now()
+        print(f"后台刷新行情: {len(quotes)}/{len(codes)} 只股票，耗时 {time.time() - start:.1f}秒")
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self._lock:
+                pending, self._pending = self._pending, set()
+            if pending:
+                self.refresh_now(pending)
+            if self._due(datetime.datetime.now()):
+                self.refresh_now()
+            wait = self.interval if is_trading_time() else self.idle_interval
+            self._wakeup.wait(wait)
+            self._wakeup.clear()
@@ -0,0 +1,123 @@
+# -*- coding:utf-8 -*-
+# 排序索引：每一列维护一个有序的 (值, 代码) 列表，行情变化时用二分查找删除旧键、插入新键，
+# 按任意列、任意方向取前N名或分页时直接切片，不需要每次请求都重新排序
+import bisect
+import math
+import threading
+
+
+def _normalize(value):
+    """NaN按缺失处理"""
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+class RankingIndex:
+    """
+    多列排序索引
+
+    Args:
+        columns: 可排序的列名；缺失（None）的值不参与排序，始终排在最后
+
+    update/remove 每次只调整发生变化的列，复杂度为 O(log n) 查找加一次列表移动
+    """
+
+    def __init__(self, columns):
+        self.columns = tuple(columns)
+        self.version = 0
+        self._rows = {}                                   # code -> 行
+        self._sorted = {col: [] for col in self.columns}  # col -> [(值, code)] 升序
+        self._missing = {col: [] for col in self.columns} # col -> [code] 升序
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, code):
+        return code in self._rows
+
+    def codes(self):
+        with self._lock:
+            return list(self._rows)
+
+    def _insert_key(self, col, value, code):
+        if value is None:
+            bisect.insort(self._missing[col], code)
+        else:
+            bisect.insort(self._sorted[col], (value, code))
+
+    def _remove_key(self, col, value, code):
+        if value is None:
+            lst, key = self._missing[col], code
+        else:
+            lst, key = self._sorted[col], (value, code)
+        i = bisect.bisect_left(lst, key)
+        if i < len(lst) and lst[i] == key:
+            del lst[i]
+
+    def update(self, code, fields):
+        """
+        新增或更新一行，只调整fields中值发生变化的列
+
+        Returns:
+            bool: 是否有变化
+        """
+        with self._lock:
+            row = self._rows.get(code)
+            if row is None:
+                row = self._rows[code] = {"code": code}
+                for col in self.columns:
+                    row.setdefault(col, None)
+                    self._insert_key(col, row[col], code)
+            changed = False
+            for col, value in fields.items():
+                value = _normalize(value)
+                old = row.get(col)
+                if col in row and old == value:
+                    continue
+                changed = True
+                if col in self._sorted:
+                    self._remove_key(col, old, code)
+                    self._insert_key(col, value, code)
+                row[col] = value
+            if changed:
+                self.version += 1
+            return changed
+
+    def remove(self, code):
+        with self._lock:
+            row = self._rows.pop(code, None)
+            if row is None:
+                return False
+            for col in self.columns:
+                self._remove_key(col, row.get(col), code)
+            self.version += 1
+            return True
+
+    def get(self, code):
+        with self._lock:
+            row = self._rows.get(code)
+            return dict(row) if row is not None else None
+
+    def page(self, column, descending=True, offset=0, limit=None):
+        """
+        按column排序后的第offset行开始的limit行（limit为None时取到最后）
+
+        Returns:
+            tuple: (行列表, 总行数)
+        """
+        with self._lock:
+            ordered = self._sorted[column]
+            missing = self._missing[column]
+            n = len(ordered)
+            total = n + len(missing)
+            end = total if limit is None else min(total, offset + limit)
+            rows = []
+            for rank in range(max(offset, 0), end):
+                if rank < n:
+                    code = ordered[n - 1 - rank][1] if descending else ordered[rank][1]
+                else:
+                    code = missing[rank - n]
+                rows.append(dict(self._rows[code]))
+            return rows, total
@@ -0,0 +1,297 @@
+# -*- coding:utf-8 -*-
+# 全市场选股：把申万行业内所有股票的本地日线载入一个 股票×交易日 的二维矩阵，
+# 所有指标按整列一次算完，筛选只是布尔掩码，结果按行业分组排序
+#
+# 首次使用先补齐本地日线（之后每天只下载新增的K线）：
+#   python screener.py sync
+import os
+import sys
+import time
+import threading
+import numpy as np
+
+import bar_store
+import industry_index
+
+SCREEN_CONFIG = {
+    "days": 60,          # 载入矩阵的交易日数
+    "ma_days": 5,        # 均线天数
+    "return_days": 20,   # 区间涨幅天数
+    "ratio_days": 10,    # 量比取最大值的天数
+    "range_days": 10,    # 振幅天数
+    "cache_dir": os.path.join("data", "screener"),  # 矩阵快照目录（不能放在日线目录里，否则会改变存储签名）
+}
+
+# 可以用于筛选和排序的指标
+METRICS = ("close", "change_pct", "ma5_distance", "return_20d", "max_volume_ratio", "amplitude_10d")
+
+_lock = threading.Lock()
+_cache = {}  # (行业文件, 天数) -> (存储签名, MarketMatrix)
+
+
+def _ffill(a):
+    """按行向前填充NaN（停牌日沿用上一个交易日的值）"""
+    valid = ~np.isnan(a)
+    idx = np.where(valid, np.arange(a.shape[1]), 0)
+    np.maximum.accumulate(idx, axis=1, out=idx)
+    return a[np.arange(a.shape[0])[:, None], idx]
+
+
+class MarketMatrix:
+    """
+    全市场日线矩阵及其指标
+
+    Attributes:
+        codes, names, industries: 每行股票的代码、名称、行业（NumPy数组）
+        days: 每列的交易日（datetime64[D]）
+        open, high, low, close, volume: 形状为 (股票数, 交易日数) 的矩阵，缺失为NaN
+        metrics: {指标名: 与codes对齐的一维数组}，stale的股票各指标为NaN
+        stale: 最新一根K线早于最后一个交易日的股票（停牌或本地日线没有更新），不参与筛选
+    """
+
+    def __init__(self, codes, names, industries, days, bars):
+        self.codes = np.asarray(codes)
+        self.names = np.asarray(names)
+        self.industries = np.asarray(industries)
+        self.days = days
+        for col in bar_store.COLUMNS:
+            setattr(self, col, bars[col])
+        self.stale = np.isnan(self.close[:, -1]) if self.close.shape[1] else np.ones(len(self.codes), dtype=bool)
+        self.metrics = self._compute_metrics()
+
+    def __len__(self):
+        return len(self.codes)
+
+    def _compute_metrics(self):
+        cfg = SCREEN_CONFIG
+        if self.close.shape[1] == 0:
+            return {name: np.full(len(self), np.nan) for name in METRICS}
+        close = _ffill(self.close)
+        last = close[:, -1]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            prev = close[:, -2] if close.shape[1] >= 2 else np.full(len(last), np.nan)
+            change_pct = (last - prev) / prev * 100
+
+            n = cfg["ma_days"]
+            ma = close[:, -n:].mean(axis=1) if close.shape[1] >= n else np.full(len(last), np.nan)
+            ma5_distance = (last - ma) / ma * 100
+
+            n = cfg["return_days"]
+            base = close[:, -n - 1] if close.shape[1] > n else np.full(len(last), np.nan)
+            return_20d = (last / base - 1) * 100
+
+            # 停牌日成交量为NaN，对应的量比也是NaN，取最大值时忽略
+            volume = self.volume[:, -cfg["ratio_days"] - 1:]
+            ratio = volume[:, 1:] / volume[:, :-1]
+            ratio[~np.isfinite(ratio)] = np.nan
+            max_volume_ratio = np.fmax.reduce(ratio, axis=1) if ratio.shape[1] else np.full(len(last), np.nan)
+
+            n = cfg["range_days"]
+            high = np.fmax.reduce(self.high[:, -n:], axis=1)
+            low = np.fmin.reduce(self.low[:, -n:], axis=1)
+            amplitude_10d = (high - low) / last * 100
+
+        metrics = {
+            "close": last,
+            "change_pct": np.round(change_pct, 2),
+            "ma5_distance": np.round(ma5_distance, 2),
+            "return_20d": np.round(return_20d, 2),
+            "max_volume_ratio": np.round(max_volume_ratio, 2),
+            "amplitude_10d": np.round(amplitude_10d, 2),
+        }
+        # 向前填充只用于补中间的停牌日，最后一天没有K线的股票不能把旧数据当作最新指标
+        for values in metrics.values():
+            values[self.stale] = np.nan
+        return metrics
+
+    def mask(self, filters):
+        """
+        按指标范围筛选
+
+        Args:
+            filters: {指标名: (最小值, 最大值)}，None表示不限，指标为NaN的股票不满足任何条件
+        """
+        keep = np.ones(len(self), dtype=bool)
+        for name, (low, high) in filters.items():
+            values = self.metrics[name]
+            keep &= ~np.isnan(values)
+            if low is not None:
+                keep &= values >= low
+            if high is not None:
+                keep &= values <= high
+        return keep
+
+    def screen(self, filters=None, sort_by="return_20d", ascending=False, top=None, industries=None):
+        """
+        筛选并按行业分组排序
+
+        Args:
+            filters: 同mask()
+            sort_by: 组内排序的指标
+            ascending: 是否升序
+            top: 每个行业最多返回的股票数
+            industries: 只看这些行业，默认全部
+
+        Returns:
+            dict: {行业: [{"code", "name", 各指标...}, ...]}，行业按入选股票数从多到少排列
+        """
+        keep = self.mask(filters or {})
+        keep &= ~np.isnan(self.metrics[sort_by])
+        if industries:
+            keep &= np.isin(self.industries, list(industries))
+        rows = np.flatnonzero(keep)
+        if not len(rows):
+            return {}
+
+        key = self.metrics[sort_by][rows]
+        order = np.lexsort((key if ascending else -key, self.industries[rows]))
+        rows = rows[order]
+        groups, starts, counts = np.unique(self.industries[rows], return_index=True, return_counts=True)
+
+        columns = {name: self.metrics[name][rows].tolist() for name in METRICS}
+        codes = self.codes[rows].tolist()
+        names = self.names[rows].tolist()
+        result = []
+        for industry, start, count in zip(groups.tolist(), starts.tolist(), counts.tolist()):
+            end = start + (min(count, top) if top else count)
+            stocks = [
+                dict(code=codes[i], name=names[i], **{name: _value(columns[name][i]) for name in METRICS})
+                for i in range(start, end)
+            ]
+            result.append((count, industry, stocks))
+        result.sort(key=lambda x: -x[0])
+        return {industry: stocks for _, industry, stocks in result}
+
+
+def _value(x):
+    return None if x != x else x
+
+
+def _load_rows(days, path):
+    """逐个读取本地日线，返回 [(代码, 名称, 行业, 最近days根K线), ...]"""
+    index = industry_index.get_index(path)
+    loaded = []
+    for code, industry in index["code_to_industry"].items():
+        bars = bar_store.load(bar_store.to_symbol(code))
+        if bars is None or not len(bars["time"]):
+            continue
+        tail = {k: bars[k][-days:] for k in ["time"] + bar_store.COLUMNS}
+        loaded.append((code, index["code_to_name"].get(code, ""), industry, tail))
+    return loaded
+
+
+def build_matrix(days=None, path=industry_index.INDUSTRY_FILE):
+    """从本地日线存储载入全市场矩阵，本地没有日线的股票跳过"""
+    days = days or SCREEN_CONFIG["days"]
+    loaded = _load_rows(days, path)
+    if not loaded:
+        return MarketMatrix([], [], [], np.array([], dtype="datetime64[D]"),
+                            {col: np.empty((0, 0)) for col in bar_store.COLUMNS})
+
+    # 所有股票出现过的交易日取最近days个作为列
+    calendar = np.unique(np.concatenate([tail["time"] for *_, tail in loaded]))[-days:]
+    bars = {col: np.full((len(loaded), len(calendar)), np.nan) for col in bar_store.COLUMNS}
+    for row, (*_, tail) in enumerate(loaded):
+        pos = np.searchsorted(calendar, tail["time"])
+        hit = pos < len(calendar)
+        hit[hit] = calendar[pos[hit]] == tail["time"][hit]
+        for col in bar_store.COLUMNS:
+            bars[col][row, pos[hit]] = tail[col][hit]
+
+    codes, names, industries, _ = zip(*loaded)
+    return MarketMatrix(codes, names, industries, calendar, bars)
+
+
+def _matrix_file(days):
+    return os.path.join(SCREEN_CONFIG["cache_dir"], f"market_{days}.npz")
+
+
+def _store_signature(path):
+    """
+    本地日线存储的签名（日线目录、行业文件的修改时间）
+
+    bar_store.save 每次都是写临时文件再重命名，会改变目录的修改时间，
+    所以只需要stat一次目录，不用逐个stat几千个日线文件
+    """
+    store_mtime = os.stat(bar_store.STORE_DIR).st_mtime_ns if os.path.isdir(bar_store.STORE_DIR) else 0
+    industry_mtime = os.stat(path).st_mtime_ns if os.path.exists(path) else 0
+    return np.array([store_mtime, industry_mtime], dtype=np.int64)
+
+
+def _load_matrix_file(days, signature):
+    """读取矩阵快照文件，签名不一致返回None"""
+    file = _matrix_file(days)
+    if not os.path.exists(file):
+        return None
+    try:
+        with np.load(file) as z:
+            if not np.array_equal(z["signature"], signature):
+                return None
+            bars = {col: z[col] for col in bar_store.COLUMNS}
+            return MarketMatrix(z["codes"], z["names"], z["industries"], z["days"], bars)
+    except Exception as e:
+        print(f"读取全市场矩阵缓存失败: {e}")
+        return None
+
+
+def _save_matrix_file(days, signature, matrix):
+    os.makedirs(SCREEN_CONFIG["cache_dir"], exist_ok=True)
+    file = _matrix_file(days)
+    tmp = file + ".tmp.npz"
+    try:
+        np.savez(tmp, signature=signature, codes=matrix.codes.astype(str), names=matrix.names.astype(str),
+                 industries=matrix.industries.astype(str), days=matrix.days,
+                 **{col: getattr(matrix, col) for col in bar_store.COLUMNS})
+        os.replace(tmp, file)
+    except Exception as e:
+        print(f"保存全市场矩阵缓存失败: {e}")
+
+
+def get_matrix(days=None, path=industry_index.INDUSTRY_FILE, reload=False):
+    """
+    获取全市场矩阵
+
+    本地日线没有变化时直接使用内存中的矩阵；进程重启后读取一个矩阵快照文件，
+    不再逐个打开几千个日线文件
+    """
+    days = days or SCREEN_CONFIG["days"]
+    signature = _store_signature(path)
+    with _lock:
+        entry = _cache.get((path, days))
+        if entry is not None and np.array_equal(entry[0], signature) and not reload:
+            return entry[1]
+        start = time.time()
+        matrix = None if reload else _load_matrix_file(days, signature)
+        if matrix is None:
+            matrix = build_matrix(days, path)
+            _save_matrix_file(days, signature, matrix)
+        print(f"载入全市场日线矩阵: {len(matrix)}只股票 × {len(matrix.days)}天，耗时{time.time() - start:.2f}秒")
+        _cache[(path, days)] = (signature, matrix)
+        return matrix
+
+
+def screen(filters=None, sort_by="return_20d", ascending=False, top=None, industries=None, days=None):
+    """全市场筛选，参数见MarketMatrix.screen"""
+    return get_matrix(days).screen(filters, sort_by, ascending, top, industries)
+
+
+def sync(days=None, path=industry_index.INDUSTRY_FILE):
+    """补齐全市场本地日线（已是最新的股票不会发起请求）"""
+    import ashare_async
+    days = days or SCREEN_CONFIG["days"]
+    codes = [bar_store.to_symbol(code) for code in industry_index.get_index(path)["code_to_industry"]]
+    start = time.time()
+    dfs = ashare_async.get_prices(codes, count=days)
+    print(f"补齐{len(dfs)}/{len(codes)}只股票日线，耗时{time.time() - start:.1f}秒")
+    get_matrix(days, path, reload=True)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "sync":
+        sync()
+    matrix = get_matrix()
+    start = time.time()
+    result = matrix.screen({"ma5_distance": (-3, 3), "return_20d": (10, None)}, sort_by="return_20d", top=3)
+    print(f"筛选耗时{(time.time() - start) * 1000:.1f}毫秒，{len(result)}个行业入选")
+    for industry, stocks in list(result.items())[:10]:
+        print(industry, [(s["code"], s["name"], s["return_20d"]) for s in stocks])
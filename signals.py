@@ -0,0 +1,272 @@
+# -*- coding:utf-8 -*-
+# 形态信号：箱体突破、上升趋势、箱体震荡
+# 每只股票只需要最近WINDOW根已完成日线，多只股票叠成 股票×窗口 的矩阵一次判断；
+# 整段历史用sliding_window_view展开成窗口矩阵，复用同一个判断函数。
+# 结果按交易日缓存，同一天内重复查询不重新计算；股票数多时分块交给多进程并行计算
+import os
+import json
+import datetime
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+import bar_store
+
+SIGNAL_CONFIG = {
+    "box_days": 20,            # 箱体取最近多少个交易日（不含最新一根）
+    "box_width": 0.15,         # 箱体高低点相差不超过15%
+    "breakout_pct": 0.01,      # 收盘价高于箱顶1%算突破
+    "breakout_volume": 1.5,    # 突破当天成交量至少是箱体期间均量的1.5倍
+    "ma_windows": (5, 10, 20), # 上升趋势：均线多头排列
+    "trend_slope_days": 5,     # 上升趋势：MA20高于5天前的MA20
+    "parallel_threshold": 500, # 需要计算的股票数超过该值时使用多进程
+    "workers": os.cpu_count() or 4,
+    "cache_file": os.path.join("data", "signals.json"),
+}
+
+BREAKOUT, UPTREND, CONSOLIDATION = "箱体突破", "上升趋势", "箱体震荡"
+SIGNALS = (BREAKOUT, UPTREND, CONSOLIDATION)  # 同时满足时按此优先级取第一个
+
+MARKET_CLOSE = datetime.time(15, 5)
+
+
+def window_size():
+    """判断一根K线需要的K线数"""
+    cfg = SIGNAL_CONFIG
+    return max(cfg["box_days"] + 1, max(cfg["ma_windows"]) + cfg["trend_slope_days"])
+
+
+def classify_windows(high, low, close, volume):
+    """
+    判断每个窗口最后一根K线的形态
+
+    Args:
+        high, low, close, volume: 形状为 (窗口数, window_size()) 的矩阵，最后一列为最新K线，
+            数据不足的窗口用NaN填充（结果为空字符串）
+
+    Returns:
+        dict: {"signal": 信号数组（无信号为""）, "box_high", "box_low": 箱顶、箱底数组}
+    """
+    cfg = SIGNAL_CONFIG
+    n = cfg["box_days"]
+    last = close[:, -1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        box_high = high[:, -n - 1:-1].max(axis=1)
+        box_low = low[:, -n - 1:-1].min(axis=1)
+        is_box = (box_high - box_low) / box_low <= cfg["box_width"]
+        box_volume = volume[:, -n - 1:-1].mean(axis=1)
+
+        breakout = (is_box & (last > box_high * (1 + cfg["breakout_pct"]))
+                    & (volume[:, -1] >= box_volume * cfg["breakout_volume"]))
+
+        ma = [close[:, -w:].mean(axis=1) for w in cfg["ma_windows"]]
+        slope = cfg["trend_slope_days"]
+        longest = max(cfg["ma_windows"])
+        ma_long_prev = close[:, -longest - slope:-slope].mean(axis=1)
+        uptrend = last > ma[-1]
+        for fast, slow in zip(ma, ma[1:]):
+            uptrend &= fast > slow
+        uptrend &= ma[-1] > ma_long_prev
+
+        consolidation = is_box & (last >= box_low) & (last <= box_high)
+
+    signal = np.select([breakout, uptrend, consolidation], SIGNALS, default="")
+    return {"signal": signal, "box_high": box_high, "box_low": box_low}
+
+
+def classify_series(bars):
+    """
+    整段历史每一根K线的形态（画图、回看用）
+
+    Args:
+        bars: {"high", "low", "close", "volume": 一维数组}
+
+    Returns:
+        信号数组，与输入等长，前window_size()-1根为""
+    """
+    w = window_size()
+    length = len(bars["close"])
+    result = np.full(length, "", dtype=object)
+    if length < w:
+        return result
+    windows = [sliding_window_view(np.asarray(bars[col], dtype="float64"), w)
+               for col in ("high", "low", "close", "volume")]
+    result[w - 1:] = classify_windows(*windows)["signal"]
+    return result
+
+
+def _tail_matrix(bars_list):
+    """把每只股票最近window_size()根K线右对齐叠成矩阵，不足的部分为NaN"""
+    w = window_size()
+    matrix = {col: np.full((len(bars_list), w), np.nan) for col in ("high", "low", "close", "volume")}
+    for row, bars in enumerate(bars_list):
+        k = min(w, len(bars["close"]))
+        if k:
+            for col in matrix:
+                matrix[col][row, w - k:] = bars[col][-k:]
+    return matrix
+
+
+def _detect_symbols(symbols, until=None):
+    """
+    读取本地日线并判断形态，返回 {symbol: 结果}（多进程的工作函数，必须在模块顶层）
+
+    until: 最后一个已收盘的日期（ISO字符串），晚于它的盘中K线不参与判断；
+        最新K线早于until之前最后一个交易日的股票（下载失败、停牌）不返回结果，下次查询重新计算。
+        交易所节假日不在工作日历中，所以同一批中最新的K线日期更早时以它为准
+    """
+    loaded = []
+    for symbol in symbols:
+        bars = bar_store.load(symbol)
+        if bars is None:
+            continue
+        if until is not None:
+            end = np.searchsorted(bars["time"], np.datetime64(until, "D"), side="right")
+            bars = {col: bars[col][:end] for col in ["time"] + bar_store.COLUMNS}
+        if len(bars["time"]):
+            loaded.append((symbol, bars))
+    if not loaded:
+        return {}
+    if until is not None:
+        expected = np.busday_offset(np.datetime64(until, "D"), 0, roll="backward")
+        expected = min(expected, max(bars["time"][-1] for _, bars in loaded))
+        loaded = [(symbol, bars) for symbol, bars in loaded if bars["time"][-1] >= expected]
+    matrix = _tail_matrix([bars for _, bars in loaded])
+    result = classify_windows(matrix["high"], matrix["low"], matrix["close"], matrix["volume"])
+    output = {}
+    for i, (symbol, bars) in enumerate(loaded):
+        output[symbol] = {
+            "signal": str(result["signal"][i]),
+            "box_high": _round(result["box_high"][i]),
+            "box_low": _round(result["box_low"][i]),
+            "last_day": str(bars["time"][-1]),
+        }
+    return output
+
+
+def _round(x):
+    return None if x != x else round(float(x), 2)
+
+
+def _completed_until(now):
+    return now.date() if now.time() >= MARKET_CLOSE else now.date() - datetime.timedelta(days=1)
+
+
+class SignalDetector:
+    """
+    按交易日缓存的形态信号
+
+    Args:
+        fetch: fetch(code, count)，调用后本地日线存储中应有该股票最新的日线（如 Ashare.get_price）；
+            为None时只使用本地已有的日线
+        cache_file: 缓存文件路径
+    """
+
+    def __init__(self, fetch=None, cache_file=None, workers=None):
+        self.fetch = fetch
+        self.cache_file = cache_file or SIGNAL_CONFIG["cache_file"]
+        self.workers = workers or SIGNAL_CONFIG["workers"]
+        self._lock = threading.Lock()
+        self._pool = None
+        self._cache = self._load()  # {"until": 日期, "results": {code: 结果}}
+
+    def _load(self):
+        if os.path.exists(self.cache_file):
+            try:
+                with open(self.cache_file, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except Exception as e:
+                print(f"读取形态信号缓存失败: {e}")
+        return {"until": None, "results": {}}
+
+    def _save(self):
+        with self._lock:
+            data = json.dumps(self._cache, ensure_ascii=False)
+        try:
+            os.makedirs(os.path.dirname(self.cache_file) or ".", exist_ok=True)
+            tmp = self.cache_file + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp, self.cache_file)
+        except Exception as e:
+            print(f"保存形态信号缓存失败: {e}")
+
+    def _get_pool(self):
+        """常驻的进程池，第一次需要时创建，避免每次查询都启动进程"""
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            return self._pool
+
+    def _compute(self, symbols, until=None):
+        """计算形态，股票多时分块交给多进程"""
+        if len(symbols) < SIGNAL_CONFIG["parallel_threshold"] or self.workers <= 1:
+            return _detect_symbols(symbols, until)
+        size = -(-len(symbols) // self.workers)
+        chunks = [symbols[i:i + size] for i in range(0, len(symbols), size)]
+        results = {}
+        for part in self._get_pool().map(_detect_symbols, chunks, [until] * len(chunks)):
+            results.update(part)
+        return results
+
+    def close(self):
+        """关闭进程池"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown()
+
+    def detect(self, codes, now=None):
+        """
+        返回 {code: {"signal", "box_high", "box_low", "last_day"}}
+
+        当天已经算过的股票直接读缓存；新的交易日只计算一次，日线没有更新到最新交易日的股票不返回
+        """
+        now = now or datetime.datetime.now()
+        until = _completed_until(now).isoformat()
+        with self._lock:
+            if self._cache["until"] != until:
+                self._cache = {"until": until, "results": {}}
+            cached = self._cache["results"]
+            stale = [code for code in codes if code not in cached]
+
+        if stale:
+            if self.fetch is not None:
+                count = window_size()
+                with ThreadPoolExecutor(max_workers=16) as pool:
+                    list(pool.map(lambda code: self._safe_fetch(code, count), stale))
+            symbols = {bar_store.to_symbol(code): code for code in stale}
+            computed = self._compute(list(symbols), until)
+            with self._lock:
+                for symbol, result in computed.items():
+                    self._cache["results"][symbols[symbol]] = result
+            self._save()
+
+        with self._lock:
+            results = self._cache["results"]
+            return {code: dict(results[code]) for code in codes if code in results}
+
+    def _safe_fetch(self, code, count):
+        try:
+            self.fetch(code, count)
+        except Exception as e:
+            print(f"获取{code}日线失败: {str(e)}")
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+    import industry_index
+
+    industry = sys.argv[1] if len(sys.argv) > 1 else None
+    index = industry_index.get_index()
+    codes = industry_index.get_industry_codes(industry) if industry else list(index["code_to_industry"])
+    detector = SignalDetector(cache_file=os.path.join("data", "signals_cli.json"))
+    start = time.time()
+    results = detector.detect(codes)
+    print(f"{len(results)}/{len(codes)}只股票，耗时{time.time() - start:.2f}秒")
+    for name in SIGNALS:
+        hits = [code for code, r in results.items() if r["signal"] == name]
+        print(name, len(hits), hits[:10])
@@ -0,0 +1,92 @@
+# -*- coding:utf-8 -*-
+# 定长环形缓冲区，保存最近若干次行情快照（带时间戳），用于计算任意时间窗口的涨速
+# 数据按 [快照, 股票] 存放在NumPy数组中，容量固定，不保存DataFrame副本
+import time
+import numpy as np
+
+
+class SnapshotRing:
+    """
+    行情快照环形缓冲区
+
+    Args:
+        capacity: 最多保存的快照数，超过后覆盖最旧的快照
+        columns: 每次快照保存的字段，如 ("change_pct", "price")
+    """
+
+    def __init__(self, capacity=64, columns=("change_pct", "price")):
+        self.capacity = capacity
+        self.columns = tuple(columns)
+        self._times = np.full(capacity, np.nan)
+        self._data = {col: np.full((capacity, 0), np.nan) for col in self.columns}
+        self._index = {}  # 股票代码 -> 列号
+        self._head = 0    # 下一次写入的位置
+
+    def __len__(self):
+        return int(np.count_nonzero(~np.isnan(self._times)))
+
+    def _columns_for(self, codes):
+        """股票代码转换为列号，新出现的股票分配新列（按倍数扩容）"""
+        for code in codes:
+            if code not in self._index:
+                self._index[code] = len(self._index)
+        width = len(self._index)
+        current = next(iter(self._data.values())).shape[1]
+        if width > current:
+            new_width = max(width, current * 2)
+            for col in self.columns:
+                grown = np.full((self.capacity, new_width), np.nan)
+                grown[:, :current] = self._data[col]
+                self._data[col] = grown
+        return np.fromiter((self._index[code] for code in codes), dtype=np.intp, count=len(codes))
+
+    def push(self, codes, values, ts=None):
+        """
+        写入一次快照
+
+        Args:
+            codes: 股票代码序列
+            values: {字段: 与codes对齐的数组}
+            ts: 快照时间戳（秒），默认当前时间
+        """
+        cols = self._columns_for(codes)
+        row = self._head
+        self._times[row] = time.time() if ts is None else ts
+        for col in self.columns:
+            self._data[col][row, :] = np.nan
+            self._data[col][row, cols] = np.asarray(values[col], dtype="float64")
+        self._head = (row + 1) % self.capacity
+
+    def _row_before(self, target):
+        """时间不晚于target的最新快照所在行；都比target新时返回最旧的一行，没有快照返回None"""
+        valid = ~np.isnan(self._times)
+        if not valid.any():
+            return None
+        older = valid & (self._times <= target)
+        if older.any():
+            return int(np.argmax(np.where(older, self._times, -np.inf)))
+        return int(np.argmin(np.where(valid, self._times, np.inf)))
+
+    def lookup(self, codes, seconds, column="change_pct", now=None):
+        """
+        返回seconds秒之前的快照中各股票的字段值，快照中没有的股票为NaN
+
+        历史不足seconds秒时使用最旧的快照
+        """
+        now = time.time() if now is None else now
+        result = np.full(len(codes), np.nan)
+        row = self._row_before(now - seconds)
+        if row is None:
+            return result
+        cols = np.fromiter((self._index.get(code, -1) for code in codes), dtype=np.intp, count=len(codes))
+        known = cols >= 0
+        result[known] = self._data[column][row, cols[known]]
+        return result
+
+    def change(self, codes, current, seconds, column="change_pct", now=None):
+        """
+        计算最近seconds秒的变化量：current - seconds秒前的值
+
+        没有历史数据的股票为NaN
+        """
+        return np.asarray(current, dtype="float64") - self.lookup(codes, seconds, column, now)
@@ -0,0 +1,249 @@
+# -*- coding:utf-8 -*-
+# SQLite存储后端：笔记、文件夹、日历按行存储，单条修改只写一行
+# 使用WAL模式，多个浏览器标签页并发请求时读写互不阻塞，也不会互相覆盖整个文件
+#
+# 从已有JSON文件迁移（只需执行一次）：
+#   python sqlite_store.py user/LYY
+import os
+import sys
+import json
+import time
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS notes (
+    code TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS folders (
+    folder_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    items TEXT NOT NULL,
+    extra TEXT NOT NULL DEFAULT '{}'
+);
+CREATE TABLE IF NOT EXISTS expanded_folders (
+    folder_id TEXT PRIMARY KEY,
+    position INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS calendar_entries (
+    date TEXT NOT NULL,
+    code TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (date, code)
+);
+"""
+
+DEFAULT_FOLDERS = {"root": {"name": "根目录", "items": []}}
+
+
+class SQLiteStore:
+    """
+    用户数据的SQLite存储
+
+    笔记部分的接口与 NoteStore 相同（all/get/upsert/update_many/delete/replace_all/flush），
+    app.py 可以直接替换使用。
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.version = 0  # 笔记每次修改加1
+        self._local = threading.local()
+        self._version_lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self):
+        """每个线程一个连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _bump(self):
+        with self._version_lock:
+            self.version += 1
+
+    # ==================== 笔记 ====================
+
+    def all(self):
+        rows = self._conn().execute("SELECT code, data FROM notes").fetchall()
+        return {code: json.loads(data) for code, data in rows}
+
+    def get(self, code):
+        row = self._conn().execute("SELECT data FROM notes WHERE code = ?", (code,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def upsert(self, code, note):
+        self.update_many({code: note})
+
+    def update_many(self, notes):
+        """批量写入笔记，只写内容有变化的行"""
+        if not notes:
+            return
+        now = time.time()
+        rows = {code: json.dumps(note, ensure_ascii=False) for code, note in notes.items()}
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            old_rows = {}
+            codes = list(rows)
+            for i in range(0, len(codes), 500):  # 分批查询，避免超过SQLite参数个数上限
+                batch = codes[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                old_rows.update(conn.execute(f"SELECT code, data FROM notes WHERE code IN ({placeholders})", batch))
+            changed = [(code, data, now) for code, data in rows.items() if old_rows.get(code) != data]
+            conn.executemany(
+                "INSERT OR REPLACE INTO notes (code, data, updated_at) VALUES (?, ?, ?)", changed
+            )
+        if changed:
+            self._bump()
+
+    def delete(self, code):
+        conn = self._conn()
+        with conn:
+            deleted = conn.execute("DELETE FROM notes WHERE code = ?", (code,)).rowcount
+        if deleted:
+            self._bump()
+        return deleted > 0
+
+    def replace_all(self, notes):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM notes")
+            conn.executemany(
+                "INSERT INTO notes (code, data, updated_at) VALUES (?, ?, ?)",
+                [(code, json.dumps(note, ensure_ascii=False), time.time()) for code, note in notes.items()],
+            )
+        self._bump()
+
+    def flush(self):
+        """每次写入已经落盘，保留该方法以兼容 NoteStore 接口"""
+        pass
+
+    # ==================== 文件夹 ====================
+
+    def load_folders(self):
+        rows = self._conn().execute("SELECT folder_id, name, items, extra FROM folders").fetchall()
+        if not rows:
+            return json.loads(json.dumps(DEFAULT_FOLDERS))
+        folders = {}
+        for folder_id, name, items, extra in rows:
+            folder = json.loads(extra)
+            folder["name"] = name
+            folder["items"] = json.loads(items)
+            folders[folder_id] = folder
+        return folders
+
+    def save_folders(self, folders):
+        """只写入有变化的文件夹，删除已不存在的文件夹"""
+        new_rows = {}
+        for folder_id, folder in folders.items():
+            extra = {k: v for k, v in folder.items() if k not in ("name", "items")}
+            new_rows[folder_id] = (
+                folder.get("name", ""),
+                json.dumps(folder.get("items", []), ensure_ascii=False),
+                json.dumps(extra, ensure_ascii=False),
+            )
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            old_rows = {row[0]: tuple(row[1:]) for row in
+                        conn.execute("SELECT folder_id, name, items, extra FROM folders")}
+            removed = [(folder_id,) for folder_id in old_rows if folder_id not in new_rows]
+            changed = [(folder_id,) + row for folder_id, row in new_rows.items() if old_rows.get(folder_id) != row]
+            conn.executemany("DELETE FROM folders WHERE folder_id = ?", removed)
+            conn.executemany(
+                "INSERT OR REPLACE INTO folders (folder_id, name, items, extra) VALUES (?, ?, ?, ?)", changed
+            )
+
+    def load_expanded_folders(self):
+        rows = self._conn().execute("SELECT folder_id FROM expanded_folders ORDER BY position").fetchall()
+        return [row[0] for row in rows] if rows else ["root"]
+
+    def save_expanded_folders(self, expanded_folders):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM expanded_folders")
+            conn.executemany(
+                "INSERT OR REPLACE INTO expanded_folders (folder_id, position) VALUES (?, ?)",
+                [(folder_id, i) for i, folder_id in enumerate(expanded_folders)],
+            )
+
+    # ==================== 日历 ====================
+
+    def load_calendar(self):
+        calendar_data = {}
+        rows = self._conn().execute("SELECT date, code FROM calendar_entries ORDER BY date, position")
+        for date, code in rows:
+            calendar_data.setdefault(date, []).append(code)
+        return calendar_data
+
+    def save_calendar(self, calendar_data):
+        """日历格式为 {日期: [股票代码, ...]}，只增删有变化的条目"""
+        new_rows = {(date, code): i for date, codes in calendar_data.items() for i, code in enumerate(codes)}
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            old_rows = {(date, code): position for date, code, position in
+                        conn.execute("SELECT date, code, position FROM calendar_entries")}
+            removed = [key for key in old_rows if key not in new_rows]
+            changed = [key + (i,) for key, i in new_rows.items() if old_rows.get(key) != i]
+            conn.executemany("DELETE FROM calendar_entries WHERE date = ? AND code = ?", removed)
+            conn.executemany(
+                "INSERT OR REPLACE INTO calendar_entries (date, code, position) VALUES (?, ?, ?)", changed
+            )
+
+    def is_empty(self):
+        conn = self._conn()
+        for table in ("notes", "folders", "calendar_entries"):
+            if conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone():
+                return False
+        return True
+
+
+def _read_json(path, default):
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"读取{path}失败: {e}")
+    return default
+
+
+def migrate_from_json(store, user_folder):
+    """
+    把用户目录下的JSON文件导入SQLite（stock_notes.json、folders.json、
+    expanded_folders.json、calendar.json），JSON文件保留不动
+
+    Returns:
+        dict: 各类数据导入的条数
+    """
+    notes = _read_json(os.path.join(user_folder, "stock_notes.json"), {})
+    folders = _read_json(os.path.join(user_folder, "folders.json"), DEFAULT_FOLDERS)
+    expanded_folders = _read_json(os.path.join(user_folder, "expanded_folders.json"), ["root"])
+    calendar_data = _read_json(os.path.join(user_folder, "calendar.json"), {})
+
+    store.replace_all(notes)
+    store.save_folders(folders)
+    store.save_expanded_folders(expanded_folders)
+    store.save_calendar(calendar_data)
+
+    counts = {
+        "notes": len(notes),
+        "folders": len(folders),
+        "expanded_folders": len(expanded_folders),
+        "calendar_entries": sum(len(codes) for codes in calendar_data.values()),
+    }
+    print(f"JSON数据迁移到SQLite完成: {counts}")
+    return counts
+
+
+if __name__ == "__main__":
+    folder = sys.argv[1] if len(sys.argv) > 1 else os.path.join("user", "LYY")
+    migrate_from_json(SQLiteStore(os.path.join(folder, "notebook.db")), folder)
@@ -0,0 +1,26 @@
+# -*- coding:utf-8 -*-
+# 涨跌停幅度测试：python -m pytest test_limit_up.py
+from limit_up import limit_ratio
+
+
+def test_main_board():
+    assert limit_ratio("600519", "贵州茅台") == 0.10
+    assert limit_ratio("sz000001") == 0.10
+
+
+def test_main_board_st():
+    assert limit_ratio("600001", "ST股份") == 0.05
+    assert limit_ratio("sz000002", "*st股份") == 0.05
+
+
+def test_growth_boards_ignore_st():
+    assert limit_ratio("300001", "ST股份") == 0.20
+    assert limit_ratio("301001", "*ST股份") == 0.20
+    assert limit_ratio("sh688001", "ST股份") == 0.20
+    assert limit_ratio("300750", "宁德时代") == 0.20
+
+
+def test_beijing_exchange():
+    assert limit_ratio("830001") == 0.30
+    assert limit_ratio("430001", "ST股份") == 0.30
+    assert limit_ratio("920001") == 0.30
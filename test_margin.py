@@ -0,0 +1,68 @@
+# -*- coding:utf-8 -*-
+# 融资数据增量更新测试：python -m pytest test_margin.py
+# 数据源指向临时目录中东方财富格式的JSON文件，不访问网络
+import json
+import datetime
+
+import numpy as np
+import pytest
+
+import margin
+
+RECORDS = [  # 东方财富融资融券明细，按日期倒序
+    {"DATE": "2026-10-15 00:00:00", "SCODE": "600900", "RZYE": 1300.0, "RZMRE": 300.0, "RZCHE": 100.0},
+    {"DATE": "2026-10-14 00:00:00", "SCODE": "600900", "RZYE": 1100.0, "RZMRE": 200.0, "RZCHE": 100.0},
+    {"DATE": "2026-10-13 00:00:00", "SCODE": "600900", "RZYE": 1000.0, "RZMRE": None, "RZCHE": 50.0},
+]
+
+
+def write_fixture(folder, code, records):
+    with open(folder / f"{code}.json", "w", encoding="utf-8") as f:
+        json.dump({"result": {"data": records}}, f)
+
+
+@pytest.fixture
+def source(tmp_path, monkeypatch):
+    monkeypatch.setitem(margin.MARGIN_CONFIG, "source", str(tmp_path / "{code}.json"))
+    monkeypatch.setitem(margin.MARGIN_CONFIG, "store_dir", str(tmp_path / "store"))
+    return tmp_path
+
+
+def test_parse_sorts_ascending():
+    series = margin.parse(json.dumps({"result": {"data": RECORDS}}))
+    assert series["time"].tolist() == np.array(["2026-10-13", "2026-10-14", "2026-10-15"],
+                                                dtype="datetime64[D]").tolist()
+    assert series["balance"].tolist() == [1000.0, 1100.0, 1300.0]
+    assert np.isnan(series["buy"][0])
+
+
+def test_update_appends_only_new_days(source):
+    write_fixture(source, "600900", RECORDS[1:])
+    first = margin.update("600900", now=datetime.datetime(2026, 10, 15, 9))
+    assert len(first["time"]) == 2
+
+    write_fixture(source, "600900", RECORDS)
+    second = margin.update("600900", now=datetime.datetime(2026, 10, 16, 9))
+    assert len(second["time"]) == 3
+    assert second["buy"][-1] == 300.0
+    assert margin.load("600900")["fetched"] == np.datetime64("2026-10-16")
+
+
+def test_update_fetches_once_per_day(source):
+    now = datetime.datetime(2026, 10, 16, 9)
+    write_fixture(source, "600900", RECORDS)
+    margin.update("600900", now=now)
+
+    (source / "600900.json").unlink()  # 当天再次更新不会读取数据源
+    again = margin.update("600900", now=now + datetime.timedelta(hours=8))
+    assert len(again["time"]) == 3
+
+    with pytest.raises(OSError):  # 第二天需要下载，数据源不可用时抛出异常
+        margin.update("600900", now=now + datetime.timedelta(days=1))
+    assert margin.load("600900")["fetched"] == np.datetime64("2026-10-16")
+
+
+def test_update_many_skips_failures(source):
+    write_fixture(source, "600900", RECORDS)
+    results = margin.update_many(["600900", "000001"])
+    assert list(results) == ["600900"]
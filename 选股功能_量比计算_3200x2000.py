@@ -20,10 +20,13 @@ import json
 import os
 import numpy as np
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from snapshot_ring import SnapshotRing
+from history_cache import DailyHistoryCache
 
-# 高DPI支持设置
+# 高DPI支持设置（仅Windows，其他平台导入本模块时跳过，如基准测试）
 import ctypes
-ctypes.windll.shcore.SetProcessDpiAwareness(1)
+if hasattr(ctypes, "windll"):
+    ctypes.windll.shcore.SetProcessDpiAwareness(1)
 
 # 尝试导入Ashare，用于获取历史行情
 try:
@@ -74,6 +77,12 @@ CONFIG = {
     # 结果测试  还是10线程最快   再高会竞争
     "batch_size": 100,  # 减小批量处理大小，降低内存占用
     "volume_ratio_days": 10,  # 计算近十日量比
+    "history_cache_size": 6000,  # 日线指标缓存的最大股票数
+    "snapshot_capacity": 64,  # 保存的行情快照数，按20秒刷新可覆盖约20分钟
+    "speed_windows": {  # 涨速的时间窗口（秒）
+        "speed_change_1min": 60,
+        "speed_change_5min": 300,
+    },
 }
 
 
@@ -83,16 +92,18 @@ class BlockAnalyzer:
         self.xml_path = xml_path
         self.specific_block = specific_block
         self.blocks = self._parse_xml()
-        self.prev_data = None
-        self.five_min_data = []
+        self.snapshots = SnapshotRing(CONFIG["snapshot_capacity"])
         self.custom_data = self._load_custom_data()
-        self.ma5_cache = {}
-        self.volume_ratio_cache = {}
-        self.history_data_cache = {}  # 历史数据缓存
+        # 日线指标缓存：MA5、量比、近10日振幅共用，每只股票每天只下载一次
+        self.daily_cache = DailyHistoryCache(
+            self._fetch_daily_history,
+            maxsize=CONFIG["history_cache_size"],
+            volume_ratio_days=CONFIG["volume_ratio_days"],
+        )
         self.thread_pool = ThreadPoolExecutor(max_workers=CONFIG["max_workers"])
-        self.last_ma5_fetch_date = None
-        self.last_volume_ratio_fetch_date = None
-        self.last_history_data_fetch_date = None
+        if USE_AKSHARE:
+            # 连接池不小于线程数，保证每个线程都能复用长连接
+            configure_http(pool_size=max(HTTP_CONFIG["pool_size"], CONFIG["max_workers"]))
 
     def _parse_xml(self):
         """解析XML文件获取板块数据"""
@@ -126,327 +137,87 @@ class BlockAnalyzer:
         with open(CONFIG["data_file"], "w", encoding="utf-8") as f:
             json.dump(self.custom_data, f, ensure_ascii=False, indent=2)
 
-    def _get_stock_history_data(self, stock_code):
-        """获取股票历史数据，支持缓存"""
-        today = datetime.datetime.now().date()
-        
-        # 检查缓存中是否有今天的数据
-        if stock_code in self.history_data_cache:
-            cached_time, cached_data = self.history_data_cache[stock_code]
-            if cached_time.date() == today:
-                return cached_data
-        
-        # 调整股票代码格式
+    def _fetch_daily_history(self, stock_code):
+        """下载股票最近20个交易日的日线，Ashare失败时使用adata"""
+        # 调整股票代码格式，A股需要加上市场前缀
         symbol = stock_code
         if len(stock_code) == 6:
+            # 沪市股票以6开头
             if stock_code.startswith('6'):
                 symbol = f'sh{stock_code}'
-            else:
+            # 深市股票以0、3、2开头
+            elif stock_code.startswith(('0', '3', '2')):
                 symbol = f'sz{stock_code}'
-        
+
+        if USE_AKSHARE:
+            try:
+                # 使用Ashare的get_price函数获取最近20天的日线数据
+                df = get_price(symbol, frequency='1d', count=20)
+                if df is not None and not df.empty:
+                    return df
+            except Exception as e:
+                print(f"获取{stock_code}历史数据失败: {str(e)}")
+
+        # Ashare获取失败，尝试使用adata获取历史数据
         try:
-            # 使用Ashare的get_price函数获取最近20天的日线数据
-            df = get_price(symbol, frequency='1d', count=20)
-            
+            end_date = datetime.datetime.now().strftime("%Y-%m-%d")
+            start_date = (datetime.datetime.now() - timedelta(days=20)).strftime("%Y-%m-%d")
+            df = adata.stock.market.get_market(
+                symbol,
+                start_date=start_date,
+                end_date=end_date,
+                k_type=1,
+                adjust_type=1,
+            )
             if df is not None and not df.empty:
-                # 缓存数据
-                self.history_data_cache[stock_code] = (datetime.datetime.now(), df)
-                self.last_history_data_fetch_date = today
                 return df
+            print(f"adata获取{stock_code}数据为空")
         except Exception as e:
-            print(f"获取{stock_code}历史数据失败: {str(e)}")
-        
+            print(f"adata获取{stock_code}历史数据失败: {str(e)}")
         return None
 
-    def get_ma5_data_batch(self, stock_codes):
-        """批量获取5日均线数据，优化内存使用，支持akshare和adata两种方式"""
-        today = datetime.datetime.now().date()
-
-        # 如果今天已经获取过数据，直接使用缓存
-        if self.last_ma5_fetch_date == today:
-            results = {}
-            for code in stock_codes:
-                if code in self.ma5_cache:
-                    cached_time, ma5_value = self.ma5_cache[code]
-                    if cached_time.date() == today:
-                        results[code] = ma5_value
-            return results
-
-        # 否则批量获取数据，减少线程池使用
-        results = {}
-        
-        # 只处理有实时数据的股票
-        valid_codes = [code for code in stock_codes if code not in results]
-        
-        # 分小批次处理，减少内存占用
-        batch_size = 10  # 每次处理10个股票
-        for i in range(0, len(valid_codes), batch_size):
-            batch = valid_codes[i:i+batch_size]
-            futures = {}
-            
-            for code in batch:
-                # 如果缓存中有今天的数据，直接使用
-                if code in self.ma5_cache:
-                    cached_time, ma5_value = self.ma5_cache[code]
-                    if cached_time.date() == today:
-                        results[code] = ma5_value
-                        continue
-                
-                # 否则提交任务到线程池
-                future = self.thread_pool.submit(self._get_single_ma5_data, code)
-                futures[future] = code
-            
-            # 等待当前批次完成
-            for future in as_completed(futures):
-                code = futures[future]
-                try:
-                    ma5_value = future.result()
-                    if ma5_value is not None:
-                        results[code] = ma5_value
-                        self.ma5_cache[code] = (datetime.datetime.now(), ma5_value)
-                except Exception as e:
-                    # 减少打印，只在必要时输出
-                    # print(f"获取{code}的5日均线数据失败: {str(e)}")
-                    pass
-
-        self.last_ma5_fetch_date = today
-        return results
+    def get_indicators_batch(self, stock_codes):
+        """
+        批量获取日线指标，缓存中没有的股票提交到线程池并发下载
 
-    def _get_single_ma5_data(self, stock_code):
-        """获取单个股票的5日均线数据，使用共享的历史数据"""
-        try:
-            # 首先尝试使用共享的历史数据
-            df = self._get_stock_history_data(stock_code)
-            
-            if df is not None and not df.empty:
-                print(f"使用共享历史数据计算{stock_code}的MA5值...")
-                
-                # 确保收盘价是数值类型
-                df['close'] = pd.to_numeric(df['close'], errors='coerce')
-                df = df.dropna(subset=['close'])
-                
-                if len(df) >= 5:
-                    # 计算最近5天的平均值
-                    recent_5_days = df['close'].tail(5)
-                    ma5_value = recent_5_days.mean()
-                    result = round(ma5_value, 2)
-                    print(f"{stock_code}的MA5值: {result}")
-                    return result
-                else:
-                    print(f"{stock_code}数据不足5条，无法计算MA5")
-            
-            # 如果共享数据获取失败，尝试使用adata获取历史数据
+        Returns:
+            dict: {code: DailyIndicators}，获取失败的股票不在结果中
+        """
+        futures = {self.thread_pool.submit(self.daily_cache.get, code): code for code in stock_codes}
+        results = {}
+        for future in as_completed(futures):
+            code = futures[future]
             try:
-                print(f"尝试使用adata获取{stock_code}的历史数据...")
-                # 获取最近20个交易日的数据
-                end_date = datetime.datetime.now().strftime("%Y-%m-%d")
-                start_date = (datetime.datetime.now() - timedelta(days=20)).strftime("%Y-%m-%d")
-                
-                # 调整股票代码格式，A股需要加上市场前缀
-                formatted_code = stock_code
-                if len(stock_code) == 6:
-                    # 沪市股票以6开头
-                    if stock_code.startswith('6'):
-                        formatted_code = f'sh{stock_code}'
-                    # 深市股票以0、3、2开头
-                    elif stock_code.startswith(('0', '3', '2')):
-                        formatted_code = f'sz{stock_code}'
-
-                df = adata.stock.market.get_market(
-                    formatted_code,
-                    start_date=start_date,
-                    end_date=end_date,
-                    k_type=1,
-                    adjust_type=1,
-                )
-
-                if df is not None and not df.empty:
-                    print(f"adata获取{stock_code}数据成功，共{len(df)}条")
-                    # 确保收盘价是数值类型
-                    df["close"] = pd.to_numeric(df["close"], errors="coerce")
-                    df = df.dropna(subset=["close"])
-
-                    if len(df) >= 5:
-                        # 计算5日均线
-                        df["ma5"] = df["close"].rolling(window=5).mean()
-                        ma5_value = df["ma5"].iloc[-1]
-                        result = round(ma5_value, 2)
-                        print(f"{stock_code}的MA5值: {result}")
-                        return result
-                    else:
-                        print(f"{stock_code}数据不足5条，无法计算MA5")
-                else:
-                    print(f"adata获取{stock_code}数据为空")
+                indicators = future.result()
+                if indicators is not None:
+                    results[code] = indicators
             except Exception as e:
-                print(f"adata获取{stock_code}的5日均线数据失败: {str(e)}")
-                
-        except Exception as e:
-            print(f"获取{stock_code}的5日均线数据失败: {str(e)}")
+                print(f"获取{code}日线指标失败: {str(e)}")
+        return results
 
-        return None
+    def get_ma5_data_batch(self, stock_codes):
+        """批量获取5日均线数据"""
+        indicators = self.get_indicators_batch(stock_codes)
+        return {code: ind.ma5 for code, ind in indicators.items() if ind.ma5 is not None}
+
+    def _get_single_ma5_data(self, stock_code):
+        """获取单个股票的5日均线数据，使用共享的日线指标缓存"""
+        indicators = self.daily_cache.get(stock_code)
+        return indicators.ma5 if indicators is not None else None
 
     def get_volume_ratio_data_batch(self, stock_codes):
         """批量获取近十日单日最大量比数据"""
-        today = datetime.datetime.now().date()
-
-        # 如果今天已经获取过数据，直接使用缓存
-        if self.last_volume_ratio_fetch_date == today:
-            results = {}
-            for code in stock_codes:
-                if code in self.volume_ratio_cache:
-                    cached_time, volume_ratio_value = self.volume_ratio_cache[code]
-                    if cached_time.date() == today:
-                        results[code] = volume_ratio_value
-            return results
-
-        # 否则批量获取数据
-        results = {}
-        
-        # 只处理有实时数据的股票
-        valid_codes = [code for code in stock_codes if code not in results]
-        
-        # 分小批次处理，减少内存占用
-        batch_size = 10  # 每次处理10个股票
-        for i in range(0, len(valid_codes), batch_size):
-            batch = valid_codes[i:i+batch_size]
-            futures = {}
-            
-            for code in batch:
-                # 如果缓存中有今天的数据，直接使用
-                if code in self.volume_ratio_cache:
-                    cached_time, volume_ratio_value = self.volume_ratio_cache[code]
-                    if cached_time.date() == today:
-                        results[code] = volume_ratio_value
-                        continue
-                
-                # 否则提交任务到线程池
-                future = self.thread_pool.submit(self._get_single_volume_ratio_data, code)
-                futures[future] = code
-            
-            # 等待当前批次完成
-            for future in as_completed(futures):
-                code = futures[future]
-                try:
-                    volume_ratio_value = future.result()
-                    if volume_ratio_value is not None:
-                        results[code] = volume_ratio_value
-                        self.volume_ratio_cache[code] = (datetime.datetime.now(), volume_ratio_value)
-                except Exception as e:
-                    # 减少打印，只在必要时输出
-                    # print(f"获取{code}的量比数据失败: {str(e)}")
-                    pass
-
-        self.last_volume_ratio_fetch_date = today
-        return results
+        indicators = self.get_indicators_batch(stock_codes)
+        return {
+            code: ind.max_volume_ratio
+            for code, ind in indicators.items()
+            if ind.max_volume_ratio is not None
+        }
 
     def _get_single_volume_ratio_data(self, stock_code):
-        """获取单个股票的近十日单日最大量比数据，使用共享的历史数据"""
-        try:
-            # 首先尝试使用共享的历史数据
-            df = self._get_stock_history_data(stock_code)
-            
-            if df is not None and not df.empty:
-                print(f"使用共享历史数据计算{stock_code}的量比值...")
-                
-                # 检查数据列名
-                volume_col = None
-                if 'volume' in df.columns:
-                    volume_col = 'volume'
-                elif 'amount' in df.columns:
-                    volume_col = 'amount'
-                else:
-                    print(f"历史数据中没有找到成交量或成交额列")
-                    return None
-                
-                # 确保数据是数值类型
-                df[volume_col] = pd.to_numeric(df[volume_col], errors='coerce')
-                df = df.dropna(subset=[volume_col])
-                
-                if len(df) >= 2:
-                    # 计算量比：当日成交量/前一日成交量
-                    df['volume_ratio'] = df[volume_col] / df[volume_col].shift(1)
-                    # 移除NaN值
-                    df = df.dropna(subset=['volume_ratio'])
-                    
-                    if len(df) >= 1:
-                        # 获取近10天的最大量比
-                        recent_data = df.tail(CONFIG["volume_ratio_days"])
-                        max_volume_ratio = recent_data['volume_ratio'].max()
-                        result = round(max_volume_ratio, 2)
-                        print(f"{stock_code}的近十日最大量比: {result}")
-                        return result
-                    else:
-                        print(f"{stock_code}量比计算数据不足")
-                else:
-                    print(f"{stock_code}数据不足2条，无法计算量比")
-            
-            # 如果共享数据获取失败，尝试使用adata获取历史数据
-            try:
-                print(f"尝试使用adata获取{stock_code}的量比数据...")
-                # 获取最近20个交易日的数据
-                end_date = datetime.datetime.now().strftime("%Y-%m-%d")
-                start_date = (datetime.datetime.now() - timedelta(days=20)).strftime("%Y-%m-%d")
-                
-                # 调整股票代码格式，A股需要加上市场前缀
-                formatted_code = stock_code
-                if len(stock_code) == 6:
-                    # 沪市股票以6开头
-                    if stock_code.startswith('6'):
-                        formatted_code = f'sh{stock_code}'
-                    # 深市股票以0、3、2开头
-                    elif stock_code.startswith(('0', '3', '2')):
-                        formatted_code = f'sz{stock_code}'
-
-                df = adata.stock.market.get_market(
-                    formatted_code,
-                    start_date=start_date,
-                    end_date=end_date,
-                    k_type=1,
-                    adjust_type=1,
-                )
-
-                if df is not None and not df.empty:
-                    print(f"adata获取{stock_code}量比数据成功，共{len(df)}条")
-                    
-                    # 检查数据列名
-                    volume_col = None
-                    if 'volume' in df.columns:
-                        volume_col = 'volume'
-                    elif 'amount' in df.columns:
-                        volume_col = 'amount'
-                    else:
-                        print(f"adata数据中没有找到成交量或成交额列")
-                        return None
-                    
-                    # 确保数据是数值类型
-                    df[volume_col] = pd.to_numeric(df[volume_col], errors="coerce")
-                    df = df.dropna(subset=[volume_col])
-
-                    if len(df) >= 2:
-                        # 计算量比：当日成交量/前一日成交量
-                        df["volume_ratio"] = df[volume_col] / df[volume_col].shift(1)
-                        df = df.dropna(subset=["volume_ratio"])
-                        
-                        if len(df) >= 1:
-                            # 获取近10天的最大量比
-                            recent_data = df.tail(CONFIG["volume_ratio_days"])
-                            max_volume_ratio = recent_data["volume_ratio"].max()
-                            result = round(max_volume_ratio, 2)
-                            print(f"{stock_code}的近十日最大量比: {result}")
-                            return result
-                        else:
-                            print(f"{stock_code}量比计算数据不足")
-                    else:
-                        print(f"{stock_code}数据不足2条，无法计算量比")
-                else:
-                    print(f"adata获取{stock_code}量比数据为空")
-            except Exception as e:
-                print(f"adata获取{stock_code}的量比数据失败: {str(e)}")
-                
-        except Exception as e:
-            print(f"获取{stock_code}的量比数据失败: {str(e)}")
-
-        return None
+        """获取单个股票的近十日单日最大量比数据，使用共享的日线指标缓存"""
+        indicators = self.daily_cache.get(stock_code)
+        return indicators.max_volume_ratio if indicators is not None else None
 
     def calculate_ma5_distance(self, current_price, ma5_price):
         """计算当前价格与5日线的距离百分比"""
@@ -462,50 +233,47 @@ class BlockAnalyzer:
         except (ValueError, TypeError):
             return None
 
+    def _get_range_10d(self, stock_code):
+        """获取近10日最高价与最低价之差，数据不足返回None"""
+        indicators = self.daily_cache.get(stock_code)
+        if indicators is None or indicators.high_10d is None:
+            return None
+        return indicators.high_10d - indicators.low_10d
+
     def calculate_amplitude_10d(self, stock_code, current_price):
         """计算近10日振幅：(近10日最高价 - 近10日最低价) / 当前股价"""
-        try:
-            # 获取历史数据
-            df = self._get_stock_history_data(stock_code)
-            
-            if df is None or df.empty:
-                return None
-            
-            # 确保数据是数值类型
-            df['high'] = pd.to_numeric(df['high'], errors='coerce')
-            df['low'] = pd.to_numeric(df['low'], errors='coerce')
-            df = df.dropna(subset=['high', 'low'])
-            
-            if len(df) < 10:
-                return None
-            
-            # 获取近10天的数据
-            recent_10d = df.tail(10)
-            
-            # 计算近10日最高价和最低价
-            high_10d = recent_10d['high'].max()
-            low_10d = recent_10d['low'].min()
-            
-            # 计算振幅
-            if current_price and current_price > 0:
-                amplitude = ((high_10d - low_10d) / current_price) * 100
-                return round(amplitude, 2)
-            
-            return None
-        except Exception as e:
-            print(f"计算{stock_code}近10日振幅失败: {str(e)}")
-            return None
+        range_10d = self._get_range_10d(stock_code)
+        
+        # 计算振幅
+        if range_10d is not None and current_price and current_price > 0:
+            amplitude = (range_10d / current_price) * 100
+            return round(amplitude, 2)
+        
+        return None
 
-    def analyze(self):
-        """分析板块实时数据"""
-        return self._analyze_specific_block()
+    def _fetch_snapshots(self, codes):
+        """
+        获取实时行情快照，返回DataFrame列表（列: stock_code, short_name, change_pct, price）
 
-    def _analyze_specific_block(self):
-        """分析特定板块的个股"""
-        # 获取指定板块的股票代码
-        codes = self.blocks.get(self.specific_block, [])
-        if not codes:
-            return []
+        优先用Ashare批量接口（每100只一次请求），失败时按批使用adata
+        """
+        if USE_AKSHARE:
+            try:
+                quotes = get_quotes(codes, batch=CONFIG["batch_size"])
+                if quotes:
+                    df = pd.DataFrame(
+                        {
+                            "stock_code": list(quotes.keys()),
+                            "short_name": [q["name"] for q in quotes.values()],
+                            "change_pct": [q["change_pct"] for q in quotes.values()],
+                            "price": [q["price"] for q in quotes.values()],
+                        }
+                    )
+                    df[["change_pct", "price"]] = df[["change_pct", "price"]].astype("float64")
+                    return [df.dropna(subset=["change_pct", "price"])]
+                print("Ashare实时行情为空，使用adata")
+            except Exception as e:
+                print(f"Ashare实时行情获取失败，使用adata: {str(e)}")
 
         # 分批次获取数据
         batch_size = CONFIG["batch_size"]
@@ -528,99 +296,98 @@ class BlockAnalyzer:
             except Exception as e:
                 print(f"第{i+1}批数据获取失败: {str(e)}")
 
-        if not all_data:
+        return all_data
+
+    def analyze(self):
+        """分析板块实时数据"""
+        return self._analyze_specific_block()
+
+    def _analyze_specific_block(self):
+        """分析特定板块的个股"""
+        # 获取指定板块的股票代码
+        codes = self.blocks.get(self.specific_block, [])
+        if not codes:
             return []
 
-        df_all = pd.concat(all_data)
+        all_data = self._fetch_snapshots(codes)
+        if not all_data:
+            return []
 
-        # 批量获取MA5数据
-        ma5_data = self.get_ma5_data_batch(codes)
-        
-        # 批量获取量比数据
-        volume_ratio_data = self.get_volume_ratio_data_batch(codes)
+        # 以股票代码为索引，后面所有指标都按代码对齐做整列运算
+        df_all = pd.concat(all_data).drop_duplicates(subset="stock_code").set_index("stock_code")
+        current_change = df_all["change_pct"]
+        current_price = df_all["price"]
+
+        # 批量获取日线指标（MA5、量比、近10日最高最低价），每只股票每天只下载一次
+        indicators = self.get_indicators_batch(codes)
+
+        # 按真实时间计算涨速：与N秒前的快照按代码对齐相减，没有历史的股票记为0
+        now = time.time()
+        speeds = {}
+        for key, seconds in CONFIG["speed_windows"].items():
+            change = self.snapshots.change(df_all.index, current_change.to_numpy(), seconds, now=now)
+            speeds[key] = pd.Series(change, index=df_all.index).fillna(0)
+        speed_change_1min = speeds["speed_change_1min"]
+        speed_change_5min = speeds["speed_change_5min"]
+
+        # 计算与5日线的距离
+        ma5 = pd.Series({code: ind.ma5 for code, ind in indicators.items()}, dtype="float64").reindex(df_all.index)
+        ma5 = ma5.where(ma5 != 0)
+        ma5_distance = ((current_price - ma5) / ma5 * 100).round(2)
+
+        # 计算近10日振幅
+        range_10d = pd.Series(
+            {code: ind.high_10d - ind.low_10d for code, ind in indicators.items() if ind.high_10d is not None},
+            dtype="float64",
+        ).reindex(df_all.index)
+        amplitude_10d = (range_10d / current_price.where(current_price > 0) * 100).round(2)
+
+        # 获取量比数据
+        max_volume_ratio = pd.Series(
+            {code: ind.max_volume_ratio for code, ind in indicators.items()}, dtype="float64"
+        ).reindex(df_all.index)
+
+        stock_names = df_all["short_name"] if "short_name" in df_all.columns else pd.Series("未知", index=df_all.index)
+
+        def _value(x):
+            return None if pd.isna(x) else float(x)
 
         # 准备个股数据
         stock_data = []
-
-        # 计算个股涨速
-        for _, row in df_all.iterrows():
-            stock_code = row["stock_code"]
-            stock_name = row.get("short_name", "未知")
-            current_change = row["change_pct"]
-            current_price = row["price"]
-
-            # 计算 1 分钟涨速
-            speed_change_1min = 0
-            if self.prev_data is not None:
-                prev_row = self.prev_data[self.prev_data["stock_code"] == stock_code]
-                if not prev_row.empty:
-                    prev_change = prev_row.iloc[0]["change_pct"]
-                    try:
-                        current_change = float(current_change)
-                        prev_change = float(prev_change)
-                        speed_change_1min = current_change - prev_change
-                    except (ValueError, TypeError): 
-                        speed_change_1min = 0
-
-            # 计算 5 分钟涨速
-            speed_change_5min = 0
-            if len(self.five_min_data) > 0:
-                if len(self.five_min_data) < 5:
-                    prev_five_df = self.five_min_data[0]
-                else:
-                    prev_five_df = self.five_min_data[-5]
-
-                prev_five_row = prev_five_df[prev_five_df["stock_code"] == stock_code]
-                if not prev_five_row.empty:
-                    prev_five_change = prev_five_row.iloc[0]["change_pct"]
-                    try:
-                        current_change = float(current_change)
-                        prev_five_change = float(prev_five_change)
-                        speed_change_5min = current_change - prev_five_change
-                    except (ValueError, TypeError):
-                        speed_change_5min = 0
-
-            # 获取5日均线数据
-            ma5_price = ma5_data.get(stock_code)
-
-            # 计算与5日线的距离
-            ma5_distance = self.calculate_ma5_distance(current_price, ma5_price)
-            
-            # 获取量比数据
-            max_volume_ratio = volume_ratio_data.get(stock_code)
-            
-            # 计算近10日振幅
-            amplitude_10d = self.calculate_amplitude_10d(stock_code, current_price)
-
+        for stock_code, stock_name, change, speed_1min, speed_5min, distance, ratio, amplitude in zip(
+            df_all.index,
+            stock_names,
+            current_change.round(2),
+            speed_change_1min.round(2),
+            speed_change_5min.round(2),
+            ma5_distance,
+            max_volume_ratio,
+            amplitude_10d,
+        ):
             # 获取自定义数据
-            custom_text = ""
-            pinned = False
-            if stock_code in self.custom_data:
-                custom_data = self.custom_data[stock_code]
-                custom_text = custom_data.get("text", "")
-                pinned = custom_data.get("pinned", False)
+            custom_data = self.custom_data.get(stock_code, {})
 
             stock_data.append(
                 {
                     "name": stock_code,
                     "stock_name": stock_name,
-                    "custom_text": custom_text,
-                    "real_time_return": round(current_change, 2),
-                    "speed_change_1min": round(speed_change_1min, 2),
-                    "speed_change_5min": round(speed_change_5min, 2),
-                    "ma5_distance": ma5_distance,
-                    "max_volume_ratio": max_volume_ratio,
-                    "amplitude_10d": amplitude_10d,
-                    "pinned": pinned,
+                    "custom_text": custom_data.get("text", ""),
+                    "real_time_return": float(change),
+                    "speed_change_1min": float(speed_1min),
+                    "speed_change_5min": float(speed_5min),
+                    "ma5_distance": _value(distance),
+                    "max_volume_ratio": _value(ratio),
+                    "amplitude_10d": _value(amplitude),
+                    "pinned": custom_data.get("pinned", False),
                 }
             )
 
-        # 更新上一分钟的数据
-        self.prev_data = df_all
-        # 更新 5 分钟数据缓存
-        self.five_min_data.append(df_all)
-        if len(self.five_min_data) > 5:
-            self.five_min_data.pop(0)
+        # 保存本次快照
+        self.snapshots.push(
+            df_all.index,
+            {"change_pct": current_change.to_numpy(), "price": current_price.to_numpy()},
+            ts=now,
+        )
 
         # 按照实时涨幅从高到低排序，但置顶的股票排在前面
         stock_data.sort(
@@ -977,7 +744,10 @@ class StockMonitor(tk.Tk):
             current_time =  time.strftime("%H:%M:%S")
             cost_time = time.time() - start_time
             self.status_time.config(text=f"最后更新: {current_time}")
-            self.status_cost.config(text=f"耗时: {cost_time:.1f}秒")
+            cache_stats = self.analyzer.daily_cache.stats()
+            self.status_cost.config(
+                text=f"耗时: {cost_time:.1f}秒 日线缓存命中{cache_stats['hits']}/未命中{cache_stats['misses']}"
+            )
         except Exception as e:
             self.status_time.config(text="更新失败")
             self.status_cost.config(text=f"{str(e)}")